@@ -5,8 +5,12 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db, User
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.database import get_db, get_async_db, User
+from app.cache import user_cache
+from app.executors import BoundedExecutor, ExecutorBusyError
 import os
 from dotenv import load_dotenv
 
@@ -16,16 +20,45 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# bcrypt work factor for new hashes; stored hashes with another cost are
+# rehashed on the user's next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing passwords, and hash requests allowed to wait for one
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# bcrypt is deliberately slow; it runs on its own bounded pool so a burst of
+# logins can't take every request thread, and excess requests get a 503
+password_executor = BoundedExecutor(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, "password-hash")
+
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
+def _hashpw(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Raises ExecutorBusyError when the password executor's queue is full
+    return password_executor.call(_checkpw, plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    # Raises ExecutorBusyError when the password executor's queue is full
+    return password_executor.call(_hashpw, password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt and hash>
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -48,42 +81,106 @@ def get_user_by_username(db: Session, username: str) -> Optional[User]:
     return db.query(User).filter(User.username == username).first()
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = get_user_by_username(db, username)
-    if not user:
-        user = get_user_by_email(db, username)
+async def get_login_user(db: AsyncSession, username: str) -> Optional[User]:
+    # Login accepts a username or an email
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None:
+        user = await db.scalar(select(User).where(User.email == username))
+    return user
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    user = await get_login_user(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_executor.run(_checkpw, password, user.hashed_password):
         return None
+    if password_needs_rehash(user.hashed_password):
+        # Move the stored hash to the configured cost while the plain
+        # password is at hand; a busy executor just leaves it for next time
+        try:
+            user.hashed_password = await password_executor.run(_hashpw, password)
+        except ExecutorBusyError:
+            return user
+        await db.commit()
+        user_cache.invalidate(user.username)
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _token_username(token: str) -> str:
+    # Decoded token claims are cached until the token expires
+    username = user_cache.get_username(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise _credentials_exception()
+        except JWTError:
+            raise _credentials_exception()
+        user_cache.set_username(token, username, payload.get("exp"))
+    return username
+
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    username = _token_username(token)
     
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+    cached_user = user_cache.get_user(username)
+    if cached_user is not None:
+        # Attach a copy to this request's session without querying, so
+        # routes can still update and commit it
+        return db.merge(cached_user, load=False)
     
+    generation = user_cache.generation
     user = get_user_by_username(db, username)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    user_cache.set_user(username, _detached_copy(user), generation)
+    
+    return user
+
+
+async def get_async_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    # get_current_user for routes on the async session: the user is
+    # attached to the route's own session, so a request opens one session
+    # and never leaves the event loop
+    username = _token_username(token)
+    
+    cached_user = user_cache.get_user(username)
+    if cached_user is not None:
+        return await db.merge(cached_user, load=False)
+    
+    generation = user_cache.generation
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None:
+        raise _credentials_exception()
+    user_cache.set_user(username, _detached_copy(user), generation)
     
     return user
 
 
+def _detached_copy(user: User) -> User:
+    # A clean, session-less copy of the user's columns for the user cache;
+    # the instance handed to the request stays private to its session
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -92,6 +189,14 @@ async def get_current_active_user(
     return current_user
 
 
+async def get_async_current_active_user(
+    current_user: User = Depends(get_async_current_user)
+) -> User:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+
 def require_role(required_role: str):
     async def role_checker(current_user: User = Depends(get_current_active_user)):
         roles_hierarchy = {"user": 0, "analyst": 1, "admin": 2}
@@ -0,0 +1,330 @@
+# Content-addressed on-disk cache for k-sweep and training results
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.utils import (
+    CACHE_DIR,
+    RESULT_CACHE_MAX_BYTES,
+    PREDICTION_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL_SECONDS
+)
+
+
+def dataset_fingerprint(X):
+    # Hash of the array contents (plus shape and dtype, so reshaped or
+    # recast data never collides)
+    X = np.ascontiguousarray(X)
+    digest = hashlib.sha256()
+    digest.update(f"{X.shape}|{X.dtype.str}".encode("utf-8"))
+    digest.update(memoryview(X).cast("B"))
+    return digest.hexdigest()
+
+
+def make_cache_key(kind, fingerprint, params):
+    # Key = kind of result + dataset hash + canonical JSON of the parameters
+    payload = json.dumps(
+        {"kind": kind, "data": fingerprint, "params": params},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    # Entries are joblib files named by their key. A hit bumps the file's
+    # mtime, so eviction drops the least recently used entries until the
+    # directory fits in max_bytes. Sweeps and fits run in worker processes,
+    # so stats() reports what is on disk rather than per-process counters.
+    
+    SUFFIX = ".joblib"
+    
+    def __init__(self, directory=CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    
+    def _path(self, key):
+        return self.directory / f"{key}{self.SUFFIX}"
+    
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in self.directory.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+    
+    def get(self, key):
+        if not self.enabled:
+            return None
+        
+        import joblib
+        path = self._path(key)
+        with self._lock:
+            try:
+                value = joblib.load(path)
+            except FileNotFoundError:
+                return None
+            except Exception:
+                # Truncated, or pickled by incompatible library versions
+                # (UnpicklingError, ValueError, AttributeError, ...): drop it
+                # and recompute
+                path.unlink(missing_ok=True)
+                return None
+            os.utime(path)
+            return value
+    
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        
+        import joblib
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Write to a temp file first so readers never see a partial entry
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._evict()
+    
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_bytes:
+            path, size, _ = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total -= size
+    
+    def clear(self):
+        with self._lock:
+            entries = self._entries()
+            for path, _, _ in entries:
+                path.unlink(missing_ok=True)
+            return len(entries)
+    
+    def stats(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[2], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "items": [
+                {
+                    "key": path.name[:-len(self.SUFFIX)],
+                    "size_bytes": size,
+                    "last_used": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(mtime))
+                }
+                for path, size, mtime in entries
+            ]
+        }
+
+
+def normalize_customer_features(customer_data):
+    # Canonical feature tuple: integer age, score and frequency, income to
+    # 0.1. Returns None when normalizing would change a value, so a cached
+    # result is only ever reused for exactly the features it was scored on.
+    features = (
+        customer_data['age'],
+        customer_data['annual_income'],
+        customer_data['spending_score'],
+        customer_data['purchase_frequency']
+    )
+    normalized = (
+        int(features[0]),
+        round(float(features[1]), 1),
+        int(features[2]),
+        int(features[3])
+    )
+    return normalized if normalized == features else None
+
+
+class PredictionCache:
+    # Bounded in-memory LRU of prediction results keyed by
+    # (model version, normalized features). Versioned keys never serve a
+    # stale model's answer; the model still clears the cache on every swap
+    # so old entries don't take up capacity.
+    
+    def __init__(self, capacity=PREDICTION_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.capacity > 0
+    
+    def get(self, key):
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        if not self.enabled or key is None:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            return removed
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class UserCache:
+    # TTL + LRU cache for get_current_user: decoded token claims keyed by a
+    # hash of the token, and user records keyed by username. Routes that
+    # change a user invalidate it explicitly; the TTL bounds how stale an
+    # entry can get when another process changed the user.
+    
+    def __init__(self, capacity=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation, so a record read from the database
+        # before an invalidation is never cached after it
+        self.generation = 0
+        self._tokens = OrderedDict()
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return self.capacity > 0 and self.ttl > 0
+    
+    @staticmethod
+    def _token_key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def _get(self, entries, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+    
+    def _set(self, entries, key, value, expires_at):
+        entries[key] = (value, expires_at)
+        entries.move_to_end(key)
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+    
+    def get_username(self, token):
+        # Username from a token decoded earlier (None on a miss)
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._get(self._tokens, self._token_key(token))
+    
+    def set_username(self, token, username, token_expires_at=None):
+        # Never outlive the token's own exp claim
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._set(self._tokens, self._token_key(token), username, expires_at)
+    
+    def get_user(self, username):
+        if not self.enabled:
+            return None
+        with self._lock:
+            user = self._get(self._users, username)
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return user
+    
+    def set_user(self, username, user, generation):
+        # generation is self.generation as read before the database lookup
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation == self.generation:
+                self._set(self._users, username, user, time.time() + self.ttl)
+    
+    def invalidate(self, *usernames):
+        with self._lock:
+            self.generation += 1
+            for username in usernames:
+                self._users.pop(username, None)
+    
+    def clear(self):
+        with self._lock:
+            removed = len(self._users)
+            self.generation += 1
+            self._tokens.clear()
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
+            return removed
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._users),
+                "tokens": len(self._tokens),
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Global cache instances
+result_cache = ResultCache()
+prediction_cache = PredictionCache()
+user_cache = UserCache()
@@ -0,0 +1,154 @@
+# Pre-rendered charts, keyed by model version
+#
+# Charts depend only on the trained model, so they are rendered once (at
+# training time, or on the first request for a chart that wasn't) and kept
+# in memory and in the version's directory as charts/<name>.json. Charts
+# served as raw images at their default size are kept the same way, as
+# charts/<name>.png or .svg; other sizes are kept in memory only, so
+# requests can't fill the disk by walking through sizes.
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from app.utils import model_version_dir, CHART_CACHE_MAX_ENTRIES, CHART_IMAGE_MAX_PIXELS
+
+CHARTS_DIR_NAME = "charts"
+
+# Default figure size of each chart, in inches
+CHART_FIGSIZES = {
+    'pie': (10, 8),
+    'bar': (14, 8),
+    'size': (10, 6),
+    'elbow': (14, 6)
+}
+
+IMAGE_MEDIA_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+
+def elbow_chart_name(warm_start):
+    return f"elbow-{'warm' if warm_start else 'cold'}"
+
+
+def chart_image_size(chart, width=None, height=None, dpi=100, max_pixels=CHART_IMAGE_MAX_PIXELS):
+    # Resolve the pixel size of a chart image; a missing side keeps the
+    # chart's default aspect ratio. A derived size with a side over
+    # max_pixels is scaled down, keeping the aspect ratio.
+    default_width, default_height = CHART_FIGSIZES[chart]
+    if width is not None and height is not None:
+        return width, height
+    if width is None and height is None:
+        width = round(default_width * dpi)
+    if width is None:
+        width = round(height * default_width / default_height)
+    if height is None:
+        height = round(width * default_height / default_width)
+    scale = min(1.0, max_pixels / max(width, height))
+    return round(width * scale), round(height * scale)
+
+
+def chart_image_name(chart, image_format, width, height, dpi, warm_start=None):
+    base = elbow_chart_name(warm_start) if chart == 'elbow' else chart
+    return f"{base}-{width}x{height}-{dpi}dpi.{image_format}"
+
+
+def chart_etag(version, name):
+    # Strong validator: an image's bytes depend only on the model version
+    # and the render parameters encoded in its name
+    digest = hashlib.sha256(f"{version}/{name}".encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def _chart_path(version_dir, name):
+    # Image charts carry their extension in the name; the rest are JSON
+    if '.' in name:
+        return version_dir / CHARTS_DIR_NAME / name
+    return version_dir / CHARTS_DIR_NAME / f"{name}.json"
+
+
+def write_chart(version_dir, name, payload):
+    # Write atomically, so a reader never sees a partial chart
+    charts_dir = version_dir / CHARTS_DIR_NAME
+    charts_dir.mkdir(exist_ok=True)
+    path = _chart_path(version_dir, name)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    if isinstance(payload, bytes):
+        tmp_path.write_bytes(payload)
+    else:
+        tmp_path.write_text(json.dumps(payload))
+    os.replace(tmp_path, path)
+
+
+class ChartCache:
+    
+    def __init__(self, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_memory(self, version, name):
+        with self._lock:
+            payload = self._entries.get((version, name))
+            if payload is not None:
+                self._entries.move_to_end((version, name))
+                self.hits += 1
+            return payload
+    
+    def _remember(self, version, name, payload):
+        with self._lock:
+            self._entries[(version, name)] = payload
+            self._entries.move_to_end((version, name))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def load(self, version, name):
+        # Memory first, then the version directory (None on a miss)
+        payload = self.get_memory(version, name)
+        if payload is not None:
+            return payload
+        version_dir = model_version_dir(version)
+        try:
+            if version_dir is None:
+                raise FileNotFoundError(version)
+            path = _chart_path(version_dir, name)
+            payload = path.read_bytes() if '.' in name else json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(version, name, payload)
+        with self._lock:
+            self.hits += 1
+        return payload
+    
+    def set(self, version, name, payload, persist=True):
+        # Versions without a directory (legacy models) are cached in memory only
+        self._remember(version, name, payload)
+        if not persist:
+            return
+        version_dir = model_version_dir(version)
+        if version_dir is not None:
+            write_chart(version_dir, name, payload)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Global chart cache instance
+chart_cache = ChartCache()
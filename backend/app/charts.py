@@ -6,35 +6,24 @@ import seaborn as sns
 import io
 import base64
 from pathlib import Path
+from app.chart_cache import CHART_FIGSIZES
 
 # Set style
 sns.set_style("whitegrid")
 plt.rcParams['figure.facecolor'] = 'white'
 
+COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8', '#82ca9d', '#ffc658', '#ff7c7c']
 
-def generate_cluster_charts(clusters_data):
-    # Generate cluster visualization charts
-    # Returns: dict with base64 encoded images
+
+def pie_figure(clusters_data, figsize=CHART_FIGSIZES['pie']):
+    # Pie Chart - Cluster Distribution
     clusters = clusters_data['clusters']
-    
-    # Prepare data
-    cluster_names = [c['cluster_name'] for c in clusters]
-    sizes = [c['size'] for c in clusters]
-    avg_ages = [c['avg_age'] for c in clusters]
-    avg_incomes = [c['avg_income'] for c in clusters]
-    avg_spending = [c['avg_spending_score'] for c in clusters]
-    avg_frequency = [c['avg_purchase_frequency'] for c in clusters]
-    
-    charts = {}
-    
-    # 1. Pie Chart - Cluster Distribution
-    fig, ax = plt.subplots(figsize=(10, 8))
-    colors = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8', '#82ca9d', '#ffc658', '#ff7c7c']
+    fig, ax = plt.subplots(figsize=figsize)
     wedges, texts, autotexts = ax.pie(
-        sizes, 
-        labels=cluster_names, 
+        [c['size'] for c in clusters],
+        labels=[c['cluster_name'] for c in clusters],
         autopct='%1.1f%%',
-        colors=colors[:len(clusters)],
+        colors=COLORS[:len(clusters)],
         startangle=90,
         textprops={'fontsize': 12, 'weight': 'bold'}
     )
@@ -45,11 +34,19 @@ def generate_cluster_charts(clusters_data):
         autotext.set_color('white')
     
     plt.tight_layout()
-    charts['pie_chart'] = fig_to_base64(fig)
-    plt.close(fig)
+    return fig
+
+
+def bar_figure(clusters_data, figsize=CHART_FIGSIZES['bar']):
+    # Bar Chart - Cluster Characteristics
+    clusters = clusters_data['clusters']
+    cluster_names = [c['cluster_name'] for c in clusters]
+    avg_ages = [c['avg_age'] for c in clusters]
+    avg_incomes = [c['avg_income'] for c in clusters]
+    avg_spending = [c['avg_spending_score'] for c in clusters]
+    avg_frequency = [c['avg_purchase_frequency'] for c in clusters]
     
-    # 2. Bar Chart - Cluster Characteristics
-    fig, ax = plt.subplots(figsize=(14, 8))
+    fig, ax = plt.subplots(figsize=figsize)
     x = range(len(cluster_names))
     width = 0.2
     
@@ -67,16 +64,18 @@ def generate_cluster_charts(clusters_data):
     ax.grid(axis='y', alpha=0.3)
     
     plt.tight_layout()
-    charts['bar_chart'] = fig_to_base64(fig)
-    plt.close(fig)
-    
-    # 3. Heatmap - Cluster Features
-    fig, ax = plt.subplots(figsize=(12, 8))
+    return fig
+
+
+def size_figure(clusters_data, figsize=CHART_FIGSIZES['size']):
+    # Horizontal Bar Chart - Cluster Sizes
+    clusters = clusters_data['clusters']
+    cluster_names = [c['cluster_name'] for c in clusters]
+    sizes = [c['size'] for c in clusters]
     
-    # 3. Horizontal Bar Chart - Cluster Sizes
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig, ax = plt.subplots(figsize=figsize)
     y_pos = range(len(cluster_names))
-    ax.barh(y_pos, sizes, color=colors[:len(clusters)])
+    ax.barh(y_pos, sizes, color=COLORS[:len(clusters)])
     ax.set_yticks(y_pos)
     ax.set_yticklabels(cluster_names)
     ax.set_xlabel('Number of Customers', fontsize=12, weight='bold')
@@ -88,21 +87,17 @@ def generate_cluster_charts(clusters_data):
         ax.text(v + max(sizes)*0.01, i, str(v), va='center', fontsize=10, weight='bold')
     
     plt.tight_layout()
-    charts['size_chart'] = fig_to_base64(fig)
-    plt.close(fig)
-    
-    return charts
+    return fig
 
 
-def generate_elbow_chart(elbow_data):
-    # Generate elbow method chart
-    # Returns: base64 encoded image
+def elbow_figure(elbow_data, figsize=CHART_FIGSIZES['elbow']):
+    # Elbow method chart
     k_range = elbow_data['k_range']
     inertias = elbow_data['inertias']
     silhouette_scores = elbow_data['silhouette_scores']
     optimal_k = elbow_data['optimal_k']
     
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=figsize)
     
     # Inertia plot
     ax1.plot(k_range, inertias, 'bo-', linewidth=2, markersize=8)
@@ -123,17 +118,59 @@ def generate_elbow_chart(elbow_data):
     ax2.legend()
     
     plt.tight_layout()
+    return fig
+
+
+CHART_FIGURES = {
+    'pie': pie_figure,
+    'bar': bar_figure,
+    'size': size_figure,
+    'elbow': elbow_figure
+}
+
+
+def generate_cluster_charts(clusters_data):
+    # Generate cluster visualization charts
+    # Returns: dict with base64 encoded images
+    charts = {}
+    for key, figure in (('pie_chart', pie_figure), ('bar_chart', bar_figure), ('size_chart', size_figure)):
+        fig = figure(clusters_data)
+        charts[key] = fig_to_base64(fig)
+        plt.close(fig)
+    return charts
+
+
+def generate_elbow_chart(elbow_data):
+    # Generate elbow method chart
+    # Returns: base64 encoded image
+    fig = elbow_figure(elbow_data)
     chart = fig_to_base64(fig)
     plt.close(fig)
     
     return chart
 
 
+def render_figure(fig, image_format='png', dpi=100, bbox_inches=None):
+    # Render a figure to raw PNG or SVG bytes
+    buf = io.BytesIO()
+    # No creation date in the SVG, so the same chart always renders the same bytes
+    metadata = {'Date': None} if image_format == 'svg' else None
+    fig.savefig(buf, format=image_format, dpi=dpi, bbox_inches=bbox_inches, metadata=metadata)
+    return buf.getvalue()
+
+
+def render_chart_image(chart, data, image_format='png', width=None, height=None, dpi=100):
+    # Render one chart at exactly width x height pixels
+    # Returns: image bytes
+    figsize = CHART_FIGSIZES[chart] if width is None else (width / dpi, height / dpi)
+    fig = CHART_FIGURES[chart](data, figsize=figsize)
+    try:
+        return render_figure(fig, image_format, dpi)
+    finally:
+        plt.close(fig)
+
+
 def fig_to_base64(fig):
     # Convert matplotlib figure to base64 encoded string
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-    buf.seek(0)
-    img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    buf.close()
+    img_base64 = base64.b64encode(render_figure(fig, 'png', 100, bbox_inches='tight')).decode('utf-8')
     return f"data:image/png;base64,{img_base64}"
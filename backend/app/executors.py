@@ -0,0 +1,99 @@
+# Execution layer for blocking and CPU-heavy work in request handlers
+#
+# Blocking DB/IO work runs on a bounded thread pool. It is anyio's default
+# thread limiter, so plain `def` route handlers and dependencies (which
+# FastAPI runs in threads) share it with run_io. CPU-heavy work runs on a
+# process pool, off the event loop and out of the GIL. Work that must not be
+# allowed to pile up (password hashing) gets its own BoundedExecutor.
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from anyio import to_thread
+from app.utils import IO_POOL_SIZE, CPU_POOL_SIZE
+
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+def configure_io_pool(size=IO_POOL_SIZE):
+    # Must run inside the event loop; the limiter is per loop
+    to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def _get_cpu_pool():
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            # spawn, as fork after OpenMP/BLAS threads have started can deadlock
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=CPU_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _cpu_pool
+
+
+async def run_io(fn, *args, **kwargs):
+    # Run blocking work (DB queries, file IO, bcrypt) on the IO thread pool
+    return await to_thread.run_sync(partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    # Run CPU-heavy work on the process pool. fn and its arguments must be
+    # picklable (module-level functions and plain data).
+    pool = _get_cpu_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died; drop the pool so the next call starts a fresh one
+        shutdown_cpu_pool(pool)
+        raise
+
+
+def shutdown_cpu_pool(pool=None):
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is None or (pool is not None and pool is not _cpu_pool):
+            return
+        pool, _cpu_pool = _cpu_pool, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised instead of queueing when a bounded executor is full"""
+
+
+class BoundedExecutor:
+    # Thread pool admitting at most max_workers running plus max_queue
+    # waiting calls. Past that, calls fail fast with ExecutorBusyError (the
+    # API answers 503) instead of queueing without bound.
+    
+    def __init__(self, max_workers, max_queue, name):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+    
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(f"Too many pending {self.name} requests, retry shortly")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+    
+    def call(self, fn, *args, **kwargs):
+        # Blocking call, for sync code running off the event loop
+        return self.submit(fn, *args, **kwargs).result()
+    
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+    
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,172 @@
+# Write-behind batching of prediction history rows
+#
+# In batched mode /predict queues its history rows here instead of
+# committing them itself. A background task bulk-inserts them, one
+# transaction per HISTORY_BATCH_SIZE rows, when that many are pending or
+# HISTORY_FLUSH_SECONDS have passed. Commits (and their fsyncs) are then
+# shared by many requests. The queue is bounded: when it is full, producers
+# flush it themselves before adding more, which is the backpressure. Rows
+# still queued at shutdown are flushed by stop(), which lets the flusher
+# finish its current batch rather than cancelling it.
+import asyncio
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from app.database import AsyncSessionLocal, PredictionHistory
+from app.utils import HISTORY_BATCH_SIZE, HISTORY_FLUSH_SECONDS, HISTORY_MAX_PENDING
+
+HISTORY_WRITE_MODES = ("sync", "batched")
+
+
+def resolve_write_mode(mode):
+    # Reject unknown HISTORY_WRITE_MODE values instead of silently syncing
+    if mode not in HISTORY_WRITE_MODES:
+        raise ValueError(
+            f"Unknown history write mode '{mode}'. Choose one of: {', '.join(HISTORY_WRITE_MODES)}"
+        )
+    return mode
+
+
+class HistoryWriter:
+    
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size=HISTORY_BATCH_SIZE,
+                 flush_interval=HISTORY_FLUSH_SECONDS, max_pending=HISTORY_MAX_PENDING):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._task = None
+        self._wake = None
+        self._flush_lock = None
+        self._stopping = False
+        self.rows_submitted = 0
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_flushes = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+        self.max_pending_seen = 0
+        self.last_flush_at = None
+        self.last_flush_seconds = None
+        self.last_error = None
+    
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+    
+    async def start(self):
+        # Must be called on the event loop that will submit rows
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        # Let the flusher finish the batch it is writing and exit, then
+        # write whatever is still queued
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        await self.flush()
+    
+    async def _write(self, rows):
+        async with self.session_factory() as db:
+            await db.execute(insert(PredictionHistory), rows)
+            await db.commit()
+    
+    async def submit(self, rows):
+        # Queue history rows (PredictionHistory column dicts). Without a
+        # running flusher they are written at once.
+        self.rows_submitted += len(rows)
+        if not self.running:
+            await self._write(rows)
+            self.rows_written += len(rows)
+            return
+        
+        if len(self._pending) + len(rows) > self.max_pending:
+            self.backpressure_waits += 1
+            start = time.perf_counter()
+            await self.flush()
+            self.backpressure_seconds += time.perf_counter() - start
+        self._pending.extend(rows)
+        self.max_pending_seen = max(self.max_pending_seen, len(self._pending))
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+    
+    async def flush(self):
+        # Write every queued row, HISTORY_BATCH_SIZE per transaction. A failed
+        # batch goes back to the head of the queue and the error is raised.
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            start = time.perf_counter()
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:len(batch)]
+                try:
+                    await self._write(batch)
+                except BaseException as e:
+                    # Cancellation included: the batch is never dropped
+                    self._pending[:0] = batch
+                    if isinstance(e, Exception):
+                        self.failed_flushes += 1
+                        self.last_error = str(e)
+                    raise
+                self.rows_written += len(batch)
+                self.batches_written += 1
+            self.last_flush_at = datetime.utcnow()
+            self.last_flush_seconds = round(time.perf_counter() - start, 6)
+    
+    async def try_flush(self, timeout):
+        # Best-effort flush for readers: wait at most timeout seconds and
+        # swallow errors (failed rows stay queued and show in stats()). A
+        # flush that takes longer keeps running in the background rather
+        # than being cancelled mid-commit. Returns True if it completed.
+        if self._flush_lock is None or not (self._pending or self._flush_lock.locked()):
+            return True
+        task = asyncio.ensure_future(self.flush())
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        finished, _ = await asyncio.wait({task}, timeout=timeout)
+        return bool(finished) and not task.cancelled() and task.exception() is None
+    
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                # Kept queued and reported in stats(); retried next interval
+                pass
+    
+    def stats(self):
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "max_pending_seen": self.max_pending_seen,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "rows_submitted": self.rows_submitted,
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "failed_flushes": self.failed_flushes,
+            "backpressure_waits": self.backpressure_waits,
+            "backpressure_seconds": round(self.backpressure_seconds, 6),
+            "last_flush_at": self.last_flush_at,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_error": self.last_error
+        }
+
+
+# Global history writer instance
+history_writer = HistoryWriter()
@@ -0,0 +1,40 @@
+# Request-path inference without sklearn
+import numpy as np
+from app.utils import get_cluster_name, calculate_confidence_batch
+
+
+class InferenceKernel:
+    # KMeans + StandardScaler compiled into two arrays when a model is loaded.
+    # Scaling is x_s = (x - mean) / scale, so the distance from x_s to a
+    # centre c is the distance from x / scale to c + mean / scale: the scaler
+    # folds into the centroids and one matrix product yields every distance,
+    # the argmin and the confidence, with no sklearn validation or
+    # threadpool setup per call.
+    
+    def __init__(self, kmeans, scaler, feature_names):
+        n_features = kmeans.cluster_centers_.shape[1]
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n_features)
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n_features)
+        
+        self.weights = 1.0 / np.asarray(scale, dtype=np.float64)
+        self.centers = np.asarray(kmeans.cluster_centers_, dtype=np.float64) + mean * self.weights
+        self.centers_t = np.ascontiguousarray(self.centers.T)
+        self.center_norms = (self.centers ** 2).sum(axis=1)
+        self.cluster_names = [
+            get_cluster_name(cluster_id, kmeans.cluster_centers_, feature_names)
+            for cluster_id in range(len(self.centers))
+        ]
+    
+    def distances(self, features):
+        # (n_samples, n_features) raw features -> (n_samples, n_clusters),
+        # via ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 like sklearn's
+        # euclidean_distances
+        X = np.asarray(features, dtype=np.float64) * self.weights
+        squared = (X * X).sum(axis=1)[:, None] - 2 * (X @ self.centers_t) + self.center_norms
+        return np.sqrt(np.maximum(squared, 0, out=squared), out=squared)
+    
+    def predict(self, features):
+        # Returns (clusters, confidences)
+        distances = self.distances(features)
+        clusters = distances.argmin(axis=1)
+        return clusters, calculate_confidence_batch(distances, clusters)
@@ -0,0 +1,153 @@
+# Background training jobs
+import multiprocessing
+import queue
+import threading
+import uuid
+from datetime import datetime
+from app.model import ml_model
+from app.utils import TRAINING_JOB_HISTORY
+
+
+def _training_worker(params, events):
+    # Runs in a separate process: train and persist a model, streaming
+    # progress and the final outcome back through the events queue
+    from app.model import CustomerSegmentationModel
+    
+    model = CustomerSegmentationModel()
+    try:
+        metrics = model.train(
+            progress_callback=lambda progress, stage: events.put(("progress", progress, stage)),
+            **params
+        )
+        events.put(("succeeded", metrics))
+    except Exception as e:
+        events.put(("failed", str(e)))
+
+
+class TrainingJobConflictError(RuntimeError):
+    """Raised when a job with other parameters is already queued or running"""
+    
+    def __init__(self, job):
+        super().__init__(f"Training job {job['job_id']} is already {job['state']}")
+        self.job = job
+
+
+class TrainingJobManager:
+    # Runs one training job at a time in a spawned worker process, so the
+    # API process never blocks on training. Submitting the same parameters
+    # while a job is queued or running returns that job instead of starting
+    # another; other parameters raise TrainingJobConflictError.
+    
+    ACTIVE_STATES = ("queued", "running")
+    
+    def __init__(self, on_success=None, max_history=TRAINING_JOB_HISTORY):
+        self.on_success = on_success
+        self.max_history = max_history
+        self._jobs = {}
+        self._active_id = None
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+    
+    def submit(self, params):
+        # Returns (job, coalesced)
+        with self._lock:
+            if self._active_id is not None:
+                active = dict(self._jobs[self._active_id])
+                if active['params'] != params:
+                    raise TrainingJobConflictError(active)
+                return active, True
+            
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'state': "queued",
+                'progress': 0.0,
+                'stage': "queued",
+                'params': params,
+                'metrics': None,
+                'error': None,
+                'created_at': datetime.utcnow(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self._active_id = job_id
+            self._prune()
+            job = dict(self._jobs[job_id])
+        
+        threading.Thread(target=self._run, args=(job_id, params), daemon=True).start()
+        return job, False
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+    
+    def active_job(self):
+        with self._lock:
+            return dict(self._jobs[self._active_id]) if self._active_id else None
+    
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+    
+    def _prune(self):
+        # Drop the oldest finished jobs beyond max_history
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job['state'] not in self.ACTIVE_STATES and job_id != self._active_id
+        ]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+    
+    def _run(self, job_id, params):
+        events = self._context.Queue()
+        process = self._context.Process(
+            target=_training_worker, args=(params, events), daemon=True
+        )
+        self._update(job_id, state="running", stage="starting worker", started_at=datetime.utcnow())
+        
+        try:
+            process.start()
+            outcome = self._wait_for_outcome(job_id, process, events)
+            process.join()
+            
+            if outcome[0] == "succeeded":
+                if self.on_success is not None:
+                    self._update(job_id, stage="loading model")
+                    self.on_success(outcome[1])
+                self._update(job_id, state="succeeded", progress=1.0, stage="done", metrics=outcome[1])
+            else:
+                self._update(job_id, state="failed", stage="failed", error=outcome[1])
+        except Exception as e:
+            self._update(job_id, state="failed", stage="failed", error=str(e))
+        finally:
+            self._update(job_id, finished_at=datetime.utcnow())
+            with self._lock:
+                self._active_id = None
+    
+    def _wait_for_outcome(self, job_id, process, events):
+        while True:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                # The worker may have exited right after its last put
+                try:
+                    event = events.get(timeout=0.5)
+                except queue.Empty:
+                    return ("failed", f"Training process exited with code {process.exitcode}")
+            
+            if event[0] == "progress":
+                self._update(job_id, progress=round(event[1], 2), stage=event[2])
+            else:
+                return event
+
+
+def _reload_serving_model(metrics):
+    # Swap the version the worker just published into the API process
+    ml_model.load_models(metrics.get('model_version'))
+
+
+# Global job manager
+training_jobs = TrainingJobManager(on_success=_reload_serving_model)
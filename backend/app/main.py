@@ -1,21 +1,97 @@
 # FastAPI main application
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import json
-from app.schema import CustomerInput, PredictionResponse, TrainResponse, ClustersResponse
-from app.model import ml_model
-from app.database import init_db, get_db, PredictionHistory, User
-from app.auth import get_current_active_user
+from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Optional, Literal
+from app.schema import (
+    CustomerInput,
+    PredictionResponse,
+    BatchPredictionRequest,
+    BatchPredictionResponse,
+    TrainRequest,
+    TrainResponse,
+    TrainJobResponse,
+    ClustersResponse,
+    LiveSegmentsResponse,
+    ReadinessResponse
+)
+from app.model import (
+    ml_model,
+    elbow_data_for_version,
+    render_cluster_charts,
+    render_elbow_chart_for_version,
+    render_chart_image_for_version
+)
+from app.chart_cache import (
+    chart_cache,
+    elbow_chart_name,
+    chart_image_size,
+    chart_image_name,
+    chart_etag,
+    etag_matches,
+    IMAGE_MEDIA_TYPES
+)
+from app.utils import (
+    WARMUP_ON_STARTUP,
+    HISTORY_WRITE_MODE,
+    HISTORY_READ_FLUSH_SECONDS,
+    FEATURE_COLUMNS,
+    SCORE_CHUNK_ROWS,
+    SWEEP_WARM_START,
+    CHART_IMAGE_MAX_PIXELS,
+    CHART_IMAGE_MAX_DPI
+)
+from app.jobs import training_jobs, TrainingJobConflictError
+from app.segment_stats import segment_stats
+from app.warmup import readiness, warm_up
+from app.history_writer import history_writer, resolve_write_mode
+from app.database import init_db, get_async_db, PredictionHistory, User
+from app.auth import get_current_active_user, get_async_current_active_user
 from app.routes import auth, users, profiles, admin
-from app.charts import generate_cluster_charts, generate_elbow_chart
+from app.executors import configure_io_pool, run_io, run_cpu, shutdown_cpu_pool, ExecutorBusyError
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Startup work lives here rather than at import time, so importing the
+    # app (workers, tests, tooling) stays cheap
+    write_mode = resolve_write_mode(HISTORY_WRITE_MODE)
+    init_db()
+    configure_io_pool()
+    readiness.reset()
+    warm_up_task = None
+    if WARMUP_ON_STARTUP:
+        # In the background: the server accepts connections (and answers
+        # /ready with 503) while the model warms up
+        warm_up_task = asyncio.create_task(warm_up(readiness))
+    else:
+        readiness.finish("ready", model_version=ml_model.version)
+    if write_mode == "batched":
+        await history_writer.start()
+    await run_io(segment_stats.restore)
+    checkpoint_task = asyncio.create_task(segment_stats.run_checkpoints())
+    yield
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    checkpoint_task.cancel()
+    if segment_stats.dirty:
+        await run_io(segment_stats.checkpoint)
+    # Write any history rows still queued before the process exits
+    await history_writer.stop()
+    shutdown_cpu_pool()
 
-init_db()
 
 app = FastAPI(
     title="Customer Segmentation API",
     description="ML-powered customer segmentation using K-Means clustering",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Allow frontend to connect
@@ -27,6 +103,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(ExecutorBusyError)
+async def executor_busy_handler(request, exc):
+    # A bounded executor (password hashing) is full: fail fast, ask to retry
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(profiles.router)
@@ -38,31 +125,94 @@ async def health_check():
     return {"status": "healthy", "message": "Customer Segmentation API is running"}
 
 
-@app.post("/train", response_model=TrainResponse)
-async def train_model():
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    # 503 until start-up warm-up has finished, for load balancer gating
+    snapshot = readiness.snapshot()
+    if not snapshot['ready']:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResponse(**snapshot)
+
+
+async def get_serving_bundle():
+    # Capture the model bundle once per request so a concurrent retrain or
+    # rollback can never pair one version's kmeans with another's scaler
+    bundle = ml_model.bundle
+    if bundle is None:
+        if not await run_io(ml_model.ensure_loaded):
+            raise HTTPException(status_code=400, detail="Model not trained")
+        bundle = ml_model.bundle
+    return bundle
+
+
+async def _save_history(db, user_id, customers_data, predictions):
+    # Save predictions to history in one insert and one commit, or queue
+    # them for the write-behind writer in batched mode
+    created_at = datetime.utcnow()
+    rows = [
+        {
+            'user_id': user_id,
+            'customer_data': json.dumps(customer_data),
+            'cluster': prediction['cluster'],
+            'cluster_name': prediction['cluster_name'],
+            'confidence': prediction['confidence'],
+            'created_at': created_at
+        }
+        for customer_data, prediction in zip(customers_data, predictions)
+    ]
+    if history_writer.running:
+        await history_writer.submit(rows)
+        return
+    await db.execute(insert(PredictionHistory), rows)
+    await db.commit()
+
+
+def _job_response(job, coalesced=False):
+    metrics = job['metrics']
+    return TrainJobResponse(
+        job_id=job['job_id'],
+        state=job['state'],
+        progress=job['progress'],
+        stage=job['stage'],
+        coalesced=coalesced,
+        metrics=TrainResponse(message="Model trained successfully", **metrics) if metrics else None,
+        error=job['error'],
+        created_at=job['created_at'],
+        started_at=job['started_at'],
+        finished_at=job['finished_at']
+    )
+
+
+@app.post("/train", response_model=TrainJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def train_model(params: Optional[TrainRequest] = None):
+    # Training runs in a worker process; poll GET /train/{job_id} for the outcome
+    params = params or TrainRequest()
     try:
-        metrics = ml_model.train()
-        return TrainResponse(
-            message="Model trained successfully",
-            n_clusters=metrics['n_clusters'],
-            silhouette_score=metrics['silhouette_score'],
-            inertia=metrics['inertia']
+        job, coalesced = training_jobs.submit(params.model_dump())
+    except TrainingJobConflictError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{e}; retry when it finishes (GET /train/{e.job['job_id']})"
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
+    return _job_response(job, coalesced)
+
+
+@app.get("/train/{job_id}", response_model=TrainJobResponse)
+async def get_training_job(job_id: str):
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return _job_response(job)
 
 
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_segment(
     customer: CustomerInput,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    bundle = await get_serving_bundle()
     try:
-        if ml_model.kmeans is None:
-            if not ml_model.load_models():
-                raise HTTPException(status_code=400, detail="Model not trained")
-        
         customer_data = {
             'sex': customer.sex,
             'age': customer.age,
@@ -71,18 +221,12 @@ async def predict_segment(
             'purchase_frequency': customer.purchase_frequency
         }
         
-        prediction = ml_model.predict(customer_data)
+        prediction = ml_model.predict(customer_data, bundle)
         
         # Save to history
-        history_entry = PredictionHistory(
-            user_id=current_user.id,
-            customer_data=json.dumps(customer_data),
-            cluster=prediction['cluster'],
-            cluster_name=prediction['cluster_name'],
-            confidence=prediction['confidence']
-        )
-        db.add(history_entry)
-        db.commit()
+        await _save_history(db, current_user.id, [customer_data], [prediction])
+        
+        segment_stats.update(bundle.version, prediction['cluster'], prediction['cluster_name'], customer_data)
         
         return PredictionResponse(
             cluster=prediction['cluster'],
@@ -96,14 +240,122 @@ async def predict_segment(
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_segments_batch(
+    batch: BatchPredictionRequest,
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    bundle = await get_serving_bundle()
+    try:
+        customers_data = [customer.model_dump() for customer in batch.customers]
+        
+        predictions = await run_io(ml_model.predict_batch, customers_data, bundle)
+        
+        # Save to history in one bulk insert
+        await _save_history(db, current_user.id, customers_data, predictions)
+        
+        segment_stats.update_batch(
+            bundle.version,
+            [prediction['cluster'] for prediction in predictions],
+            {prediction['cluster']: prediction['cluster_name'] for prediction in predictions},
+            customers_data
+        )
+        
+        return BatchPredictionResponse(
+            count=len(predictions),
+            predictions=[
+                PredictionResponse(customer_data=customer_data, **prediction)
+                for customer_data, prediction in zip(customers_data, predictions)
+            ]
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
+
+def _stream_scores(chunks, bundle, output_format):
+    # Score one chunk at a time, so memory stays bounded by the chunk size
+    # however large the upload is. Chunks are parsed lazily, after the 200
+    # has been sent, so a chunk that can't be parsed or scored ends the
+    # stream with an error record instead of a silently truncated body.
+    header = True
+    rows_scored = 0
+    chunks = iter(chunks)
+    while True:
+        try:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            scores = ml_model.predict_frame(chunk, bundle)
+        except ValueError as e:
+            error = f"Could not score rows after row {rows_scored}: {e}"
+            if output_format == "csv":
+                yield f"# error: {error}\n"
+            else:
+                yield json.dumps({"error": error, "rows_scored": rows_scored}) + "\n"
+            return
+        if 'CustomerID' in chunk.columns:
+            scores.insert(0, 'CustomerID', chunk['CustomerID'])
+        rows_scored += len(scores)
+        if output_format == "csv":
+            yield scores.to_csv(index=False, header=header)
+            header = False
+        elif len(scores):
+            yield scores.to_json(orient="records", lines=True).rstrip("\n") + "\n"
+
+
+def _open_upload(stream):
+    # Build the chunked reader and parse the first chunk together: read_csv
+    # already reads from the upload (sniffing compression, encoding and the
+    # header), so neither may run on the event loop
+    import pandas as pd
+    reader = pd.read_csv(
+        stream,
+        chunksize=SCORE_CHUNK_ROWS,
+        usecols=lambda column: column in FEATURE_COLUMNS or column == 'CustomerID'
+    )
+    return reader, next(reader, None)
+
+
+@app.post("/predict/upload")
+async def predict_segments_upload(
+    file: UploadFile = File(..., description="CSV with the columns of data/customers.csv"),
+    output_format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_async_current_active_user)
+):
+    bundle = await get_serving_bundle()
+    try:
+        reader, first_chunk = await run_io(_open_upload, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse CSV: {str(e)}")
+    
+    # Fail fast, before any output is streamed
+    if first_chunk is None:
+        raise HTTPException(status_code=400, detail="Uploaded CSV has no rows")
+    missing = [column for column in FEATURE_COLUMNS if column not in first_chunk.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
+    
+    def chunks():
+        yield first_chunk
+        yield from reader
+    
+    if output_format == "csv":
+        return StreamingResponse(
+            _stream_scores(chunks(), bundle, "csv"),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="segments.csv"'}
+        )
+    return StreamingResponse(_stream_scores(chunks(), bundle, "ndjson"), media_type="application/x-ndjson")
+
+
 @app.get("/clusters", response_model=ClustersResponse)
 async def get_clusters(current_user: User = Depends(get_current_active_user)):
+    bundle = await get_serving_bundle()
     try:
-        if ml_model.kmeans is None:
-            if not ml_model.load_models():
-                raise HTTPException(status_code=400, detail="Model not trained")
-        
-        stats = ml_model.get_cluster_statistics()
+        stats = ml_model.get_cluster_statistics(bundle)
         return ClustersResponse(**stats)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -111,23 +363,43 @@ async def get_clusters(current_user: User = Depends(get_current_active_user)):
         raise HTTPException(status_code=500, detail=f"Failed to get clusters: {str(e)}")
 
 
+@app.get("/segments/live", response_model=LiveSegmentsResponse)
+async def get_live_segments(current_user: User = Depends(get_current_active_user)):
+    # Running statistics of customers scored through /predict by the model
+    # being served
+    return LiveSegmentsResponse(**segment_stats.snapshot(ml_model.version))
+
+
 @app.get("/elbow")
-async def get_elbow_data(current_user: User = Depends(get_current_active_user)):
+async def get_elbow_data(
+    warm_start: Optional[bool] = None,
+    current_user: User = Depends(get_current_active_user)
+):
     try:
-        return ml_model.get_elbow_data()
+        return await run_cpu(elbow_data_for_version, ml_model.version, warm_start)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get elbow data: {str(e)}")
 
 
+async def cached_chart(version, name, render, *args, persist=True):
+    # Serve a chart pre-rendered for this model version from memory or
+    # disk; only on a miss render it on the CPU pool and keep the result.
+    # persist=False keeps it in the bounded memory cache only.
+    payload = chart_cache.get_memory(version, name)
+    if payload is None and persist:
+        payload = await run_io(chart_cache.load, version, name)
+    if payload is None:
+        payload = await run_cpu(render, *args)
+        await run_io(chart_cache.set, version, name, payload, persist)
+    return payload
+
+
 @app.get("/charts/clusters")
 async def get_cluster_charts(current_user: User = Depends(get_current_active_user)):
+    bundle = await get_serving_bundle()
     try:
-        if ml_model.kmeans is None:
-            if not ml_model.load_models():
-                raise HTTPException(status_code=400, detail="Model not trained")
-        
-        stats = ml_model.get_cluster_statistics()
-        charts = generate_cluster_charts(stats)
+        stats = ml_model.get_cluster_statistics(bundle)
+        charts = await cached_chart(bundle.version, "clusters", render_cluster_charts, stats)
         
         return {
             "charts": charts,
@@ -139,11 +411,68 @@ async def get_cluster_charts(current_user: User = Depends(get_current_active_use
 
 
 @app.get("/charts/elbow")
-async def get_elbow_chart(current_user: User = Depends(get_current_active_user)):
+async def get_elbow_chart(
+    warm_start: Optional[bool] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    try:
+        version = ml_model.version
+        warm_start = SWEEP_WARM_START if warm_start is None else warm_start
+        if version is None:
+            return await run_cpu(render_elbow_chart_for_version, None, warm_start)
+        return await cached_chart(
+            version, elbow_chart_name(warm_start), render_elbow_chart_for_version, version, warm_start
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate chart: {str(e)}")
+
+
+@app.get("/charts/{chart}.{image_format}")
+async def get_chart_image(
+    chart: Literal["pie", "bar", "size", "elbow"],
+    image_format: Literal["png", "svg"],
+    request: Request,
+    width: Optional[int] = Query(None, ge=16, le=CHART_IMAGE_MAX_PIXELS, description="Width in pixels"),
+    height: Optional[int] = Query(None, ge=16, le=CHART_IMAGE_MAX_PIXELS, description="Height in pixels"),
+    dpi: int = Query(100, ge=10, le=CHART_IMAGE_MAX_DPI),
+    warm_start: Optional[bool] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    # Raw image bytes with an ETag, so browsers can cache charts and
+    # revalidate them with a 304 instead of downloading base64 JSON again
+    if chart == "elbow":
+        bundle = None
+        version = ml_model.version
+        warm_start = SWEEP_WARM_START if warm_start is None else warm_start
+    else:
+        bundle = await get_serving_bundle()
+        version = bundle.version
+        warm_start = None
+    # Only the default size is written to the version directory
+    default_size = width is None and height is None and dpi == 100
+    width, height = chart_image_size(chart, width, height, dpi)
+    media_type = IMAGE_MEDIA_TYPES[image_format]
+    
     try:
-        elbow_data = ml_model.get_elbow_data()
-        chart = generate_elbow_chart(elbow_data)
-        return {"chart": chart, "optimal_k": elbow_data['optimal_k']}
+        if version is None:
+            # No model version to validate against, so nothing to cache
+            content = await run_cpu(
+                render_chart_image_for_version, None, chart, image_format, width, height, dpi, warm_start
+            )
+            return Response(content, media_type=media_type, headers={"Cache-Control": "no-store"})
+        
+        name = chart_image_name(chart, image_format, width, height, dpi, warm_start)
+        headers = {"ETag": chart_etag(version, name), "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        stats = ml_model.get_cluster_statistics(bundle) if bundle is not None else None
+        content = await cached_chart(
+            version, name, render_chart_image_for_version,
+            version, chart, image_format, width, height, dpi, warm_start, stats,
+            persist=default_size
+        )
+        return Response(content, media_type=media_type, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate chart: {str(e)}")
 
@@ -152,12 +481,22 @@ async def get_elbow_chart(current_user: User = Depends(get_current_active_user))
 async def get_prediction_history(
     skip: int = 0,
     limit: int = 50,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    history = db.query(PredictionHistory).filter(
-        PredictionHistory.user_id == current_user.id
-    ).order_by(PredictionHistory.created_at.desc()).offset(skip).limit(limit).all()
+    # Read-your-writes: rows still queued by the history writer go in
+    # first, as far as that is possible within HISTORY_READ_FLUSH_SECONDS
+    await history_writer.try_flush(HISTORY_READ_FLUSH_SECONDS)
+    history = (await db.scalars(
+        select(PredictionHistory).where(
+            PredictionHistory.user_id == current_user.id
+        ).order_by(PredictionHistory.created_at.desc()).offset(skip).limit(limit)
+    )).all()
+    total = await db.scalar(
+        select(func.count()).select_from(PredictionHistory).where(
+            PredictionHistory.user_id == current_user.id
+        )
+    )
     
     return {
         "history": [
@@ -171,9 +510,7 @@ async def get_prediction_history(
             }
             for h in history
         ],
-        "total": db.query(PredictionHistory).filter(
-            PredictionHistory.user_id == current_user.id
-        ).count()
+        "total": total
     }
 
 
@@ -1,142 +1,530 @@
 # Machine Learning model management
+#
+# Serving a trained model only needs numpy, so the training stack (pandas,
+# sklearn through app.preprocess and app.silhouette) and the charting stack
+# are imported inside the functions that use them, on first use.
+import copy
+import json
+import threading
+from dataclasses import dataclass, field
 import numpy as np
-import pandas as pd
-from app.preprocess import (
-    load_dataset,
-    preprocess_data,
-    train_kmeans_model,
-    find_optimal_clusters
+from app.inference import InferenceKernel
+from app.chart_cache import write_chart, elbow_chart_name
+from app.cache import (
+    result_cache,
+    prediction_cache,
+    normalize_customer_features,
+    dataset_fingerprint,
+    make_cache_key
 )
 from app.utils import (
     save_model,
     load_model,
+    publish_model_version,
+    model_version_dir,
+    get_current_version,
+    set_current_version,
+    read_version_metadata,
+    list_model_versions,
     get_cluster_name,
-    calculate_confidence,
+    FEATURE_COLUMNS,
+    RANDOM_STATE,
+    N_INIT,
+    SWEEP_WARM_START,
+    WARM_START_N_INIT,
     KMEANS_MODEL_PATH,
     SCALER_MODEL_PATH,
-    DATASET_PATH
+    FEATURES_ARRAY_NAME,
+    LABELS_ARRAY_NAME,
+    CLUSTER_STATS_NAME
 )
 
 
+@dataclass(frozen=True)
+class ModelBundle:
+    # Everything a request needs from one trained model version. Bundles are
+    # never mutated: publishing a model swaps in a whole new bundle, and
+    # handlers read `ml_model.bundle` once so they never mix versions.
+    version: str
+    kmeans: object
+    scaler: object
+    feature_names: tuple
+    metadata: dict = field(default_factory=dict)
+    X_scaled: object = None
+    labels: object = None
+    cluster_stats: dict = None
+    kernel: object = None
+    
+    def __post_init__(self):
+        # Compile the request-path inference kernel once per version
+        if self.kernel is None:
+            object.__setattr__(self, 'kernel', InferenceKernel(self.kmeans, self.scaler, self.feature_names))
+
+
+def compute_cluster_statistics(kmeans, scaler, feature_names, X_scaled, labels=None):
+    # Get statistics for each cluster
+    if labels is None:
+        labels = kmeans.predict(X_scaled)
+    
+    # Per-cluster means of the scaled features. Scaling is affine, so
+    # unscaling the means gives the means of the original features.
+    n_clusters = int(kmeans.n_clusters)
+    sizes = np.bincount(labels, minlength=n_clusters)
+    sums = np.stack([
+        np.bincount(labels, weights=X_scaled[:, j], minlength=n_clusters)
+        for j in range(X_scaled.shape[1])
+    ], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = scaler.inverse_transform(sums / sizes[:, None])
+    
+    # Calculate statistics for each cluster
+    cluster_stats = []
+    
+    for cluster_id in range(n_clusters):
+        avg_age, avg_income, avg_spending, avg_frequency = means[cluster_id]
+        
+        stats = {
+            'cluster_id': int(cluster_id),
+            'cluster_name': get_cluster_name(cluster_id, kmeans.cluster_centers_, feature_names),
+            'size': int(sizes[cluster_id]),
+            'avg_age': float(avg_age),
+            'avg_income': float(avg_income),
+            'avg_spending_score': float(avg_spending),
+            'avg_purchase_frequency': float(avg_frequency)
+        }
+        
+        cluster_stats.append(stats)
+    
+    return {
+        'total_customers': int(X_scaled.shape[0]),
+        'n_clusters': n_clusters,
+        'clusters': cluster_stats
+    }
+
+
+def elbow_payload(sweep, warm_start):
+    # /elbow response from a sweep result
+    optimal_k, inertias, silhouette_scores, k_range, n_iters = sweep
+    return {
+        'optimal_k': optimal_k,
+        'k_range': k_range,
+        'inertias': inertias,
+        'silhouette_scores': silhouette_scores,
+        'n_iters': n_iters,
+        'warm_start': warm_start
+    }
+
+
 class CustomerSegmentationModel:
     
     def __init__(self):
-        self.kmeans = None
-        self.scaler = None
+        self.bundle = None
         self.feature_names = ['Age', 'Annual_Income', 'Spending_Score', 'Purchase_Frequency']
-        self.df = None
-        self.X_scaled = None
+        # Serialises writers (train/load/rollback); readers never take it
+        self._publish_lock = threading.Lock()
+    
+    @property
+    def kmeans(self):
+        bundle = self.bundle
+        return bundle.kmeans if bundle else None
+    
+    @property
+    def scaler(self):
+        bundle = self.bundle
+        return bundle.scaler if bundle else None
+    
+    @property
+    def df(self):
+        # The dataset behind the served model, read on demand: bundles keep
+        # only X_scaled, so no version pins a copy of the raw frame
+        if self.bundle is None:
+            return None
+        from app.preprocess import load_dataset
+        return load_dataset(columns=FEATURE_COLUMNS)
+    
+    @property
+    def X_scaled(self):
+        bundle = self.bundle
+        return bundle.X_scaled if bundle else None
+    
+    @property
+    def version(self):
+        bundle = self.bundle
+        return bundle.version if bundle else None
+        
+    def train(self, n_clusters=None, silhouette_method=None, engine=None,
+              batch_size=None, max_iter=None, dtype=None, warm_start=None,
+              progress_callback=None):
+        # progress_callback(fraction, stage) is called as training advances
+        report = progress_callback or (lambda progress, stage: None)
+        from app.preprocess import (
+            load_dataset,
+            preprocess_data,
+            train_kmeans_model,
+            resolve_engine,
+            resolve_dtype,
+            resolve_fit_params
+        )
+        from app.silhouette import resolve_silhouette_method
+        silhouette_method = resolve_silhouette_method(silhouette_method)
+        engine = resolve_engine(engine)
+        dtype = resolve_dtype(dtype)
+        default_batch_size = resolve_fit_params(engine)[0]
+        batch_size, max_iter = resolve_fit_params(engine, batch_size, max_iter)
         
-    def train(self, n_clusters=None):
         # Load and preprocess dataset
-        self.df = load_dataset()
-        self.X_scaled, self.feature_names, self.scaler = preprocess_data(self.df)
+        report(0.05, "loading dataset")
+        df = load_dataset(columns=FEATURE_COLUMNS)
+        report(0.15, "preprocessing")
+        X_scaled, feature_names, scaler = preprocess_data(df, dtype)
         
-        # Train model
-        self.kmeans, sil_score = train_kmeans_model(self.X_scaled, n_clusters)
+        # Pick k with the (cached) sweep when it isn't given
+        sweep = None
+        if n_clusters is None:
+            report(0.2, "selecting number of clusters")
+            sweep = self._sweep(X_scaled, silhouette_method, engine, batch_size, warm_start)
+            n_clusters = sweep[0]
         
-        # Save models
-        save_model(self.kmeans, KMEANS_MODEL_PATH)
-        save_model(self.scaler, SCALER_MODEL_PATH)
+        # Train model, reusing a cached fit of the same data and parameters
+        cache_key = make_cache_key("train", dataset_fingerprint(X_scaled), {
+            'n_clusters': n_clusters,
+            'silhouette_method': silhouette_method,
+            'engine': engine,
+            'batch_size': batch_size,
+            'max_iter': max_iter,
+            'random_state': RANDOM_STATE,
+            'n_init': N_INIT
+        })
+        report(0.6, "fitting model")
+        cached = result_cache.get(cache_key)
+        if cached is None:
+            cached = train_kmeans_model(
+                X_scaled,
+                n_clusters,
+                silhouette_method=silhouette_method,
+                engine=engine,
+                batch_size=batch_size,
+                max_iter=max_iter
+            )
+            result_cache.set(cache_key, cached)
+        kmeans, sil_score = cached
+        labels = kmeans.predict(X_scaled)
+        cluster_stats = compute_cluster_statistics(kmeans, scaler, feature_names, X_scaled, labels)
         
-        return {
-            'n_clusters': self.kmeans.n_clusters,
+        metrics = {
+            'n_clusters': int(kmeans.n_clusters),
             'silhouette_score': float(sil_score),
-            'inertia': float(self.kmeans.inertia_)
+            'silhouette_method': silhouette_method,
+            'inertia': float(kmeans.inertia_),
+            'engine': engine,
+            'dtype': dtype
         }
+        
+        # Render the charts now, so requests never have to. The elbow chart
+        # shows the default sweep, so it is only rendered here when that is
+        # the sweep training ran; otherwise the first request renders it.
+        report(0.85, "rendering charts")
+        from app.charts import generate_cluster_charts, generate_elbow_chart
+        charts = {'clusters': generate_cluster_charts(cluster_stats)}
+        sweep_warm_start = SWEEP_WARM_START if warm_start is None else warm_start
+        if sweep is not None and (silhouette_method, engine, batch_size) == (
+            resolve_silhouette_method(None), resolve_engine(None), default_batch_size
+        ):
+            elbow_data = elbow_payload(sweep, sweep_warm_start)
+            charts[elbow_chart_name(sweep_warm_start)] = {
+                'chart': generate_elbow_chart(elbow_data),
+                'optimal_k': elbow_data['optimal_k']
+            }
+        
+        # Publish a new registry version, then swap it in for serving
+        report(0.9, "saving model")
+        
+        def write_artifacts(version_dir):
+            save_model(kmeans, version_dir / KMEANS_MODEL_PATH.name)
+            save_model(scaler, version_dir / SCALER_MODEL_PATH.name)
+            # Scaled matrix and labels are memory-mapped back on load
+            np.save(version_dir / FEATURES_ARRAY_NAME, X_scaled)
+            np.save(version_dir / LABELS_ARRAY_NAME, labels)
+            (version_dir / CLUSTER_STATS_NAME).write_text(json.dumps(cluster_stats))
+            for name, payload in charts.items():
+                write_chart(version_dir, name, payload)
+        
+        with self._publish_lock:
+            version = publish_model_version(
+                write_artifacts, {'metrics': metrics, 'feature_names': feature_names}
+            )
+            bundle = ModelBundle(
+                version=version,
+                kmeans=kmeans,
+                scaler=scaler,
+                feature_names=tuple(feature_names),
+                metadata={'metrics': metrics},
+                X_scaled=X_scaled,
+                labels=labels,
+                cluster_stats=cluster_stats
+            )
+            self._swap_bundle(bundle)
+        
+        return {**metrics, 'model_version': version}
     
-    def load_models(self):
-        # Load trained models from disk
-        self.kmeans = load_model(KMEANS_MODEL_PATH)
-        self.scaler = load_model(SCALER_MODEL_PATH)
+    def _read_bundle(self, version):
+        # Load a published version (or the legacy unversioned files) from disk
+        features_path = labels_path = stats_path = None
+        if version is not None:
+            version_dir = model_version_dir(version)
+            if version_dir is None:
+                return None
+            kmeans = load_model(version_dir / KMEANS_MODEL_PATH.name)
+            scaler = load_model(version_dir / SCALER_MODEL_PATH.name)
+            metadata = read_version_metadata(version)
+            features_path = version_dir / FEATURES_ARRAY_NAME
+            labels_path = version_dir / LABELS_ARRAY_NAME
+            stats_path = version_dir / CLUSTER_STATS_NAME
+        else:
+            kmeans = load_model(KMEANS_MODEL_PATH)
+            scaler = load_model(SCALER_MODEL_PATH)
+            metadata = {}
+            version = "legacy"
+        
+        if kmeans is None or scaler is None:
+            return None
         
-        if self.kmeans is None or self.scaler is None:
-            return False
+        if features_path is not None and features_path.exists() and labels_path.exists():
+            # Read-only memory maps: no parsing, and the pages are shared
+            # between workers through the OS page cache
+            X_scaled = np.load(features_path, mmap_mode='r')
+            labels = np.load(labels_path, mmap_mode='r')
+            feature_names = metadata.get('feature_names', self.feature_names)
+        else:
+            # Legacy models and versions published before the arrays were
+            # saved: rebuild the matrix from the dataset in the model's dtype
+            from app.preprocess import load_dataset, preprocess_data
+            X_scaled, feature_names, _ = preprocess_data(
+                load_dataset(columns=FEATURE_COLUMNS), kmeans.cluster_centers_.dtype
+            )
+            labels = kmeans.predict(X_scaled)
         
-        # Load dataset for cluster statistics
-        self.df = load_dataset()
-        self.X_scaled, self.feature_names, _ = preprocess_data(self.df)
+        if stats_path is not None and stats_path.exists():
+            cluster_stats = json.loads(stats_path.read_text())
+        else:
+            cluster_stats = compute_cluster_statistics(kmeans, scaler, feature_names, X_scaled, labels)
         
-        return True
+        return ModelBundle(
+            version=version,
+            kmeans=kmeans,
+            scaler=scaler,
+            feature_names=tuple(feature_names),
+            metadata=metadata,
+            X_scaled=X_scaled,
+            labels=labels,
+            cluster_stats=cluster_stats
+        )
     
-    def predict(self, customer_data):
-        # Predict customer segment
-        if self.kmeans is None or self.scaler is None:
+    def load_models(self, version=None):
+        # Load the current registry version (or a specific one) and swap it in
+        with self._publish_lock:
+            bundle = self._read_bundle(version or get_current_version())
+            if bundle is None:
+                return False
+            self._swap_bundle(bundle)
+            return True
+    
+    def ensure_loaded(self):
+        # Load the current version unless one is already being served.
+        # Concurrent callers on a cold start wait for one load instead of
+        # each reading the model from disk.
+        if self.bundle is None:
+            with self._publish_lock:
+                if self.bundle is None:
+                    bundle = self._read_bundle(get_current_version())
+                    if bundle is not None:
+                        self._swap_bundle(bundle)
+        return self.bundle is not None
+    
+    def list_versions(self):
+        current = get_current_version()
+        return [
+            {**metadata, 'current': metadata['version'] == current}
+            for metadata in list_model_versions()
+        ]
+    
+    def rollback(self, version):
+        # Make an earlier version current: load it first, so a broken version
+        # never becomes current, then flip the pointer and swap the bundle in
+        with self._publish_lock:
+            bundle = self._read_bundle(version)
+            if bundle is None:
+                raise ValueError(f"Unknown model version: {version}")
+            set_current_version(version)
+            self._swap_bundle(bundle)
+        return bundle.metadata
+    
+    def _swap_bundle(self, bundle):
+        # Callers hold _publish_lock. Cached predictions belong to the old
+        # version, so they are dropped with it.
+        self.bundle = bundle
+        prediction_cache.clear()
+    
+    def predict(self, customer_data, bundle=None):
+        # Predict customer segment with one consistent model version,
+        # served from the prediction cache when these features were seen
+        bundle = bundle or self.bundle
+        if bundle is None:
             raise ValueError("Model not trained or loaded")
         
-        # Prepare and scale input data
-        features = np.array([[
-            customer_data['age'],
-            customer_data['annual_income'],
-            customer_data['spending_score'],
-            customer_data['purchase_frequency']
-        ]])
-        features_scaled = self.scaler.transform(features)
-        
-        # Predict cluster
-        cluster = int(self.kmeans.predict(features_scaled)[0])
-        
-        # Calculate confidence
-        distances = self.kmeans.transform(features_scaled)[0]
-        confidence = calculate_confidence(distances, cluster)
-        
-        # Get cluster name
-        cluster_name = get_cluster_name(cluster, self.kmeans.cluster_centers_, self.feature_names)
-        
-        return {
-            'cluster': cluster,
-            'cluster_name': cluster_name,
-            'confidence': confidence
-        }
+        features = normalize_customer_features(customer_data)
+        cache_key = (bundle.version, features) if features is not None else None
+        prediction = prediction_cache.get(cache_key)
+        if prediction is None:
+            prediction = self.predict_batch([customer_data], bundle)[0]
+            prediction_cache.set(cache_key, prediction)
+        return dict(prediction)
     
-    def get_cluster_statistics(self):
-        # Get statistics for each cluster
-        if self.kmeans is None or self.df is None:
+    def predict_batch(self, customers, bundle=None):
+        # Predict segments for many customers in one pass of the compiled
+        # inference kernel (no sklearn calls on the request path)
+        bundle = bundle or self.bundle
+        if bundle is None:
             raise ValueError("Model not trained or loaded")
+        kernel = bundle.kernel
+        
+        features = np.array([
+            [c['age'], c['annual_income'], c['spending_score'], c['purchase_frequency']]
+            for c in customers
+        ], dtype=np.float64).reshape(-1, 4)
+        clusters, confidences = kernel.predict(features)
         
-        # Predict clusters for all customers
-        clusters = self.kmeans.predict(self.X_scaled)
-        self.df['Cluster'] = clusters
-        
-        # Calculate statistics for each cluster
-        cluster_stats = []
-        
-        for cluster_id in range(self.kmeans.n_clusters):
-            cluster_data = self.df[self.df['Cluster'] == cluster_id]
-            
-            stats = {
-                'cluster_id': int(cluster_id),
-                'cluster_name': get_cluster_name(cluster_id, self.kmeans.cluster_centers_, self.feature_names),
-                'size': int(len(cluster_data)),
-                'avg_age': float(cluster_data['Age'].mean()),
-                'avg_income': float(cluster_data['Annual_Income'].mean()),
-                'avg_spending_score': float(cluster_data['Spending_Score'].mean()),
-                'avg_purchase_frequency': float(cluster_data['Purchase_Frequency'].mean())
+        return [
+            {
+                'cluster': cluster,
+                'cluster_name': kernel.cluster_names[cluster],
+                'confidence': confidence
             }
-            
-            cluster_stats.append(stats)
+            for cluster, confidence in zip(clusters.tolist(), confidences.tolist())
+        ]
+    
+    def predict_frame(self, df, bundle=None):
+        # Score a DataFrame with the dataset's feature columns. Rows with a
+        # missing or non-numeric feature get null predictions instead of
+        # failing the whole frame.
+        bundle = bundle or self.bundle
+        if bundle is None:
+            raise ValueError("Model not trained or loaded")
+        kernel = bundle.kernel
+        import pandas as pd
         
-        return {
-            'total_customers': len(self.df),
-            'n_clusters': self.kmeans.n_clusters,
-            'clusters': cluster_stats
-        }
+        features = df[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        valid = features.notna().all(axis=1).to_numpy()
+        clusters, confidences = kernel.predict(features.to_numpy(dtype=np.float64)[valid])
+        
+        result = pd.DataFrame(index=df.index)
+        result['cluster'] = pd.array([None] * len(df), dtype='Int64')
+        result.loc[valid, 'cluster'] = clusters
+        names = np.array(kernel.cluster_names, dtype=object)
+        result['cluster_name'] = pd.Series([None] * len(df), index=df.index, dtype=object)
+        result.loc[valid, 'cluster_name'] = names[clusters]
+        result['confidence'] = np.nan
+        result.loc[valid, 'confidence'] = confidences
+        return result
+    
+    def get_cluster_statistics(self, bundle=None):
+        # Cluster statistics are computed once per version, at training or
+        # load time; serving them is a copy of the precomputed payload
+        bundle = bundle or self.bundle
+        if bundle is None or bundle.X_scaled is None:
+            raise ValueError("Model not trained or loaded")
+        if bundle.cluster_stats is None:
+            return compute_cluster_statistics(
+                bundle.kmeans, bundle.scaler, bundle.feature_names, bundle.X_scaled, bundle.labels
+            )
+        return copy.deepcopy(bundle.cluster_stats)
     
-    def get_elbow_data(self):
+    def _sweep(self, X_scaled, silhouette_method=None, engine=None, batch_size=None,
+               warm_start=None):
+        # k-sweep over X_scaled, cached by dataset contents and sweep parameters.
+        # Worker count doesn't change the result, so it isn't part of the key.
+        # Returns (optimal_k, inertias, silhouette_scores, k_range, n_iters).
+        from app.preprocess import find_optimal_clusters, resolve_engine, resolve_fit_params
+        from app.silhouette import resolve_silhouette_method
+        silhouette_method = resolve_silhouette_method(silhouette_method)
+        engine = resolve_engine(engine)
+        batch_size, max_iter = resolve_fit_params(engine, batch_size)
+        warm_start = SWEEP_WARM_START if warm_start is None else warm_start
+        cache_key = make_cache_key("sweep", dataset_fingerprint(X_scaled), {
+            'max_clusters': 10,
+            'random_state': RANDOM_STATE,
+            'n_init': N_INIT,
+            'silhouette_method': silhouette_method,
+            'engine': engine,
+            'batch_size': batch_size,
+            'max_iter': max_iter,
+            'warm_start': warm_start,
+            'warm_n_init': WARM_START_N_INIT if warm_start else None,
+            # Older entries counted the kept restart's iterations only
+            'n_iters': "all_restarts"
+        })
+        result = result_cache.get(cache_key)
+        if result is None:
+            result = find_optimal_clusters(
+                X_scaled,
+                silhouette_method=silhouette_method,
+                engine=engine,
+                batch_size=batch_size,
+                max_iter=max_iter,
+                warm_start=warm_start,
+                return_n_iter=True
+            )
+            result_cache.set(cache_key, result)
+        return result
+    
+    def get_elbow_data(self, warm_start=None):
         # Get elbow method data for visualization
-        if self.X_scaled is None:
-            self.df = load_dataset()
-            self.X_scaled, self.feature_names, self.scaler = preprocess_data(self.df)
-        
-        optimal_k, inertias, silhouette_scores, k_range = find_optimal_clusters(self.X_scaled)
+        bundle = self.bundle
+        if bundle is not None:
+            X_scaled = bundle.X_scaled
+        else:
+            from app.preprocess import load_dataset, preprocess_data
+            X_scaled, _, _ = preprocess_data(load_dataset(columns=FEATURE_COLUMNS))
         
-        return {
-            'optimal_k': optimal_k,
-            'k_range': k_range,
-            'inertias': inertias,
-            'silhouette_scores': silhouette_scores
-        }
+        warm_start = SWEEP_WARM_START if warm_start is None else warm_start
+        return elbow_payload(self._sweep(X_scaled, warm_start=warm_start), warm_start)
 
 
 # Global model instance
 ml_model = CustomerSegmentationModel()
+
+
+def preload_version(version):
+    # Process-pool entry point: each worker loads the requested version once
+    # (its arrays are memory-mapped, so this is cheap)
+    if version is not None and ml_model.version != version:
+        ml_model.load_models(None if version == "legacy" else version)
+    return ml_model.version
+
+
+def elbow_data_for_version(version, warm_start=None):
+    # Process-pool entry point: runs the cached sweep on that version's
+    # feature matrix
+    preload_version(version)
+    return ml_model.get_elbow_data(warm_start)
+
+
+def render_cluster_charts(cluster_stats):
+    # Process-pool entry point for cluster charts that weren't pre-rendered
+    from app.charts import generate_cluster_charts
+    return generate_cluster_charts(cluster_stats)
+
+
+def render_elbow_chart_for_version(version, warm_start=None):
+    # Process-pool entry point for an elbow chart that wasn't pre-rendered
+    from app.charts import generate_elbow_chart
+    elbow_data = elbow_data_for_version(version, warm_start)
+    return {'chart': generate_elbow_chart(elbow_data), 'optimal_k': elbow_data['optimal_k']}
+
+
+def render_chart_image_for_version(version, chart, image_format, width, height, dpi,
+                                   warm_start=None, cluster_stats=None):
+    # Process-pool entry point for a chart served as a raw image
+    from app.charts import render_chart_image
+    data = elbow_data_for_version(version, warm_start) if chart == 'elbow' else cluster_stats
+    return render_chart_image(chart, data, image_format, width, height, dpi)
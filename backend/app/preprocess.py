@@ -1,20 +1,162 @@
 # Data preprocessing and feature engineering
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-from app.utils import DATASET_PATH
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.utils import check_random_state
+from sklearn.utils.extmath import row_norms
+from threadpoolctl import threadpool_limits
+from app.utils import (
+    DATASET_PATH,
+    detect_dataset_format,
+    SWEEP_WORKERS,
+    RANDOM_STATE,
+    N_INIT,
+    CLUSTER_ENGINE,
+    MINIBATCH_SIZE,
+    MAX_ITER,
+    TRAIN_DTYPE,
+    SWEEP_WARM_START,
+    WARM_START_N_INIT,
+    FEATURE_COLUMNS
+)
+from app.silhouette import compute_silhouette
 
 
-def load_dataset():
-    # Load customer dataset from CSV
+# Row filter operators, as in pyarrow's `filters` argument
+_FILTER_OPS = {
+    '==': lambda column, value: column == value,
+    '=': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value)
+}
+
+
+def load_dataset(columns=None, filters=None):
+    # Load customer dataset. `columns` limits the columns that are read and
+    # `filters` selects rows, e.g. [('Age', '>=', 30)] (tuples are ANDed; a
+    # list of such lists is ORed). Parquet and Arrow datasets apply both while
+    # scanning, so unused columns and non-matching row groups are skipped.
     try:
-        df = pd.read_csv(DATASET_PATH)
+        if detect_dataset_format(DATASET_PATH) == "csv":
+            df = _read_csv(DATASET_PATH, columns, filters)
+        else:
+            df = _read_columnar(DATASET_PATH, columns, filters)
         return df
     except FileNotFoundError:
         print("Dataset not found. Generating sample data...")
-        return generate_sample_data()
+        df = _filter_frame(generate_sample_data(), filters)
+        return df if columns is None else df[list(columns)]
+
+
+def _normalize_filters(filters):
+    # A flat list of tuples is a single conjunction
+    if filters and isinstance(filters[0], tuple):
+        return [filters]
+    return filters or []
+
+
+def _filter_frame(df, filters):
+    # Apply pyarrow-style filters to an in-memory frame
+    if not filters:
+        return df
+    mask = np.zeros(len(df), dtype=bool)
+    for conjunction in _normalize_filters(filters):
+        matches = np.ones(len(df), dtype=bool)
+        for column, op, value in conjunction:
+            if op not in _FILTER_OPS:
+                raise ValueError(f"Unsupported filter operator '{op}'")
+            matches &= np.asarray(_FILTER_OPS[op](df[column], value), dtype=bool)
+        mask |= matches
+    return df[mask].reset_index(drop=True)
+
+
+def _read_csv(path, columns=None, filters=None):
+    usecols = None
+    if columns is not None:
+        # Filter columns are read too, then dropped after filtering
+        filter_columns = [c for conjunction in _normalize_filters(filters) for c, _, _ in conjunction]
+        usecols = list(dict.fromkeys([*columns, *filter_columns]))
+    df = _filter_frame(pd.read_csv(path, usecols=usecols), filters)
+    return df if columns is None else df[list(columns)]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.dataset
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Parquet and Arrow datasets require pyarrow: pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def _read_columnar(path, columns=None, filters=None):
+    # Scan a Parquet or Arrow IPC file, pushing the projection and the row
+    # filter down so only the needed columns and row groups are decoded
+    pa = _import_pyarrow()
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    fmt = "parquet" if detect_dataset_format(path) == "parquet" else "ipc"
+    dataset = pa.dataset.dataset(path, format=fmt)
+    expression = pa.parquet.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=list(columns) if columns is not None else None, filter=expression)
+    return table.to_pandas()
+
+
+def write_dataset(df, path, row_group_size=None):
+    # Write a dataset in the format implied by the path's suffix
+    fmt = detect_dataset_format(path)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return
+    pa = _import_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == "parquet":
+        pa.parquet.write_table(table, path, row_group_size=row_group_size)
+    else:
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
+
+
+def convert_dataset(source, destination, row_group_size=100_000):
+    # Stream a CSV dataset into Parquet or Arrow IPC without loading it
+    # into memory; each CSV block becomes one or more row groups/batches
+    pa = _import_pyarrow()
+    fmt = detect_dataset_format(destination)
+    if fmt == "csv":
+        raise ValueError("Destination must be a .parquet or .arrow file")
+    
+    reader = pa.csv.open_csv(
+        source, read_options=pa.csv.ReadOptions(block_size=64 * 1024 * 1024)
+    )
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(destination, reader.schema)
+    else:
+        writer = pa.ipc.new_file(destination, reader.schema)
+    
+    n_rows = 0
+    with writer:
+        for batch in reader:
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=row_group_size)
+            else:
+                writer.write_table(pa.Table.from_batches([batch]), max_chunksize=row_group_size)
+            n_rows += batch.num_rows
+    return n_rows
 
 
 def generate_sample_data(n_samples=5000):
@@ -32,65 +174,348 @@ def generate_sample_data(n_samples=5000):
     
     df = pd.DataFrame(data)
     
-    # Save to CSV
-    df.to_csv(DATASET_PATH, index=False)
+    # Save in the configured dataset format
+    write_dataset(df, DATASET_PATH)
     print(f"Sample dataset created at {DATASET_PATH}")
     
     return df
 
 
-def preprocess_data(df):
+CLUSTER_ENGINES = ("lloyd", "elkan", "minibatch")
+TRAIN_DTYPES = ("float64", "float32")
+
+
+def resolve_engine(engine=None):
+    # Fall back to the configured engine and reject unknown names
+    engine = engine or CLUSTER_ENGINE
+    if engine not in CLUSTER_ENGINES:
+        raise ValueError(
+            f"Unknown clustering engine '{engine}'. Choose one of: {', '.join(CLUSTER_ENGINES)}"
+        )
+    return engine
+
+
+def resolve_fit_params(engine, batch_size=None, max_iter=None):
+    # The batch size and iteration cap a fit actually uses, so cache keys
+    # change when MINIBATCH_SIZE or MAX_ITER do. Only minibatch uses a
+    # batch size.
+    batch_size = (batch_size or MINIBATCH_SIZE) if engine == "minibatch" else None
+    return batch_size, max_iter or MAX_ITER
+
+
+def resolve_dtype(dtype=None):
+    dtype = np.dtype(dtype or TRAIN_DTYPE).name
+    if dtype not in TRAIN_DTYPES:
+        raise ValueError(f"Unsupported training dtype '{dtype}'. Use float64 or float32")
+    return dtype
+
+
+def preprocess_data(df, dtype=None):
   
-    # Select features for clustering (excluding Sex and CustomerID)
-    feature_columns = ['Age', 'Annual_Income', 'Spending_Score', 'Purchase_Frequency']
+    # Extract features; float32 halves the memory of X and X_scaled
+    feature_columns = list(FEATURE_COLUMNS)
+    X = df[feature_columns].to_numpy(dtype=resolve_dtype(dtype))
     
-    # Extract features
-    X = df[feature_columns].values
-    
-    # Scale features using StandardScaler
+    # Scale features using StandardScaler (keeps the input dtype)
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
     return X_scaled, feature_columns, scaler
 
 
-def find_optimal_clusters(X, max_clusters=10):
-   
+def _resolve_workers(n_jobs):
+    # None falls back to SWEEP_WORKERS, negative values mean "all cores"
+    if n_jobs is None:
+        n_jobs = SWEEP_WORKERS
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    return max(1, int(n_jobs))
+
+
+def _limit_worker_threads(n_threads):
+    # Keep each worker's OpenMP/BLAS pool small so processes don't oversubscribe cores
+    threadpool_limits(limits=n_threads)
+
+
+def _sweep_pool(n_workers):
+    # Spawned (not forked) workers: forking after OpenMP has started can deadlock
+    threads_per_worker = max(1, (os.cpu_count() or 1) // n_workers)
+    return ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_worker_threads,
+        initargs=(threads_per_worker,)
+    )
+
+
+def build_kmeans(n_clusters, engine=None, batch_size=None, max_iter=None,
+                 random_state=RANDOM_STATE, n_init=N_INIT, init="k-means++"):
+    # Lloyd and Elkan are full-batch KMeans; minibatch trades a little
+    # inertia for much faster fits on millions of rows
+    engine = resolve_engine(engine)
+    max_iter = max_iter or MAX_ITER
+    
+    if engine == "minibatch":
+        return MiniBatchKMeans(
+            n_clusters=n_clusters,
+            init=init,
+            batch_size=batch_size or MINIBATCH_SIZE,
+            max_iter=max_iter,
+            random_state=random_state,
+            n_init=n_init
+        )
+    return KMeans(
+        n_clusters=n_clusters,
+        init=init,
+        algorithm=engine,
+        random_state=random_state,
+        n_init=n_init,
+        max_iter=max_iter
+    )
+
+
+def _fit_k(X, k, random_state, n_init, silhouette_method=None, engine=None, batch_size=None,
+           max_iter=None):
+    # Fit a single k of the sweep and score it. Full-batch restarts run one
+    # at a time from the seeds KMeans itself would draw, so the iteration
+    # count covers every restart rather than only the kept one. Minibatch
+    # restarts only score initialisations; a single run iterates.
+    engine = resolve_engine(engine)
+    if engine == "minibatch":
+        kmeans = build_kmeans(
+            k, engine, batch_size, max_iter, random_state=random_state, n_init=n_init
+        )
+        kmeans.fit(X)
+        n_iter = kmeans.n_iter_
+    else:
+        kmeans, n_iter = None, 0
+        for init in _kmeans_plusplus_inits(X, k, random_state, n_init):
+            restart = build_kmeans(
+                k, engine, max_iter=max_iter, random_state=random_state, n_init=1, init=init
+            )
+            restart.fit(X)
+            n_iter += restart.n_iter_
+            if kmeans is None or (
+                restart.inertia_ < kmeans.inertia_
+                and not _is_same_clustering(restart.labels_, kmeans.labels_)
+            ):
+                kmeans = restart
+    score = compute_silhouette(
+        X, kmeans.labels_, silhouette_method, centers=kmeans.cluster_centers_
+    )
+    return kmeans.inertia_, score, n_iter
+
+
+def _fit_restart(X, k, init, engine="lloyd", max_iter=None):
+    # Run one k-means restart from a precomputed initialisation
+    kmeans = build_kmeans(k, engine, max_iter=max_iter, n_init=1, init=init)
+    kmeans.fit(X)
+    return kmeans.labels_, kmeans.inertia_, kmeans.n_iter_
+
+
+def _score_labels(X, labels, silhouette_method=None):
+    return compute_silhouette(X, labels, silhouette_method)
+
+
+def _kmeans_plusplus_inits(X, k, random_state, n_init):
+    # Draw the same n_init k-means++ seeds that KMeans(random_state=...) draws
+    # internally, so restarts can run in separate processes without changing
+    # the result. KMeans seeds on mean-centred data, so we do the same.
+    X = np.asarray(X)
+    X_mean = X.mean(axis=0)
+    X_centered = X - X_mean
+    x_squared_norms = row_norms(X_centered, squared=True)
+    rng = check_random_state(random_state)
+    
+    inits = []
+    for _ in range(n_init):
+        centers, _ = kmeans_plusplus(
+            X_centered, k, x_squared_norms=x_squared_norms, random_state=rng
+        )
+        inits.append(centers + X_mean)
+    return inits
+
+
+def _is_same_clustering(labels1, labels2):
+    # True when two labelings only differ by a permutation of cluster ids
+    pairs = np.unique(np.stack([labels1, labels2]), axis=1)
+    return pairs.shape[1] == len(np.unique(labels1)) == len(np.unique(labels2))
+
+
+def _parallel_restart_sweep(X, K_range, n_workers, random_state, n_init, silhouette_method,
+                            engine, max_iter=None):
+    # Fan every (k, restart) pair out over the pool, then keep the best
+    # restart per k using the same rule as KMeans.fit
+    with _sweep_pool(n_workers) as pool:
+        restart_futures = {
+            k: [pool.submit(_fit_restart, X, k, init, engine, max_iter)
+                for init in _kmeans_plusplus_inits(X, k, random_state, n_init)]
+            for k in K_range
+        }
+        
+        best = {}
+        for k in K_range:
+            best_labels, best_inertia, total_n_iter = None, None, 0
+            for future in restart_futures[k]:
+                labels, inertia, n_iter = future.result()
+                total_n_iter += n_iter
+                if best_inertia is None or (
+                    inertia < best_inertia
+                    and not _is_same_clustering(labels, best_labels)
+                ):
+                    best_labels, best_inertia = labels, inertia
+            best[k] = (best_labels, best_inertia, total_n_iter)
+        
+        score_futures = [
+            pool.submit(_score_labels, X, best[k][0], silhouette_method) for k in K_range
+        ]
+        return [
+            (best[k][1], future.result(), best[k][2])
+            for k, future in zip(K_range, score_futures)
+        ]
+
+
+def _split_worst_cluster(X, centers, labels, rng):
+    # Replace the cluster with the largest SSE by two centres placed one
+    # standard deviation either side of its centroid along its principal axis
+    sq_errors = ((X - centers[labels]) ** 2).sum(axis=1)
+    sse = np.bincount(labels, weights=sq_errors, minlength=len(centers))
+    worst = int(np.argmax(sse))
+    members = X[labels == worst]
+    if len(members) < 2:
+        return _add_center(X, centers, rng)
+    
+    eigvals, eigvecs = np.linalg.eigh(np.atleast_2d(np.cov(members, rowvar=False)))
+    offset = np.sqrt(max(eigvals[-1], 0.0)) * eigvecs[:, -1]
+    
+    return np.vstack([
+        np.delete(centers, worst, axis=0),
+        centers[worst] - offset,
+        centers[worst] + offset
+    ]).astype(X.dtype)
+
+
+def _add_center(X, centers, rng):
+    # k-means++ step: add one point drawn with probability proportional to
+    # its squared distance from the nearest existing centre
+    min_sq_dist = euclidean_distances(X, centers, squared=True).min(axis=1)
+    new_center = X[rng.choice(len(X), p=min_sq_dist / min_sq_dist.sum())]
+    return np.vstack([centers, new_center]).astype(X.dtype)
+
+
+def _warm_start_sweep(X, K_range, random_state, warm_n_init, silhouette_method,
+                      engine, batch_size, max_iter=None):
+    # Each k starts from the k-1 solution: one restart splits its worst
+    # cluster, any further restarts add a k-means++ sampled centre. The sweep
+    # starts from the k=1 solution (the global mean), so no cold restarts run.
+    rng = check_random_state(random_state)
+    centers = X.mean(axis=0, keepdims=True)
+    labels = np.zeros(len(X), dtype=np.int32)
+    
+    results = []
+    for k in K_range:
+        inits = [_split_worst_cluster(X, centers, labels, rng)]
+        inits += [_add_center(X, centers, rng) for _ in range(warm_n_init - 1)]
+        
+        best, n_iter = None, 0
+        for init in inits:
+            kmeans = build_kmeans(
+                k, engine, batch_size, max_iter, random_state=random_state, n_init=1,
+                init=init
+            )
+            kmeans.fit(X)
+            n_iter += kmeans.n_iter_
+            if best is None or kmeans.inertia_ < best.inertia_:
+                best = kmeans
+        
+        score = compute_silhouette(
+            X, best.labels_, silhouette_method, centers=best.cluster_centers_
+        )
+        results.append((best.inertia_, score, n_iter))
+        centers, labels = best.cluster_centers_, best.labels_
+    
+    return results
+
+
+def find_optimal_clusters(X, max_clusters=10, n_jobs=None, parallel_restarts=False,
+                          random_state=RANDOM_STATE, n_init=N_INIT, silhouette_method=None,
+                          engine=None, batch_size=None, warm_start=None, warm_n_init=None,
+                          return_n_iter=False, max_iter=None):
+    # n_jobs > 1 fans the k values out over a process pool; parallel_restarts
+    # additionally splits each k's n_init restarts into separate tasks
+    # (full-batch engines only). Results match the serial sweep for the same
+    # random_state. silhouette_method picks the estimator (see app.silhouette).
+    # warm_start seeds each k from the k-1 solution with warm_n_init restarts
+    # instead of n_init cold ones; it is sequential in k, so it runs serially.
+    # return_n_iter appends, per k, the iterations run across all restarts.
+    # max_iter is resolved here so spawned workers use the caller's value.
+    engine = resolve_engine(engine)
+    max_iter = max_iter or MAX_ITER
+    warm_start = SWEEP_WARM_START if warm_start is None else warm_start
     inertias = []
     silhouette_scores = []
+    n_iters = []
     K_range = range(2, min(max_clusters + 1, len(X)))
+    n_workers = _resolve_workers(n_jobs)
     
-    for k in K_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X)
-        inertias.append(kmeans.inertia_)
-        
-        # Calculate silhouette score
-        score = silhouette_score(X, kmeans.labels_)
+    if warm_start:
+        results = _warm_start_sweep(
+            X, K_range, random_state, warm_n_init or WARM_START_N_INIT,
+            silhouette_method, engine, batch_size, max_iter
+        )
+    elif n_workers == 1:
+        results = [
+            _fit_k(X, k, random_state, n_init, silhouette_method, engine, batch_size, max_iter)
+            for k in K_range
+        ]
+    elif parallel_restarts and engine != "minibatch":
+        results = _parallel_restart_sweep(
+            X, K_range, n_workers, random_state, n_init, silhouette_method, engine,
+            max_iter
+        )
+    else:
+        with _sweep_pool(n_workers) as pool:
+            futures = [
+                pool.submit(_fit_k, X, k, random_state, n_init, silhouette_method,
+                            engine, batch_size, max_iter)
+                for k in K_range
+            ]
+            results = [future.result() for future in futures]
+    
+    for inertia, score, n_iter in results:
+        inertias.append(inertia)
         silhouette_scores.append(score)
+        n_iters.append(int(n_iter))
     
     # Find optimal k using silhouette score
     optimal_k = K_range[np.argmax(silhouette_scores)]
     
+    if return_n_iter:
+        return optimal_k, inertias, silhouette_scores, list(K_range), n_iters
     return optimal_k, inertias, silhouette_scores, list(K_range)
 
 
-def train_kmeans_model(X, n_clusters=None):
+def train_kmeans_model(X, n_clusters=None, silhouette_method=None, engine=None,
+                       batch_size=None, max_iter=None, warm_start=None):
    
     if n_clusters is None:
-        n_clusters, _, _, _ = find_optimal_clusters(X)
+        n_clusters, _, _, _ = find_optimal_clusters(
+            X,
+            silhouette_method=silhouette_method,
+            engine=engine,
+            batch_size=batch_size,
+            max_iter=max_iter,
+            warm_start=warm_start
+        )
         print(f"Optimal number of clusters: {n_clusters}")
     
-    # Train K-Means model
-    kmeans = KMeans(
-        n_clusters=n_clusters,
-        random_state=42,
-        n_init=10,
-        max_iter=300
-    )
+    # Train K-Means model with the selected engine
+    kmeans = build_kmeans(n_clusters, engine, batch_size, max_iter)
     kmeans.fit(X)
     
     # Calculate silhouette score for evaluation
-    sil_score = silhouette_score(X, kmeans.labels_)
+    sil_score = compute_silhouette(
+        X, kmeans.labels_, silhouette_method, centers=kmeans.cluster_centers_
+    )
     
     return kmeans, sil_score
@@ -6,6 +6,10 @@ from typing import List
 from app.database import get_db, User, PredictionHistory, CustomerProfile
 from app.auth import get_current_active_user
 from app.auth_schema import UserResponse, UserListResponse, UpdateUserRole
+from app.cache import result_cache, prediction_cache, user_cache
+from app.model import ml_model
+from app.history_writer import history_writer
+from app.utils import HISTORY_WRITE_MODE
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -21,7 +25,7 @@ def require_admin(current_user: User = Depends(get_current_active_user)):
 
 
 @router.get("/users", response_model=UserListResponse)
-async def get_all_users(
+def get_all_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
@@ -44,7 +48,7 @@ async def get_all_users(
 
 
 @router.get("/users/{user_id}", response_model=UserResponse)
-async def get_user_by_id(
+def get_user_by_id(
     user_id: int,
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
@@ -60,7 +64,7 @@ async def get_user_by_id(
 
 
 @router.put("/users/{user_id}/role", response_model=UserResponse)
-async def update_user_role(
+def update_user_role(
     user_id: int,
     role_data: UpdateUserRole,
     db: Session = Depends(get_db),
@@ -83,13 +87,14 @@ async def update_user_role(
     
     user.role = role_data.role
     db.commit()
+    user_cache.invalidate(user.username)
     db.refresh(user)
     
     return user
 
 
 @router.delete("/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
@@ -111,12 +116,13 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user.username)
     
     return {"message": f"User {user.username} deleted successfully"}
 
 
 @router.put("/users/{user_id}/toggle-active", response_model=UserResponse)
-async def toggle_user_active(
+def toggle_user_active(
     user_id: int,
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
@@ -138,13 +144,14 @@ async def toggle_user_active(
     
     user.is_active = not user.is_active
     db.commit()
+    user_cache.invalidate(user.username)
     db.refresh(user)
     
     return user
 
 
 @router.get("/stats")
-async def get_admin_stats(
+def get_admin_stats(
     db: Session = Depends(get_db),
     admin: User = Depends(require_admin)
 ):
@@ -168,3 +175,67 @@ async def get_admin_stats(
         "total_profiles": total_profiles,
         "users_by_role": {role: count for role, count in users_by_role}
     }
+
+
+@router.get("/cache")
+def get_cache_stats(admin: User = Depends(require_admin)):
+    """Inspect the sweep/training result cache (admin only)"""
+    return result_cache.stats()
+
+
+@router.delete("/cache")
+def purge_cache(admin: User = Depends(require_admin)):
+    """Purge the sweep/training result cache (admin only)"""
+    removed = result_cache.clear()
+    return {"message": f"Removed {removed} cache entries", "removed": removed}
+
+
+@router.get("/cache/predictions")
+async def get_prediction_cache_stats(admin: User = Depends(require_admin)):
+    """Inspect the in-memory prediction cache (admin only)"""
+    return prediction_cache.stats()
+
+
+@router.delete("/cache/predictions")
+async def purge_prediction_cache(admin: User = Depends(require_admin)):
+    """Purge the in-memory prediction cache (admin only)"""
+    removed = prediction_cache.clear()
+    return {"message": f"Removed {removed} cached predictions", "removed": removed}
+
+
+@router.get("/cache/users")
+async def get_user_cache_stats(admin: User = Depends(require_admin)):
+    """Inspect the in-process authenticated-user cache (admin only)"""
+    return user_cache.stats()
+
+
+@router.delete("/cache/users")
+async def purge_user_cache(admin: User = Depends(require_admin)):
+    """Purge the in-process authenticated-user cache (admin only)"""
+    removed = user_cache.clear()
+    return {"message": f"Removed {removed} cached users", "removed": removed}
+
+
+@router.get("/history/writer")
+async def get_history_writer_stats(admin: User = Depends(require_admin)):
+    """Inspect the prediction history write-behind queue (admin only)"""
+    return {"mode": HISTORY_WRITE_MODE, **history_writer.stats()}
+
+
+@router.get("/models")
+def list_model_versions(admin: User = Depends(require_admin)):
+    """List published model versions, newest first (admin only)"""
+    return {"current": ml_model.version, "versions": ml_model.list_versions()}
+
+
+@router.post("/models/{version}/rollback")
+def rollback_model(version: str, admin: User = Depends(require_admin)):
+    """Make a previously published model version current (admin only)"""
+    try:
+        metadata = ml_model.rollback(version)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    return {"message": f"Rolled back to model version {version}", "version": metadata}
@@ -1,9 +1,10 @@
 # Customer profile management routes
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from app.database import get_db, User, CustomerProfile
-from app.auth import get_current_active_user
+from app.database import get_async_db, User, CustomerProfile
+from app.auth import get_async_current_active_user
 from app.auth_schema import (
     CustomerProfileCreate,
     CustomerProfileUpdate,
@@ -16,8 +17,8 @@ router = APIRouter(prefix="/profiles", tags=["Customer Profiles"])
 @router.post("/", response_model=CustomerProfileResponse, status_code=status.HTTP_201_CREATED)
 async def create_profile(
     profile_data: CustomerProfileCreate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new customer profile"""
     new_profile = CustomerProfile(
@@ -26,8 +27,8 @@ async def create_profile(
     )
     
     db.add(new_profile)
-    db.commit()
-    db.refresh(new_profile)
+    await db.commit()
+    await db.refresh(new_profile)
     
     return new_profile
 
@@ -36,13 +37,15 @@ async def create_profile(
 async def list_my_profiles(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List current user's customer profiles"""
-    profiles = db.query(CustomerProfile).filter(
-        CustomerProfile.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    profiles = (await db.scalars(
+        select(CustomerProfile).where(
+            CustomerProfile.user_id == current_user.id
+        ).offset(skip).limit(limit)
+    )).all()
     
     return profiles
 
@@ -50,14 +53,16 @@ async def list_my_profiles(
 @router.get("/{profile_id}", response_model=CustomerProfileResponse)
 async def get_profile(
     profile_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific customer profile"""
-    profile = db.query(CustomerProfile).filter(
-        CustomerProfile.id == profile_id,
-        CustomerProfile.user_id == current_user.id
-    ).first()
+    profile = await db.scalar(
+        select(CustomerProfile).where(
+            CustomerProfile.id == profile_id,
+            CustomerProfile.user_id == current_user.id
+        )
+    )
     
     if not profile:
         raise HTTPException(
@@ -72,14 +77,16 @@ async def get_profile(
 async def update_profile(
     profile_id: int,
     profile_update: CustomerProfileUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a customer profile"""
-    profile = db.query(CustomerProfile).filter(
-        CustomerProfile.id == profile_id,
-        CustomerProfile.user_id == current_user.id
-    ).first()
+    profile = await db.scalar(
+        select(CustomerProfile).where(
+            CustomerProfile.id == profile_id,
+            CustomerProfile.user_id == current_user.id
+        )
+    )
     
     if not profile:
         raise HTTPException(
@@ -92,8 +99,8 @@ async def update_profile(
     for field, value in update_data.items():
         setattr(profile, field, value)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
+    await db.refresh(profile)
     
     return profile
 
@@ -101,14 +108,16 @@ async def update_profile(
 @router.delete("/{profile_id}")
 async def delete_profile(
     profile_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_async_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a customer profile"""
-    profile = db.query(CustomerProfile).filter(
-        CustomerProfile.id == profile_id,
-        CustomerProfile.user_id == current_user.id
-    ).first()
+    profile = await db.scalar(
+        select(CustomerProfile).where(
+            CustomerProfile.id == profile_id,
+            CustomerProfile.user_id == current_user.id
+        )
+    )
     
     if not profile:
         raise HTTPException(
@@ -116,7 +125,7 @@ async def delete_profile(
             detail="Profile not found"
         )
     
-    db.delete(profile)
-    db.commit()
+    await db.delete(profile)
+    await db.commit()
     
     return {"message": "Profile deleted successfully"}
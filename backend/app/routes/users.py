@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db, User, CustomerProfile, PredictionHistory
 from app.auth import get_current_active_user, require_role, get_password_hash
+from app.cache import user_cache
 from app.auth_schema import (
     UserResponse,
     UserProfile,
@@ -16,7 +17,7 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @router.get("/me/profile", response_model=UserProfile)
-async def get_my_profile(
+def get_my_profile(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -37,12 +38,13 @@ async def get_my_profile(
 
 
 @router.put("/me", response_model=UserResponse)
-async def update_my_profile(
+def update_my_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Update current user's profile"""
+    old_username = current_user.username
     if user_update.username:
         # Check if username is already taken by another user
         existing_user = db.query(User).filter(
@@ -76,26 +78,28 @@ async def update_my_profile(
         current_user.hashed_password = get_password_hash(user_update.password)
     
     db.commit()
+    user_cache.invalidate(old_username, current_user.username)
     db.refresh(current_user)
     
     return current_user
 
 
 @router.delete("/me")
-async def delete_my_account(
+def delete_my_account(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Delete current user's account"""
     db.delete(current_user)
     db.commit()
+    user_cache.invalidate(current_user.username)
     
     return {"message": "Account deleted successfully"}
 
 
 # Admin routes
 @router.get("/", response_model=UserListResponse, dependencies=[Depends(require_role("admin"))])
-async def list_users(
+def list_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
@@ -111,7 +115,7 @@ async def list_users(
 
 
 @router.get("/{user_id}", response_model=UserResponse, dependencies=[Depends(require_role("admin"))])
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, db: Session = Depends(get_db)):
     """Get user by ID (Admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -123,7 +127,7 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.put("/{user_id}/role", response_model=UserResponse, dependencies=[Depends(require_role("admin"))])
-async def update_user_role(
+def update_user_role(
     user_id: int,
     role_update: UpdateUserRole,
     db: Session = Depends(get_db)
@@ -138,13 +142,14 @@ async def update_user_role(
     
     user.role = role_update.role
     db.commit()
+    user_cache.invalidate(user.username)
     db.refresh(user)
     
     return user
 
 
 @router.delete("/{user_id}", dependencies=[Depends(require_role("admin"))])
-async def delete_user(user_id: int, db: Session = Depends(get_db)):
+def delete_user(user_id: int, db: Session = Depends(get_db)):
     """Delete user (Admin only)"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -155,5 +160,6 @@ async def delete_user(user_id: int, db: Session = Depends(get_db)):
     
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user.username)
     
     return {"message": "User deleted successfully"}
@@ -1,6 +1,8 @@
 # Pydantic schemas for request/response validation
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Dict, Optional, Literal
+from datetime import datetime
+from app.utils import PREDICT_BATCH_MAX_ROWS
 
 
 class CustomerInput(BaseModel):
@@ -29,11 +31,51 @@ class PredictionResponse(BaseModel):
     customer_data: Dict
 
 
+class BatchPredictionRequest(BaseModel):
+    customers: List[CustomerInput] = Field(
+        ..., min_length=1, max_length=PREDICT_BATCH_MAX_ROWS, description="Customers to score"
+    )
+
+
+class BatchPredictionResponse(BaseModel):
+    count: int
+    predictions: List[PredictionResponse]
+
+
+class TrainRequest(BaseModel):
+    n_clusters: Optional[int] = Field(None, ge=2, le=20, description="Number of clusters (None = pick by silhouette)")
+    engine: Optional[Literal["lloyd", "elkan", "minibatch"]] = Field(None, description="Clustering engine")
+    batch_size: Optional[int] = Field(None, ge=1, description="Mini-batch size (minibatch engine only)")
+    max_iter: Optional[int] = Field(None, ge=1, description="Maximum iterations per run")
+    dtype: Optional[Literal["float64", "float32"]] = Field(None, description="Working dtype of the scaled features")
+    silhouette_method: Optional[Literal["exact", "sampled", "simplified", "chunked"]] = Field(
+        None, description="Silhouette estimator"
+    )
+    warm_start: Optional[bool] = Field(None, description="Warm-start the k-sweep from the k-1 solution")
+
+
 class TrainResponse(BaseModel):
     message: str
     n_clusters: int
     silhouette_score: float
+    silhouette_method: str = Field(..., description="Estimator that produced silhouette_score")
     inertia: float
+    engine: str = Field(..., description="Clustering engine used for the fit")
+    dtype: str = Field(..., description="Working dtype of the scaled features")
+    model_version: Optional[str] = Field(None, description="Registry version the model was published as")
+
+
+class TrainJobResponse(BaseModel):
+    job_id: str
+    state: Literal["queued", "running", "succeeded", "failed"]
+    progress: float = Field(..., ge=0, le=1, description="Fraction of the job completed")
+    stage: str
+    coalesced: bool = Field(False, description="True when the request joined an already running job")
+    metrics: Optional[TrainResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 class ClusterStats(BaseModel):
@@ -50,3 +92,30 @@ class ClustersResponse(BaseModel):
     total_customers: int
     n_clusters: int
     clusters: List[ClusterStats]
+
+
+class LiveSegmentStats(BaseModel):
+    cluster_id: int
+    cluster_name: str
+    count: int
+    mean: Dict[str, float]
+    variance: Dict[str, float]
+    std: Dict[str, float]
+
+
+class LiveSegmentsResponse(BaseModel):
+    model_version: Optional[str] = None
+    total_customers: int
+    updated_at: Optional[datetime] = None
+    clusters: List[LiveSegmentStats]
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    state: Literal["starting", "warming", "ready", "failed"]
+    stage: Optional[str] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
@@ -0,0 +1,207 @@
+# Online per-segment statistics of customers scored through /predict
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime
+import numpy as np
+from app.executors import run_io
+from app.utils import (
+    SEGMENT_STATS_PATH,
+    SEGMENT_STATS_CHECKPOINT_EVERY,
+    SEGMENT_STATS_CHECKPOINT_SECONDS
+)
+
+LIVE_FEATURES = ('age', 'annual_income', 'spending_score', 'purchase_frequency')
+
+
+class SegmentStats:
+    # Running count, mean and M2 (sum of squared deviations from the mean)
+    # per cluster and feature, updated with Welford's algorithm in O(1) per
+    # scored customer. Cluster ids only mean something within one model
+    # version, so a customer scored by a different version starts afresh.
+    # Updates never write the checkpoint themselves: the lifespan's
+    # run_checkpoints task writes it off the event loop, and is woken early
+    # once checkpoint_every updates are pending.
+    
+    def __init__(self, path=SEGMENT_STATS_PATH, checkpoint_every=SEGMENT_STATS_CHECKPOINT_EVERY,
+                 checkpoint_seconds=SEGMENT_STATS_CHECKPOINT_SECONDS):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._reset(None)
+        self._pending = 0
+        self._loop = None
+        self._wake = None
+    
+    def _reset(self, model_version):
+        self.model_version = model_version
+        self.updated_at = None
+        self._clusters = {}
+    
+    @property
+    def dirty(self):
+        return self._pending > 0
+    
+    def update(self, model_version, cluster, cluster_name, features):
+        # features: mapping with a value for every name in LIVE_FEATURES
+        self.update_batch(model_version, [cluster], {cluster: cluster_name}, [features])
+    
+    def update_batch(self, model_version, clusters, cluster_names, customers):
+        # Fold many customers in at once: per-cluster count, mean and M2 of
+        # the batch are merged with the running values (Chan et al.), which
+        # reduces to Welford's update for a batch of one
+        clusters = np.asarray(clusters, dtype=np.int64)
+        X = np.array(
+            [[customer[name] for name in LIVE_FEATURES] for customer in customers],
+            dtype=np.float64
+        ).reshape(-1, len(LIVE_FEATURES))
+        
+        with self._lock:
+            if model_version != self.model_version:
+                self._reset(model_version)
+            for cluster in np.unique(clusters).tolist():
+                rows = X[clusters == cluster]
+                batch_count = len(rows)
+                batch_mean = rows.mean(axis=0)
+                batch_m2 = ((rows - batch_mean) ** 2).sum(axis=0)
+                
+                entry = self._clusters.get(cluster)
+                if entry is None:
+                    entry = self._clusters[cluster] = {
+                        'cluster_name': cluster_names[cluster],
+                        'count': 0,
+                        'mean': np.zeros(len(LIVE_FEATURES)),
+                        'm2': np.zeros(len(LIVE_FEATURES))
+                    }
+                count = entry['count'] + batch_count
+                delta = batch_mean - entry['mean']
+                entry['mean'] = entry['mean'] + delta * (batch_count / count)
+                entry['m2'] = entry['m2'] + batch_m2 + delta ** 2 * (entry['count'] * batch_count / count)
+                entry['count'] = count
+            self.updated_at = datetime.utcnow()
+            
+            self._pending += len(clusters)
+            due = self._pending >= self.checkpoint_every
+        if due:
+            self._request_checkpoint()
+    
+    def _request_checkpoint(self):
+        # Wake run_checkpoints; safe to call from any thread
+        wake = self._wake
+        if wake is not None:
+            self._loop.call_soon_threadsafe(wake.set)
+    
+    def snapshot(self, model_version=None):
+        # Statistics for model_version (default: whichever version they
+        # belong to); another version's statistics are reported as empty
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                return {
+                    'model_version': model_version,
+                    'total_customers': 0,
+                    'updated_at': None,
+                    'clusters': []
+                }
+            clusters = []
+            for cluster_id in sorted(self._clusters):
+                entry = self._clusters[cluster_id]
+                count = entry['count']
+                # Sample variance; undefined for a single observation
+                variance = entry['m2'] / (count - 1) if count > 1 else np.zeros(len(LIVE_FEATURES))
+                clusters.append({
+                    'cluster_id': int(cluster_id),
+                    'cluster_name': entry['cluster_name'],
+                    'count': int(count),
+                    'mean': dict(zip(LIVE_FEATURES, entry['mean'].tolist())),
+                    'variance': dict(zip(LIVE_FEATURES, variance.tolist())),
+                    'std': dict(zip(LIVE_FEATURES, np.sqrt(variance).tolist()))
+                })
+            return {
+                'model_version': self.model_version,
+                'total_customers': sum(cluster['count'] for cluster in clusters),
+                'updated_at': self.updated_at,
+                'clusters': clusters
+            }
+    
+    def _state(self):
+        return {
+            'model_version': self.model_version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'clusters': [
+                {
+                    'cluster_id': int(cluster_id),
+                    'cluster_name': entry['cluster_name'],
+                    'count': entry['count'],
+                    'mean': entry['mean'].tolist(),
+                    'm2': entry['m2'].tolist()
+                }
+                for cluster_id, entry in self._clusters.items()
+            ]
+        }
+    
+    def checkpoint(self):
+        # Write the running state atomically; serialised so an older
+        # snapshot can never overwrite a newer one
+        with self._checkpoint_lock:
+            with self._lock:
+                state = self._state()
+                self._pending = 0
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(state))
+            os.replace(tmp_path, self.path)
+    
+    async def run_checkpoints(self):
+        # Background task: write pending updates every checkpoint_seconds,
+        # so quiet periods are checkpointed too, or as soon as
+        # checkpoint_every are pending. Cancel it at shutdown and checkpoint
+        # once more.
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.checkpoint_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                if self.dirty:
+                    try:
+                        await run_io(self.checkpoint)
+                    except OSError as e:
+                        print(f"Segment statistics checkpoint failed: {e}")
+        finally:
+            self._wake = None
+    
+    def restore(self):
+        # Resume from the last checkpoint, if there is a readable one. Called
+        # from the lifespan, so importing the module never touches the disk.
+        try:
+            state = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return
+        clusters = {
+            cluster['cluster_id']: {
+                'cluster_name': cluster['cluster_name'],
+                'count': cluster['count'],
+                'mean': np.array(cluster['mean'], dtype=np.float64),
+                'm2': np.array(cluster['m2'], dtype=np.float64)
+            }
+            for cluster in state['clusters']
+        }
+        with self._lock:
+            self.model_version = state['model_version']
+            self.updated_at = datetime.fromisoformat(state['updated_at']) if state['updated_at'] else None
+            self._clusters = clusters
+    
+    def clear(self):
+        with self._lock:
+            self._reset(None)
+        self.checkpoint()
+
+
+# Global live statistics instance
+segment_stats = SegmentStats()
@@ -0,0 +1,108 @@
+# Silhouette estimators for model selection
+import numpy as np
+from sklearn.metrics import silhouette_score, pairwise_distances
+from app.utils import (
+    RANDOM_STATE,
+    SILHOUETTE_METHOD,
+    SILHOUETTE_SAMPLE_SIZE,
+    SILHOUETTE_CHUNK_SIZE
+)
+
+SILHOUETTE_METHODS = ("exact", "sampled", "simplified", "chunked")
+
+
+def resolve_silhouette_method(method=None):
+    # Fall back to the configured estimator and reject unknown names
+    method = method or SILHOUETTE_METHOD
+    if method not in SILHOUETTE_METHODS:
+        raise ValueError(
+            f"Unknown silhouette method '{method}'. Choose one of: {', '.join(SILHOUETTE_METHODS)}"
+        )
+    return method
+
+
+def compute_silhouette(X, labels, method=None, centers=None, sample_size=None,
+                       random_state=RANDOM_STATE, chunk_size=None):
+    # Dispatch to the selected silhouette estimator
+    method = resolve_silhouette_method(method)
+    labels = np.asarray(labels)
+    
+    if method == "sampled":
+        return sampled_silhouette(X, labels, sample_size, random_state)
+    if method == "simplified":
+        return simplified_silhouette(X, labels, centers)
+    if method == "chunked":
+        return chunked_silhouette(X, labels, chunk_size)
+    return float(silhouette_score(X, labels))
+
+
+def sampled_silhouette(X, labels, sample_size=None, random_state=RANDOM_STATE):
+    # Exact silhouette on a stratified sample: every cluster contributes in
+    # proportion to its size (at least two points where it has them)
+    sample_size = sample_size or SILHOUETTE_SAMPLE_SIZE
+    n_samples = len(labels)
+    if n_samples <= sample_size:
+        return float(silhouette_score(X, labels))
+    
+    rng = np.random.RandomState(random_state)
+    cluster_ids, cluster_sizes = np.unique(labels, return_counts=True)
+    
+    indices = []
+    for cluster_id, size in zip(cluster_ids, cluster_sizes):
+        n_take = min(size, max(2, int(round(sample_size * size / n_samples))))
+        members = np.flatnonzero(labels == cluster_id)
+        indices.append(rng.choice(members, n_take, replace=False))
+    indices = np.sort(np.concatenate(indices))
+    
+    return float(silhouette_score(X[indices], labels[indices]))
+
+
+def simplified_silhouette(X, labels, centers=None):
+    # Centroid-based silhouette: a(i) is the distance to the point's own
+    # centroid and b(i) the distance to the nearest other centroid. O(n * k).
+    if centers is None:
+        centers = np.vstack([X[labels == c].mean(axis=0) for c in range(labels.max() + 1)])
+    
+    distances = pairwise_distances(X, centers)
+    rows = np.arange(len(labels))
+    a = distances[rows, labels]
+    distances[rows, labels] = np.inf
+    b = distances.min(axis=1)
+    
+    denom = np.maximum(a, b)
+    scores = np.divide(b - a, denom, out=np.zeros_like(a), where=denom > 0)
+    return float(scores.mean())
+
+
+def chunked_silhouette(X, labels, chunk_size=None):
+    # Exact silhouette computed chunk_size rows at a time, so peak memory is
+    # O(chunk_size * n) instead of O(n^2)
+    chunk_size = chunk_size or SILHOUETTE_CHUNK_SIZE
+    cluster_ids, encoded = np.unique(labels, return_inverse=True)
+    cluster_sizes = np.bincount(encoded).astype(np.float64)
+    one_hot = np.zeros((len(labels), len(cluster_ids)))
+    one_hot[np.arange(len(labels)), encoded] = 1.0
+    
+    total = 0.0
+    for start in range(0, len(labels), chunk_size):
+        stop = min(start + chunk_size, len(labels))
+        own = encoded[start:stop]
+        rows = np.arange(stop - start)
+        
+        # Sum of distances from each row to every cluster
+        cluster_sums = pairwise_distances(X[start:stop], X) @ one_hot
+        
+        own_sizes = cluster_sizes[own]
+        a = np.divide(cluster_sums[rows, own], own_sizes - 1,
+                      out=np.zeros(stop - start), where=own_sizes > 1)
+        mean_distances = cluster_sums / cluster_sizes
+        mean_distances[rows, own] = np.inf
+        b = mean_distances.min(axis=1)
+        
+        denom = np.maximum(a, b)
+        scores = np.divide(b - a, denom, out=np.zeros(stop - start), where=denom > 0)
+        # Points in singleton clusters score 0, as in sklearn
+        scores[own_sizes <= 1] = 0.0
+        total += scores.sum()
+    
+    return float(total / len(labels))
@@ -1,6 +1,10 @@
 # Utility functions
 import os
-import joblib
+import json
+import shutil
+import uuid
+import numpy as np
+from datetime import datetime
 from pathlib import Path
 
 # Define paths
@@ -12,13 +16,159 @@ DATA_DIR = BASE_DIR / "data"
 MODELS_DIR.mkdir(exist_ok=True)
 DATA_DIR.mkdir(exist_ok=True)
 
+# Features used for clustering (excluding Sex and CustomerID)
+FEATURE_COLUMNS = ['Age', 'Annual_Income', 'Spending_Score', 'Purchase_Frequency']
+
 # Model file paths
 KMEANS_MODEL_PATH = MODELS_DIR / "kmeans.pkl"
 SCALER_MODEL_PATH = MODELS_DIR / "scaler.pkl"
-DATASET_PATH = DATA_DIR / "customers.csv"
+
+# Dataset formats, by file suffix and (for unknown suffixes) by magic bytes
+DATASET_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow"
+}
+
+
+def detect_dataset_format(path):
+    # Parquet files start with PAR1 and Arrow IPC files with ARROW1; anything
+    # else with an unknown suffix is treated as CSV
+    path = Path(path)
+    fmt = DATASET_FORMATS.get(path.suffix.lower())
+    if fmt is not None:
+        return fmt
+    try:
+        with open(path, "rb") as f:
+            magic = f.read(6)
+    except OSError:
+        return "csv"
+    if magic.startswith(b"PAR1"):
+        return "parquet"
+    if magic == b"ARROW1":
+        return "arrow"
+    return "csv"
+
+
+def _default_dataset_path(data_dir=DATA_DIR):
+    # DATASET_PATH overrides; otherwise prefer a columnar copy of the dataset
+    # (written by convert_dataset.py) over the CSV, unless the CSV has been
+    # rewritten since the copy was made
+    if os.getenv("DATASET_PATH"):
+        return Path(os.getenv("DATASET_PATH"))
+    csv_path = data_dir / "customers.csv"
+    csv_mtime = csv_path.stat().st_mtime if csv_path.exists() else None
+    for name in ("customers.parquet", "customers.arrow"):
+        path = data_dir / name
+        if not path.exists():
+            continue
+        if csv_mtime is not None and csv_mtime > path.stat().st_mtime:
+            print(f"{csv_path} is newer than {path}; loading the CSV (re-run convert_dataset.py)")
+            continue
+        return path
+    return csv_path
+
+
+DATASET_PATH = _default_dataset_path()
+
+# Model registry: one directory per trained version plus a pointer file
+# naming the version that is being served
+REGISTRY_DIR = MODELS_DIR / "versions"
+CURRENT_VERSION_PATH = MODELS_DIR / "CURRENT"
+MODEL_VERSIONS_TO_KEEP = int(os.getenv("MODEL_VERSIONS_TO_KEEP", "5"))
+# Per-version arrays, memory-mapped read-only when a version is loaded
+FEATURES_ARRAY_NAME = "X_scaled.npy"
+LABELS_ARRAY_NAME = "labels.npy"
+# Per-version /clusters payload, computed once at training time
+CLUSTER_STATS_NAME = "cluster_stats.json"
+
+# Result cache for k-sweeps and trained models (0 disables it)
+CACHE_DIR = MODELS_DIR / "cache"
+RESULT_CACHE_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+# In-memory LRU of /predict results, in entries (0 disables it)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+
+# In-process cache of authenticated users and decoded tokens: entries, and
+# seconds an entry may be served before the database is asked again
+# (either set to 0 disables it)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# Live per-segment statistics of scored customers, checkpointed after this
+# many updates or seconds, whichever comes first
+SEGMENT_STATS_PATH = Path(os.getenv("SEGMENT_STATS_PATH", MODELS_DIR / "segment_stats.json"))
+SEGMENT_STATS_CHECKPOINT_EVERY = int(os.getenv("SEGMENT_STATS_CHECKPOINT_EVERY", "100"))
+SEGMENT_STATS_CHECKPOINT_SECONDS = float(os.getenv("SEGMENT_STATS_CHECKPOINT_SECONDS", "30"))
+
+# Maximum number of customers accepted by one POST /predict/batch request
+PREDICT_BATCH_MAX_ROWS = int(os.getenv("PREDICT_BATCH_MAX_ROWS", "10000"))
+
+# Rendered charts kept in memory (disk copies live in each model version)
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "32"))
+
+# Bounds on the size (pixels per side) and DPI of charts served as images
+CHART_IMAGE_MAX_PIXELS = int(os.getenv("CHART_IMAGE_MAX_PIXELS", "4000"))
+CHART_IMAGE_MAX_DPI = int(os.getenv("CHART_IMAGE_MAX_DPI", "300"))
+
+# Rows scored per chunk by the streaming CSV upload endpoint
+SCORE_CHUNK_ROWS = int(os.getenv("SCORE_CHUNK_ROWS", "50000"))
+
+# Execution pools for request handlers: threads for blocking DB/IO work,
+# processes for CPU-heavy work (chart rendering, k-sweeps)
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "40"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "2"))
+
+# Prediction history writes: "sync" commits every request's rows before it
+# responds (durable); "batched" queues them and bulk-inserts every
+# HISTORY_BATCH_SIZE rows or HISTORY_FLUSH_SECONDS, whichever comes first.
+# Past HISTORY_MAX_PENDING queued rows, requests wait for a flush.
+HISTORY_WRITE_MODE = os.getenv("HISTORY_WRITE_MODE", "sync").lower()
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "0.5"))
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+# /history waits at most this long for queued rows to be written
+HISTORY_READ_FLUSH_SECONDS = float(os.getenv("HISTORY_READ_FLUSH_SECONDS", "1"))
+
+# Load the model and warm it up when the API starts; /ready reports
+# not-ready until this has finished
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# A failed warm-up is retried this many times, waiting WARMUP_RETRY_SECONDS
+# and doubling the wait after each attempt
+WARMUP_RETRIES = int(os.getenv("WARMUP_RETRIES", "3"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "1"))
+
+# Training configuration
+# Number of worker processes used by the k-sweep (1 = serial)
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", "1"))
+RANDOM_STATE = 42
+N_INIT = 10
+
+# Clustering engine: lloyd, elkan or minibatch
+CLUSTER_ENGINE = os.getenv("CLUSTER_ENGINE", "lloyd")
+MINIBATCH_SIZE = int(os.getenv("MINIBATCH_SIZE", "1024"))
+MAX_ITER = int(os.getenv("MAX_ITER", "300"))
+# Working dtype of the scaled feature matrix: float64 or float32
+TRAIN_DTYPE = os.getenv("TRAIN_DTYPE", "float64")
+
+# Warm-started k-sweep: seed each k from the k-1 solution
+SWEEP_WARM_START = os.getenv("SWEEP_WARM_START", "false").lower() == "true"
+WARM_START_N_INIT = int(os.getenv("WARM_START_N_INIT", "2"))
+
+# Number of finished training jobs kept for status polling
+TRAINING_JOB_HISTORY = int(os.getenv("TRAINING_JOB_HISTORY", "50"))
+
+# Silhouette estimator used for model selection: exact, sampled, simplified or chunked
+SILHOUETTE_METHOD = os.getenv("SILHOUETTE_METHOD", "exact")
+SILHOUETTE_SAMPLE_SIZE = int(os.getenv("SILHOUETTE_SAMPLE_SIZE", "10000"))
+SILHOUETTE_CHUNK_SIZE = int(os.getenv("SILHOUETTE_CHUNK_SIZE", "1000"))
 
 
 def save_model(model, filepath):
+    import joblib
     joblib.dump(model, filepath)
     print(f"Model saved to {filepath}")
 
@@ -26,9 +176,94 @@ def save_model(model, filepath):
 def load_model(filepath):
     if not os.path.exists(filepath):
         return None
+    import joblib
     return joblib.load(filepath)
 
 
+def _write_atomic(path, text):
+    # Write to a sibling temp file, fsync, then rename over the target
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish_model_version(write_artifacts, metadata):
+    # Stage a new version in a hidden directory, rename it into place, then
+    # atomically repoint CURRENT at it. A crash at any step leaves the
+    # previously published version intact and still current.
+    version = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    staging_dir = REGISTRY_DIR / f".{version}.tmp"
+    staging_dir.mkdir()
+    
+    try:
+        write_artifacts(staging_dir)
+        metadata = {**metadata, 'version': version, 'created_at': datetime.utcnow().isoformat()}
+        _write_atomic(staging_dir / "metadata.json", json.dumps(metadata, indent=2))
+        os.replace(staging_dir, REGISTRY_DIR / version)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    
+    set_current_version(version)
+    prune_model_versions()
+    print(f"Model version {version} published")
+    return version
+
+
+def model_version_dir(version):
+    # Only names of published versions resolve; anything else is rejected
+    if not version or version.startswith(".") or "/" in version or "\\" in version:
+        return None
+    path = REGISTRY_DIR / version
+    return path if (path / "metadata.json").exists() else None
+
+
+def get_current_version():
+    try:
+        version = CURRENT_VERSION_PATH.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version if model_version_dir(version) else None
+
+
+def set_current_version(version):
+    if model_version_dir(version) is None:
+        raise ValueError(f"Unknown model version: {version}")
+    _write_atomic(CURRENT_VERSION_PATH, version)
+
+
+def read_version_metadata(version):
+    version_dir = model_version_dir(version)
+    if version_dir is None:
+        raise ValueError(f"Unknown model version: {version}")
+    return json.loads((version_dir / "metadata.json").read_text())
+
+
+def list_model_versions():
+    # Newest first
+    if not REGISTRY_DIR.exists():
+        return []
+    versions = sorted(
+        (path.name for path in REGISTRY_DIR.iterdir() if model_version_dir(path.name)),
+        reverse=True
+    )
+    return [read_version_metadata(version) for version in versions]
+
+
+def prune_model_versions(keep=None):
+    # Delete the oldest versions beyond `keep`, never the current one
+    keep = MODEL_VERSIONS_TO_KEEP if keep is None else keep
+    current = get_current_version()
+    versions = [metadata['version'] for metadata in list_model_versions()]
+    for version in versions[keep:]:
+        if version != current:
+            shutil.rmtree(REGISTRY_DIR / version, ignore_errors=True)
+
+
 def get_cluster_name(cluster_id, cluster_centers, feature_names):
    
     cluster_names = {
@@ -60,3 +295,18 @@ def calculate_confidence(distances, predicted_cluster):
     # Normalize and invert (closer = higher confidence)
     confidence = 1 - (min_distance / max_distance)
     return round(confidence, 2)
+
+
+def calculate_confidence_batch(distances, predicted_clusters):
+    # Vectorized calculate_confidence: distances is (n_samples, n_clusters)
+    distances = np.asarray(distances)
+    if distances.shape[1] == 0:
+        return np.zeros(len(distances))
+    
+    min_distance = distances[np.arange(len(distances)), predicted_clusters]
+    max_distance = distances.max(axis=1)
+    
+    # Normalize and invert (closer = higher confidence)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        confidence = np.where(max_distance == 0, 1.0, 1 - min_distance / max_distance)
+    return np.round(confidence, 2)
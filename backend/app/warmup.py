@@ -0,0 +1,144 @@
+# Startup warm-up and readiness
+#
+# The lifespan hook loads the serving model, scores a few customers through
+# the inference kernel, primes the chart cache and starts the CPU pool's
+# workers. It runs in the background, so the server accepts connections at
+# once, while GET /ready reports not-ready until it has finished. A load
+# balancer gating traffic on /ready never sends the first requests after a
+# deploy to a cold worker.
+import asyncio
+import threading
+import time
+from datetime import datetime
+from app.model import ml_model, preload_version
+from app.chart_cache import chart_cache, elbow_chart_name
+from app.executors import run_io, run_cpu
+from app.utils import CPU_POOL_SIZE, SWEEP_WARM_START, WARMUP_RETRIES, WARMUP_RETRY_SECONDS
+
+
+class Readiness:
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            # starting -> warming -> ready, or failed
+            self.state = "starting"
+            self.stage = None
+            self.model_version = None
+            self.error = None
+            self.started_at = None
+            self.finished_at = None
+            self.duration_seconds = None
+            self._started = None
+    
+    @property
+    def ready(self):
+        return self.state == "ready"
+    
+    def begin(self):
+        with self._lock:
+            self.state = "warming"
+            self.started_at = datetime.utcnow()
+            self._started = time.perf_counter()
+    
+    def set_stage(self, stage):
+        with self._lock:
+            self.stage = stage
+    
+    def finish(self, state, model_version=None, error=None):
+        with self._lock:
+            self.state = state
+            self.stage = None
+            self.model_version = model_version
+            self.error = error
+            self.finished_at = datetime.utcnow()
+            if self._started is not None:
+                self.duration_seconds = round(time.perf_counter() - self._started, 3)
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'ready': self.state == "ready",
+                'state': self.state,
+                'stage': self.stage,
+                'model_version': self.model_version,
+                'error': self.error,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'duration_seconds': self.duration_seconds
+            }
+
+
+def warm_up_predictions(bundle):
+    # Score each cluster's average customer, singly and as a batch, so the
+    # kernel's first real call doesn't pay for BLAS and allocator set-up.
+    # predict_batch bypasses the prediction cache, which keeps real traffic only.
+    customers = [
+        {
+            'age': cluster['avg_age'],
+            'annual_income': cluster['avg_income'],
+            'spending_score': cluster['avg_spending_score'],
+            'purchase_frequency': cluster['avg_purchase_frequency']
+        }
+        for cluster in bundle.cluster_stats['clusters']
+    ]
+    for customer in customers:
+        ml_model.predict_batch([customer], bundle)
+    return ml_model.predict_batch(customers, bundle)
+
+
+def prime_caches(bundle):
+    # Pull the pre-rendered charts into memory and import the upload stack
+    chart_cache.load(bundle.version, "clusters")
+    chart_cache.load(bundle.version, elbow_chart_name(SWEEP_WARM_START))
+    import pandas  # noqa: F401
+
+
+async def _warm_up_once(readiness):
+    # Returns the warmed model version (None when no model is trained yet)
+    readiness.set_stage("loading model")
+    await run_io(ml_model.ensure_loaded)
+    bundle = ml_model.bundle
+    version = bundle.version if bundle is not None else None
+    
+    if bundle is not None:
+        readiness.set_stage("warm-up predictions")
+        await run_io(warm_up_predictions, bundle)
+        readiness.set_stage("priming caches")
+        await run_io(prime_caches, bundle)
+    
+    # Best effort: the model is loaded and warm in this process, and a pool
+    # that fails to start now is started again on first use
+    readiness.set_stage("starting CPU pool")
+    try:
+        await asyncio.gather(*(run_cpu(preload_version, version) for _ in range(CPU_POOL_SIZE)))
+    except Exception as e:
+        print(f"CPU pool warm-up failed, continuing without it: {e}")
+    return version
+
+
+async def warm_up(readiness, retries=WARMUP_RETRIES, retry_seconds=WARMUP_RETRY_SECONDS):
+    # Load, warm and prime; a model that isn't trained yet still ends ready
+    # (there is nothing to warm, and /train must stay reachable). Failures
+    # are retried with exponential backoff before /ready reports failed.
+    readiness.begin()
+    for attempt in range(retries + 1):
+        try:
+            version = await _warm_up_once(readiness)
+        except Exception as e:
+            if attempt == retries:
+                readiness.finish("failed", error=str(e))
+                return
+            delay = retry_seconds * 2 ** attempt
+            readiness.set_stage(f"retrying in {delay:g}s after error: {e}")
+            await asyncio.sleep(delay)
+            continue
+        readiness.finish("ready", model_version=version)
+        return
+
+
+# Global readiness instance
+readiness = Readiness()
@@ -0,0 +1,91 @@
+"""
+Per-call prediction latency: sklearn path vs the compiled inference kernel
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_inference
+    python -m benchmarks.bench_inference --clusters 8 --repeat 20000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.inference import InferenceKernel
+from app.preprocess import preprocess_data, build_kmeans, FEATURE_COLUMNS
+from app.utils import get_cluster_name, calculate_confidence, calculate_confidence_batch
+
+
+def sklearn_predict(kmeans, scaler, feature_names, features):
+    # The request path before the kernel: three sklearn calls per customer
+    features_scaled = scaler.transform(features)
+    cluster = int(kmeans.predict(features_scaled)[0])
+    distances = kmeans.transform(features_scaled)[0]
+    confidence = calculate_confidence(distances, cluster)
+    cluster_name = get_cluster_name(cluster, kmeans.cluster_centers_, feature_names)
+    return cluster, cluster_name, confidence
+
+
+def sklearn_predict_batch(kmeans, scaler, features):
+    # The /predict/batch path before the kernel
+    distances = kmeans.transform(scaler.transform(features))
+    clusters = distances.argmin(axis=1)
+    return clusters, calculate_confidence_batch(distances, clusters)
+
+
+def kernel_predict(kernel, features):
+    clusters, confidences = kernel.predict(features)
+    cluster = int(clusters[0])
+    return cluster, kernel.cluster_names[cluster], float(confidences[0])
+
+
+def time_per_call(fn, repeat):
+    # Best of 5 rounds, in microseconds per call
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clusters', default=5, type=int)
+    parser.add_argument('--repeat', default=5000, type=int)
+    parser.add_argument('--batch', default=10000, type=int)
+    args = parser.parse_args()
+    
+    # Synthetic customers shaped like generate_dataset.py's
+    rng = np.random.default_rng(42)
+    X = np.column_stack([
+        rng.integers(18, 70, 5000),
+        rng.uniform(15, 150, 5000).round(1),
+        rng.integers(1, 100, 5000),
+        rng.integers(1, 50, 5000)
+    ]).astype(np.float64)
+    df = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+    X_scaled, feature_names, scaler = preprocess_data(df)
+    kmeans = build_kmeans(args.clusters).fit(X_scaled)
+    kernel = InferenceKernel(kmeans, scaler, feature_names)
+    
+    row = np.array([[35, 65.0, 75, 12]], dtype=np.float64)
+    assert sklearn_predict(kmeans, scaler, feature_names, row) == kernel_predict(kernel, row)
+    
+    sklearn_us = time_per_call(lambda: sklearn_predict(kmeans, scaler, feature_names, row), args.repeat)
+    kernel_us = time_per_call(lambda: kernel_predict(kernel, row), args.repeat)
+    
+    batch = X[rng.integers(0, len(X), args.batch)]
+    batch_repeat = max(1, args.repeat // 500)
+    sklearn_batch_us = time_per_call(lambda: sklearn_predict_batch(kmeans, scaler, batch), batch_repeat)
+    kernel_batch_us = time_per_call(lambda: kernel.predict(batch), batch_repeat)
+    
+    print(f"k={args.clusters}, single row ({args.repeat} calls):")
+    print(f"  sklearn path   {sklearn_us:8.1f} us/call")
+    print(f"  fused kernel   {kernel_us:8.1f} us/call  ({sklearn_us / kernel_us:.1f}x faster)")
+    print(f"batch of {args.batch} rows:")
+    print(f"  sklearn path   {sklearn_batch_us / 1000:8.2f} ms/batch")
+    print(f"  fused kernel   {kernel_batch_us / 1000:8.2f} ms/batch  ({sklearn_batch_us / kernel_batch_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,18 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 from app.model import CustomerSegmentationModel
+from app.database import SessionLocal, User, init_db
+from app.auth import get_password_hash
 import os
 import tempfile
+import time
+import uuid
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create the database tables, as the app's lifespan does on startup"""
+    init_db()
 
 
 @pytest.fixture
@@ -49,3 +59,69 @@ def temp_model_dir(tmp_path):
     model_dir = tmp_path / "models"
     model_dir.mkdir()
     return model_dir
+
+
+def _create_user(role):
+    """Insert a user with the given role and return its credentials"""
+    username = f"test_{role}_{uuid.uuid4().hex[:8]}"
+    password = "secret123"
+    db = SessionLocal()
+    try:
+        db.add(User(
+            email=f"{username}@example.com",
+            username=username,
+            hashed_password=get_password_hash(password),
+            role=role
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return username, password
+
+
+def _login(client, username, password):
+    response = client.post("/auth/login", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization headers for a fresh regular user"""
+    return _login(client, *_create_user("user"))
+
+
+@pytest.fixture
+def admin_headers(client):
+    """Authorization headers for a fresh admin user"""
+    return _login(client, *_create_user("admin"))
+
+
+def wait_for_training_job(client, job_id, timeout=180):
+    """Poll GET /train/{job_id} until the job finishes and return its final state"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/train/{job_id}").json()
+        if job["state"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.2)
+    raise TimeoutError(f"Training job {job_id} did not finish within {timeout}s")
+
+
+def wait_for_ready(client, timeout=120):
+    """Poll GET /ready until start-up warm-up finishes and return the final state"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        state = client.get("/ready").json()
+        if state["state"] in ("ready", "failed"):
+            return state
+        time.sleep(0.1)
+    raise TimeoutError(f"Warm-up did not finish within {timeout}s")
+
+
+@pytest.fixture
+def train_and_wait(client):
+    """Submit a training job and block until it finishes"""
+    def _train(**params):
+        response = client.post("/train", json=params or None)
+        return wait_for_training_job(client, response.json()["job_id"])
+    return _train
@@ -3,6 +3,7 @@ API endpoint tests
 """
 import pytest
 from fastapi import status
+from tests.conftest import wait_for_training_job
 
 
 class TestHealthCheck:
@@ -22,10 +23,17 @@ class TestTrainEndpoint:
     """Test model training endpoint"""
     
     def test_train_model_success(self, client):
-        """Test POST /train successfully trains model"""
+        """Test POST /train runs a background job that trains the model"""
         response = client.post("/train")
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job = response.json()
+        assert "job_id" in job
+        assert job["state"] in ["queued", "running"]
+        
+        job = wait_for_training_job(client, job["job_id"])
+        assert job["state"] == "succeeded", job["error"]
+        assert job["progress"] == 1.0
+        data = job["metrics"]
         
         # Check response structure
         assert "message" in data
@@ -40,6 +48,46 @@ class TestTrainEndpoint:
         assert -1 <= data["silhouette_score"] <= 1
         assert isinstance(data["inertia"], float)
         assert data["inertia"] > 0
+    
+    def test_train_with_engine_options(self, train_and_wait):
+        """Test POST /train accepts engine and dtype settings"""
+        job = train_and_wait(
+            n_clusters=4,
+            engine="minibatch",
+            batch_size=256,
+            dtype="float32"
+        )
+        assert job["state"] == "succeeded", job["error"]
+        data = job["metrics"]
+        assert data["n_clusters"] == 4
+        assert data["engine"] == "minibatch"
+        assert data["dtype"] == "float32"
+    
+    def test_concurrent_train_requests_are_coalesced(self, client):
+        """Test a second identical POST /train while a job is running joins that job"""
+        first = client.post("/train", json={"n_clusters": 3}).json()
+        second = client.post("/train", json={"n_clusters": 3}).json()
+        assert second["job_id"] == first["job_id"]
+        assert second["coalesced"] is True
+        
+        # Different parameters are not silently folded into the active job
+        response = client.post("/train", json={"n_clusters": 5})
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert first["job_id"] in response.json()["detail"]
+        
+        job = wait_for_training_job(client, first["job_id"])
+        assert job["state"] == "succeeded", job["error"]
+        assert job["metrics"]["n_clusters"] == 3
+    
+    def test_get_unknown_job(self, client):
+        """Test GET /train/{job_id} returns 404 for unknown jobs"""
+        response = client.get("/train/does-not-exist")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_train_with_invalid_engine(self, client):
+        """Test POST /train rejects unknown engines"""
+        response = client.post("/train", json={"engine": "bogus"})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
 
 
 class TestPredictEndpoint:
@@ -58,10 +106,10 @@ class TestPredictEndpoint:
         # Should fail if model not trained
         assert response.status_code in [status.HTTP_400_BAD_REQUEST, status.HTTP_200_OK]
     
-    def test_predict_with_valid_data(self, client, sample_customer_data):
+    def test_predict_with_valid_data(self, client, train_and_wait, sample_customer_data):
         """Test POST /predict with valid customer data"""
         # Train model first
-        client.post("/train")
+        train_and_wait()
         
         # Make prediction
         response = client.post("/predict", json=sample_customer_data)
@@ -138,10 +186,10 @@ class TestClustersEndpoint:
         # Should fail if model not trained
         assert response.status_code in [status.HTTP_400_BAD_REQUEST, status.HTTP_200_OK]
     
-    def test_get_clusters_with_training(self, client):
+    def test_get_clusters_with_training(self, client, train_and_wait):
         """Test GET /clusters returns statistics after training"""
         # Train model first
-        client.post("/train")
+        train_and_wait()
         
         # Get cluster statistics
         response = client.get("/clusters")
@@ -202,3 +250,212 @@ class TestElbowEndpoint:
         # Check list lengths match
         assert len(data["k_range"]) == len(data["inertias"])
         assert len(data["k_range"]) == len(data["silhouette_scores"])
+
+
+class TestModelVersionsEndpoint:
+    """Test admin model registry endpoints"""
+    
+    def test_list_and_rollback(self, client, admin_headers, train_and_wait):
+        """Test admins can list versions and roll back to an earlier one"""
+        first = train_and_wait(n_clusters=3)["metrics"]["model_version"]
+        second = train_and_wait(n_clusters=4)["metrics"]["model_version"]
+        
+        response = client.get("/admin/models", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["current"] == second
+        assert [v["version"] for v in data["versions"]][:2] == [second, first]
+        
+        response = client.post(f"/admin/models/{first}/rollback", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/admin/models", headers=admin_headers).json()["current"] == first
+    
+    def test_rollback_unknown_version(self, client, admin_headers):
+        """Test rolling back to an unknown version returns 404"""
+        response = client.post("/admin/models/nope/rollback", headers=admin_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestLiveSegmentsEndpoint:
+    """Test live segment statistics endpoint"""
+    
+    def test_predictions_update_live_segments(self, client, auth_headers, train_and_wait, sample_customer_data):
+        """Test customers scored through /predict show up in /segments/live"""
+        version = train_and_wait(n_clusters=3)["metrics"]["model_version"]
+        
+        response = client.get("/segments/live", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["total_customers"] == 0
+        
+        for _ in range(2):
+            prediction = client.post("/predict", json=sample_customer_data, headers=auth_headers).json()
+        
+        data = client.get("/segments/live", headers=auth_headers).json()
+        assert data["model_version"] == version
+        assert data["total_customers"] == 2
+        cluster = data["clusters"][0]
+        assert cluster["cluster_id"] == prediction["cluster"]
+        assert cluster["count"] == 2
+        assert cluster["mean"]["age"] == sample_customer_data["age"]
+        assert cluster["variance"]["age"] == 0
+    
+    def test_requires_auth(self, client):
+        """Test /segments/live requires authentication"""
+        response = client.get("/segments/live")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestBatchPredictEndpoint:
+    """Test batch prediction endpoint"""
+    
+    def test_batch_predict(self, client, auth_headers, train_and_wait, sample_customer_data):
+        """Test POST /predict/batch scores every row and records history"""
+        train_and_wait(n_clusters=3)
+        customers = [
+            {**sample_customer_data, "age": age, "spending_score": score}
+            for age, score in [(22, 90), (45, 20), (60, 55)]
+        ]
+        before = client.get("/history", headers=auth_headers).json()["total"]
+        
+        response = client.post("/predict/batch", json={"customers": customers}, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["count"] == 3
+        for customer, prediction in zip(customers, data["predictions"]):
+            single = client.post("/predict", json=customer, headers=auth_headers).json()
+            assert prediction["cluster"] == single["cluster"]
+            assert prediction["confidence"] == single["confidence"]
+            assert prediction["customer_data"] == customer
+        
+        assert client.get("/history", headers=auth_headers).json()["total"] == before + 6
+    
+    def test_batch_predict_rejects_empty_batch(self, client, auth_headers):
+        """Test an empty batch fails validation"""
+        response = client.post("/predict/batch", json={"customers": []}, headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    def test_batch_predict_validates_rows(self, client, auth_headers, sample_customer_data):
+        """Test an invalid row fails the whole batch"""
+        customers = [sample_customer_data, {**sample_customer_data, "age": 150}]
+        response = client.post("/predict/batch", json={"customers": customers}, headers=auth_headers)
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestUploadEndpoint:
+    """Test streaming CSV scoring endpoint"""
+    
+    CSV = (
+        "CustomerID,Sex,Age,Annual_Income,Spending_Score,Purchase_Frequency\n"
+        "1,Male,35,65.0,75,12\n"
+        "2,Female,22,20.5,90,40\n"
+        "3,Male,abc,50.0,10,5\n"
+        "4,Female,61,140.0,5,2\n"
+        "5,Male,44,80.0,50,20\n"
+    )
+    
+    def _upload(self, client, headers, content, output_format="ndjson"):
+        return client.post(
+            f"/predict/upload?output_format={output_format}",
+            files={"file": ("customers.csv", content, "text/csv")},
+            headers=headers
+        )
+    
+    def test_ndjson_in_chunks(self, client, auth_headers, train_and_wait, monkeypatch):
+        """Test every row is scored across chunk boundaries"""
+        import json
+        import app.main
+        
+        train_and_wait(n_clusters=3)
+        monkeypatch.setattr(app.main, "SCORE_CHUNK_ROWS", 2)
+        
+        response = self._upload(client, auth_headers, self.CSV)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["CustomerID"] for row in rows] == [1, 2, 3, 4, 5]
+        
+        # Unparseable rows are reported with null predictions
+        assert rows[2]["cluster"] is None
+        
+        single = client.post("/predict", json={
+            "sex": "Male", "age": 35, "annual_income": 65.0, "spending_score": 75, "purchase_frequency": 12
+        }, headers=auth_headers).json()
+        assert rows[0]["cluster"] == single["cluster"]
+        assert rows[0]["confidence"] == single["confidence"]
+    
+    def test_csv_output(self, client, auth_headers, train_and_wait, monkeypatch):
+        """Test CSV output has one header and a line per row"""
+        import app.main
+        
+        train_and_wait(n_clusters=3)
+        monkeypatch.setattr(app.main, "SCORE_CHUNK_ROWS", 2)
+        
+        response = self._upload(client, auth_headers, self.CSV, "csv")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0] == "CustomerID,cluster,cluster_name,confidence"
+        assert len(lines) == 6
+    
+    @pytest.mark.parametrize("output_format", ["ndjson", "csv"])
+    def test_bad_row_after_first_chunk(self, client, auth_headers, train_and_wait, monkeypatch, output_format):
+        """Test a malformed row past the first chunk ends the stream with an error record"""
+        import json
+        import app.main
+        
+        train_and_wait(n_clusters=3)
+        monkeypatch.setattr(app.main, "SCORE_CHUNK_ROWS", 2)
+        # Unterminated quote: the second chunk fails to tokenize
+        content = self.CSV.replace("4,Female,", '4,"Female,')
+        
+        response = self._upload(client, auth_headers, content, output_format)
+        assert response.status_code == status.HTTP_200_OK
+        lines = response.text.splitlines()
+        if output_format == "csv":
+            assert len(lines) == 4
+            assert lines[-1].startswith("# error:")
+        else:
+            error = json.loads(lines[-1])
+            assert error["rows_scored"] == 2
+            assert "error" in error
+    
+    def test_missing_columns(self, client, auth_headers, train_and_wait):
+        """Test uploads without the feature columns are rejected"""
+        train_and_wait(n_clusters=3)
+        response = self._upload(client, auth_headers, "CustomerID,Age\n1,30\n")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "Annual_Income" in response.json()["detail"]
+    
+    def test_requires_auth(self, client):
+        """Test uploads require authentication"""
+        response = self._upload(client, {}, self.CSV)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestProfilesEndpoint:
+    """Test customer profile CRUD"""
+    
+    def test_profile_lifecycle(self, client, auth_headers):
+        """Test creating, listing, updating and deleting a profile"""
+        profile = {
+            "name": "Jane",
+            "sex": "Female",
+            "age": 30,
+            "annual_income": 55.0,
+            "spending_score": 60,
+            "purchase_frequency": 8
+        }
+        response = client.post("/profiles/", json=profile, headers=auth_headers)
+        assert response.status_code == status.HTTP_201_CREATED
+        profile_id = response.json()["id"]
+        
+        assert [p["id"] for p in client.get("/profiles/", headers=auth_headers).json()] == [profile_id]
+        
+        response = client.put(f"/profiles/{profile_id}", json={"age": 31}, headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["age"] == 31
+        assert client.get(f"/profiles/{profile_id}", headers=auth_headers).json()["age"] == 31
+        
+        assert client.delete(f"/profiles/{profile_id}", headers=auth_headers).status_code == status.HTTP_200_OK
+        response = client.get(f"/profiles/{profile_id}", headers=auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
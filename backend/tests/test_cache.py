@@ -0,0 +1,334 @@
+# Result cache tests
+import os
+import time
+import numpy as np
+from fastapi import status
+from app.cache import (
+    ResultCache,
+    PredictionCache,
+    UserCache,
+    dataset_fingerprint,
+    make_cache_key,
+    normalize_customer_features,
+    result_cache,
+    prediction_cache,
+    user_cache
+)
+from tests.conftest import _create_user, _login
+
+
+def _record_hits(monkeypatch):
+    # Sweeps and fits can run in other processes, so the result cache keeps
+    # no counters; record which lookups in this process were hits instead
+    hits = []
+    get = result_cache.get
+    
+    def recording_get(key):
+        value = get(key)
+        hits.append(value is not None)
+        return value
+    
+    monkeypatch.setattr(result_cache, "get", recording_get)
+    return hits
+
+
+class TestCacheKeys:
+    """Test content-addressed cache keys"""
+    
+    def test_fingerprint_depends_on_contents(self):
+        """Test equal arrays share a fingerprint and different ones don't"""
+        X = np.arange(12, dtype=np.float64).reshape(6, 2)
+        assert dataset_fingerprint(X) == dataset_fingerprint(X.copy())
+        assert dataset_fingerprint(X) != dataset_fingerprint(X + 1)
+        assert dataset_fingerprint(X) != dataset_fingerprint(X.astype(np.float32))
+        assert dataset_fingerprint(X) != dataset_fingerprint(X.reshape(3, 4))
+    
+    def test_key_depends_on_params(self):
+        """Test parameters and result kind are part of the key"""
+        fingerprint = dataset_fingerprint(np.zeros((3, 2)))
+        key = make_cache_key("train", fingerprint, {"n_clusters": 3, "engine": "lloyd"})
+        assert key == make_cache_key("train", fingerprint, {"engine": "lloyd", "n_clusters": 3})
+        assert key != make_cache_key("train", fingerprint, {"n_clusters": 4, "engine": "lloyd"})
+        assert key != make_cache_key("sweep", fingerprint, {"n_clusters": 3, "engine": "lloyd"})
+
+
+class TestResultCache:
+    """Test the on-disk LRU result cache"""
+    
+    def test_get_set_and_stats(self, tmp_path):
+        """Test round trip and on-disk stats"""
+        cache = ResultCache(tmp_path, max_bytes=10 * 1024 * 1024)
+        assert cache.get("missing") is None
+        cache.set("key", {"value": 42})
+        assert cache.get("key") == {"value": 42}
+        
+        stats = cache.stats()
+        assert stats["entries"] == 1
+        assert stats["total_bytes"] == (tmp_path / "key.joblib").stat().st_size
+        assert [item["key"] for item in stats["items"]] == ["key"]
+    
+    def test_lru_eviction(self, tmp_path):
+        """Test the least recently used entry is evicted first"""
+        payload = np.zeros(1000)
+        cache = ResultCache(tmp_path, max_bytes=10 * 1024 * 1024)
+        cache.set("a", payload)
+        entry_size = cache.stats()["total_bytes"]
+        cache.max_bytes = int(entry_size * 2.5)
+        
+        cache.set("b", payload)
+        # Make "a" the most recently used entry
+        os.utime(tmp_path / "b.joblib", (time.time() - 60, time.time() - 60))
+        cache.get("a")
+        cache.set("c", payload)
+        
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+    
+    def test_disabled_cache(self, tmp_path):
+        """Test a zero size bound disables the cache"""
+        cache = ResultCache(tmp_path, max_bytes=0)
+        cache.set("key", 1)
+        assert cache.get("key") is None
+        assert cache.stats()["entries"] == 0
+    
+    def test_corrupt_entry_is_a_miss(self, tmp_path):
+        """Test an unreadable entry is a miss and is removed"""
+        cache = ResultCache(tmp_path, max_bytes=10 * 1024 * 1024)
+        cache.set("key", {"value": 42})
+        (tmp_path / "key.joblib").write_bytes(b"not a pickle")
+        
+        assert cache.get("key") is None
+        assert not (tmp_path / "key.joblib").exists()
+    
+    def test_clear(self, tmp_path):
+        """Test purging removes every entry"""
+        cache = ResultCache(tmp_path, max_bytes=10 * 1024 * 1024)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.clear() == 2
+        assert cache.stats()["entries"] == 0
+
+
+class TestModelCaching:
+    """Test sweep and training results are served from the cache"""
+    
+    def test_repeat_training_hits_cache(self, ml_model, monkeypatch):
+        """Test identical retraining reuses the cached fit"""
+        first = ml_model.train(n_clusters=3)
+        hits = _record_hits(monkeypatch)
+        second = ml_model.train(n_clusters=3)
+        assert hits == [True]
+        first.pop("model_version")
+        second.pop("model_version")
+        assert second == first
+    
+    def test_default_fit_params_are_part_of_key(self, ml_model, monkeypatch):
+        """Test changing MAX_ITER retrains instead of serving the old fit"""
+        import app.preprocess as preprocess_module
+        ml_model.train(n_clusters=3)
+        monkeypatch.setattr(preprocess_module, "MAX_ITER", 7)
+        hits = _record_hits(monkeypatch)
+        ml_model.train(n_clusters=3)
+        assert hits == [False]
+    
+    def test_repeat_sweep_hits_cache(self, ml_model, monkeypatch):
+        """Test the elbow sweep is computed once per dataset"""
+        first = ml_model.get_elbow_data()
+        hits = _record_hits(monkeypatch)
+        second = ml_model.get_elbow_data()
+        assert hits == [True]
+        assert second == first
+
+
+class TestPredictionCache:
+    """Test the in-memory prediction LRU"""
+    
+    def test_lru_eviction_and_counters(self):
+        """Test the least recently used entry is evicted at capacity"""
+        cache = PredictionCache(capacity=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert (stats["hits"], stats["misses"]) == (3, 1)
+    
+    def test_disabled(self):
+        """Test a zero capacity cache stores nothing"""
+        cache = PredictionCache(capacity=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert cache.stats()["enabled"] is False
+    
+    def test_normalized_features(self):
+        """Test only already-normalized features produce a key"""
+        customer = {'age': 35, 'annual_income': 65.0, 'spending_score': 75, 'purchase_frequency': 12}
+        assert normalize_customer_features(customer) == (35, 65.0, 75, 12)
+        assert normalize_customer_features({**customer, 'annual_income': 65}) == (35, 65.0, 75, 12)
+        assert normalize_customer_features({**customer, 'annual_income': 65.04}) is None
+    
+    def test_model_predict_uses_cache(self, ml_model, sample_customer_data):
+        """Test repeated predictions are cache hits and retraining flushes them"""
+        ml_model.train(n_clusters=3)
+        assert prediction_cache.stats()["entries"] == 0
+        
+        first = ml_model.predict(sample_customer_data)
+        hits = prediction_cache.hits
+        second = ml_model.predict(sample_customer_data)
+        assert prediction_cache.hits == hits + 1
+        assert second == first
+        
+        # Results are copies, so callers can't corrupt the cache
+        second["cluster"] = -1
+        assert ml_model.predict(sample_customer_data) == first
+        
+        ml_model.train(n_clusters=4)
+        assert prediction_cache.stats()["entries"] == 0
+    
+    def test_unnormalized_features_bypass_cache(self, ml_model, sample_customer_data):
+        """Test features that normalization would change are scored directly"""
+        ml_model.train(n_clusters=3)
+        customer = {**sample_customer_data, 'annual_income': 65.04}
+        ml_model.predict(customer)
+        ml_model.predict(customer)
+        
+        assert prediction_cache.stats()["entries"] == 0
+
+
+class TestUserCache:
+    """Test the authenticated-user TTL + LRU cache"""
+    
+    def test_ttl_and_lru(self):
+        """Test entries expire after the TTL and the LRU bound holds"""
+        cache = UserCache(capacity=2, ttl=0.2)
+        cache.set_user("a", "user-a", cache.generation)
+        cache.set_user("b", "user-b", cache.generation)
+        assert cache.get_user("a") == "user-a"
+        cache.set_user("c", "user-c", cache.generation)
+        assert cache.get_user("b") is None
+        
+        time.sleep(0.25)
+        assert cache.get_user("a") is None
+        assert cache.get_user("c") is None
+    
+    def test_token_entries_respect_expiry(self):
+        """Test a cached token never outlives its exp claim"""
+        cache = UserCache(capacity=10, ttl=60)
+        cache.set_username("token", "alice", token_expires_at=time.time() + 60)
+        assert cache.get_username("token") == "alice"
+        cache.set_username("expired", "alice", token_expires_at=time.time() - 1)
+        assert cache.get_username("expired") is None
+    
+    def test_invalidation_beats_in_flight_reads(self):
+        """Test a record read before an invalidation is not cached after it"""
+        cache = UserCache(capacity=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate("alice")
+        cache.set_user("alice", "stale", generation)
+        assert cache.get_user("alice") is None
+    
+    def test_disabled(self):
+        """Test a zero TTL disables the cache"""
+        cache = UserCache(capacity=10, ttl=0)
+        cache.set_user("alice", "user", cache.generation)
+        assert cache.get_user("alice") is None
+        assert cache.stats()["enabled"] is False
+
+
+class TestAuthenticatedUserCaching:
+    """Test get_current_user serves cached users and sees every change"""
+    
+    def _user(self, client):
+        username, password = _create_user("user")
+        headers = _login(client, username, password)
+        return username, headers, client.get("/auth/me", headers=headers).json()["id"]
+    
+    def test_repeat_requests_hit_cache(self, client):
+        """Test the user is looked up once across requests"""
+        _, headers, _ = self._user(client)
+        hits = user_cache.hits
+        for _ in range(3):
+            assert client.get("/auth/me", headers=headers).status_code == status.HTTP_200_OK
+        assert user_cache.hits == hits + 3
+    
+    def test_cached_user_can_be_updated(self, client):
+        """Test a cached user is still attached to the request's session"""
+        _, headers, _ = self._user(client)
+        response = client.put("/users/me", json={"full_name": "Cached User"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/auth/me", headers=headers).json()["full_name"] == "Cached User"
+    
+    def test_role_change_invalidates(self, client, admin_headers):
+        """Test a promotion applies on the user's next request"""
+        _, headers, user_id = self._user(client)
+        assert client.get("/admin/stats", headers=headers).status_code == status.HTTP_403_FORBIDDEN
+        
+        response = client.put(f"/admin/users/{user_id}/role", json={"role": "admin"}, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/admin/stats", headers=headers).status_code == status.HTTP_200_OK
+    
+    def test_deactivation_invalidates(self, client, admin_headers):
+        """Test a deactivated user is rejected at once"""
+        _, headers, user_id = self._user(client)
+        client.put(f"/admin/users/{user_id}/toggle-active", headers=admin_headers)
+        response = client.get("/auth/me", headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_delete_invalidates(self, client, admin_headers):
+        """Test a deleted user's token stops working"""
+        _, headers, user_id = self._user(client)
+        client.delete(f"/admin/users/{user_id}", headers=admin_headers)
+        assert client.get("/auth/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_rename_invalidates(self, client):
+        """Test a token for the old username stops working after a rename"""
+        username, headers, _ = self._user(client)
+        response = client.put("/users/me", json={"username": f"{username}_renamed"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/auth/me", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestCacheEndpoints:
+    """Test admin cache endpoints"""
+    
+    def test_inspect_and_purge(self, client, admin_headers):
+        """Test admins can inspect and purge the cache"""
+        response = client.get("/admin/cache", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert "entries" in response.json()
+        
+        response = client.delete("/admin/cache", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/admin/cache", headers=admin_headers).json()["entries"] == 0
+    
+    def test_requires_admin(self, client, auth_headers):
+        """Test regular users cannot reach the cache endpoints"""
+        response = client.get("/admin/cache", headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_prediction_cache_endpoints(self, client, admin_headers):
+        """Test admins can inspect and purge the prediction cache"""
+        response = client.get("/admin/cache/predictions", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert "hit_rate" in response.json()
+        
+        response = client.delete("/admin/cache/predictions", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert client.get("/admin/cache/predictions", headers=admin_headers).json()["entries"] == 0
+
+    def test_user_cache_endpoints(self, client, admin_headers):
+        """Test admins can inspect and purge the user cache"""
+        response = client.get("/admin/cache/users", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["entries"] >= 1
+        
+        response = client.delete("/admin/cache/users", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        # The inspecting request caches its admin again
+        assert client.get("/admin/cache/users", headers=admin_headers).json()["entries"] == 1
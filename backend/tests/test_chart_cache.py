@@ -0,0 +1,193 @@
+# Pre-rendered chart cache tests
+import struct
+from fastapi import status
+from app.chart_cache import (
+    ChartCache,
+    chart_cache,
+    elbow_chart_name,
+    chart_image_size,
+    etag_matches,
+    CHARTS_DIR_NAME
+)
+from app.utils import model_version_dir, SWEEP_WARM_START
+
+
+class TestTrainTimeRendering:
+    """Test charts are rendered when training finishes"""
+    
+    def test_charts_written_with_version(self, ml_model):
+        """Test training with a sweep stores cluster and elbow charts"""
+        version = ml_model.train()["model_version"]
+        charts_dir = model_version_dir(version) / CHARTS_DIR_NAME
+        
+        assert (charts_dir / "clusters.json").exists()
+        assert (charts_dir / f"{elbow_chart_name(SWEEP_WARM_START)}.json").exists()
+        clusters = ChartCache().load(version, "clusters")
+        assert set(clusters) == {"pie_chart", "bar_chart", "size_chart"}
+    
+    def test_explicit_k_skips_elbow(self, ml_model):
+        """Test the elbow chart is left for lazy rendering when no sweep ran"""
+        version = ml_model.train(n_clusters=3)["model_version"]
+        charts_dir = model_version_dir(version) / CHARTS_DIR_NAME
+        
+        assert (charts_dir / "clusters.json").exists()
+        assert not (charts_dir / f"{elbow_chart_name(SWEEP_WARM_START)}.json").exists()
+
+
+class TestChartCache:
+    """Test the in-memory and on-disk chart cache"""
+    
+    def test_disk_fallback(self, ml_model):
+        """Test a fresh cache reads charts from the version directory"""
+        version = ml_model.train(n_clusters=3)["model_version"]
+        cache = ChartCache()
+        
+        assert cache.get_memory(version, "clusters") is None
+        assert cache.load(version, "clusters") is not None
+        assert cache.get_memory(version, "clusters") is not None
+    
+    def test_set_persists(self, ml_model):
+        """Test set writes through to disk"""
+        version = ml_model.train(n_clusters=3)["model_version"]
+        ChartCache().set(version, "custom", {"chart": "data"})
+        
+        assert ChartCache().load(version, "custom") == {"chart": "data"}
+    
+    def test_legacy_versions_memory_only(self):
+        """Test versions without a directory are cached in memory"""
+        cache = ChartCache()
+        cache.set("legacy", "clusters", {"chart": "data"})
+        
+        assert cache.load("legacy", "clusters") == {"chart": "data"}
+        assert ChartCache().load("legacy", "clusters") is None
+    
+    def test_bounded(self):
+        """Test the oldest entries are dropped past max_entries"""
+        cache = ChartCache(max_entries=2)
+        for name in ("a", "b", "c"):
+            cache.set("legacy", name, {"chart": name})
+        
+        assert cache.get_memory("legacy", "a") is None
+        assert cache.get_memory("legacy", "c") == {"chart": "c"}
+
+
+class TestChartEndpoints:
+    """Test chart endpoints serve pre-rendered charts"""
+    
+    def test_cluster_charts_not_rerendered(self, client, auth_headers, train_and_wait, monkeypatch):
+        """Test /charts/clusters never renders for a freshly trained version"""
+        import app.main
+        
+        train_and_wait(n_clusters=3)
+        
+        async def fail(*args, **kwargs):
+            raise AssertionError("chart rendered on the request path")
+        monkeypatch.setattr(app.main, "run_cpu", fail)
+        
+        response = client.get("/charts/clusters", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["n_clusters"] == 3
+    
+    def test_elbow_rendered_once_on_miss(self, client, auth_headers, train_and_wait):
+        """Test a lazily rendered elbow chart is stored for the version"""
+        version = train_and_wait(n_clusters=3)["metrics"]["model_version"]
+        name = elbow_chart_name(SWEEP_WARM_START)
+        
+        response = client.get("/charts/elbow", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert (model_version_dir(version) / CHARTS_DIR_NAME / f"{name}.json").exists()
+        assert chart_cache.get_memory(version, name) == response.json()
+
+
+def png_size(content):
+    # Width and height from the PNG IHDR chunk
+    return struct.unpack(">II", content[16:24])
+
+
+class TestChartImages:
+    """Test charts served as raw images with ETags"""
+    
+    def test_image_size(self):
+        """Test a missing side keeps the default aspect ratio"""
+        assert chart_image_size("pie") == (1000, 800)
+        assert chart_image_size("pie", dpi=50) == (500, 400)
+        assert chart_image_size("pie", width=500) == (500, 400)
+        assert chart_image_size("pie", height=400) == (500, 400)
+        assert chart_image_size("pie", 300, 300) == (300, 300)
+    
+    def test_derived_size_is_clamped(self):
+        """Test a derived side never exceeds the pixel limit"""
+        assert chart_image_size("bar", height=4000, max_pixels=4000) == (4000, 2286)
+        assert chart_image_size("bar", dpi=300, max_pixels=4000) == (4000, 2286)
+        assert chart_image_size("pie", width=4000, max_pixels=4000) == (4000, 3200)
+    
+    def test_etag_matching(self):
+        """Test If-None-Match lists, wildcards and weak tags"""
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert etag_matches('*', '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+    
+    def test_png_with_etag(self, client, auth_headers, train_and_wait):
+        """Test a PNG is served at the requested size and revalidates to 304"""
+        train_and_wait(n_clusters=3)
+        response = client.get("/charts/pie.png?width=400&dpi=50", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "image/png"
+        assert response.content.startswith(b"\x89PNG")
+        assert png_size(response.content) == (400, 320)
+        etag = response.headers["etag"]
+        
+        response = client.get(
+            "/charts/pie.png?width=400&dpi=50",
+            headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    
+    def test_etag_depends_on_params_and_version(self, client, auth_headers, train_and_wait):
+        """Test other render parameters or a new model version change the ETag"""
+        train_and_wait(n_clusters=3)
+        first = client.get("/charts/bar.svg", headers=auth_headers)
+        assert first.headers["content-type"].startswith("image/svg+xml")
+        assert first.content.lstrip().startswith(b"<?xml")
+        assert client.get("/charts/bar.svg", headers=auth_headers).headers["etag"] == first.headers["etag"]
+        assert client.get("/charts/bar.svg?dpi=72", headers=auth_headers).headers["etag"] != first.headers["etag"]
+        assert client.get("/charts/bar.png", headers=auth_headers).headers["etag"] != first.headers["etag"]
+        
+        train_and_wait(n_clusters=4)
+        response = client.get(
+            "/charts/bar.svg",
+            headers={**auth_headers, "If-None-Match": first.headers["etag"]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["etag"] != first.headers["etag"]
+    
+    def test_image_cached_for_version(self, client, auth_headers, train_and_wait):
+        """Test default-size images are stored in the version directory and others are not"""
+        version = train_and_wait(n_clusters=3)["metrics"]["model_version"]
+        charts_dir = model_version_dir(version) / CHARTS_DIR_NAME
+        response = client.get("/charts/size.png", headers=auth_headers)
+        
+        assert (charts_dir / "size-1000x600-100dpi.png").read_bytes() == response.content
+        assert ChartCache().load(version, "size-1000x600-100dpi.png") == response.content
+        
+        response = client.get("/charts/size.png?width=300&height=200", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert not (charts_dir / "size-300x200-100dpi.png").exists()
+    
+    def test_elbow_image(self, client, auth_headers, train_and_wait):
+        """Test the elbow chart is served as an image"""
+        train_and_wait(n_clusters=3)
+        response = client.get("/charts/elbow.png?height=150", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert png_size(response.content) == (350, 150)
+    
+    def test_invalid_requests(self, client, auth_headers):
+        """Test unknown charts, formats and out of range sizes are rejected"""
+        assert client.get("/charts/heatmap.png", headers=auth_headers).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get("/charts/pie.gif", headers=auth_headers).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get("/charts/pie.png?dpi=5000", headers=auth_headers).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert client.get("/charts/pie.png").status_code == status.HTTP_401_UNAUTHORIZED
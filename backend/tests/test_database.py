@@ -0,0 +1,177 @@
+# Database engine configuration tests
+import threading
+import time
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import app.database as database
+from app.database import (
+    Base,
+    PredictionHistory,
+    create_db_engine,
+    create_async_db_engine,
+    async_database_url,
+    engine_options
+)
+
+WRITERS = 32
+COMMITS_PER_WRITER = 25
+
+
+def _pragma(engine, name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def measure_commit_throughput(engine):
+    """Commit one history row per transaction from WRITERS threads; return (commits/s, errors)"""
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    errors = []
+    start_barrier = threading.Barrier(WRITERS)
+    
+    def writer(writer_id):
+        start_barrier.wait()
+        for i in range(COMMITS_PER_WRITER):
+            db = Session()
+            try:
+                db.add(PredictionHistory(
+                    user_id=1,
+                    customer_data=f'{{"writer": {writer_id}, "i": {i}}}',
+                    cluster=0,
+                    cluster_name="test",
+                    confidence=1
+                ))
+                db.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.close()
+    
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT COUNT(*) FROM prediction_history")).scalar()
+    assert rows == WRITERS * COMMITS_PER_WRITER - len(errors)
+    return (rows / elapsed), errors
+
+
+class TestEngineOptions:
+    """Test pool settings per backend"""
+    
+    def test_sqlite_file(self):
+        """Test file databases get a sized pool and a busy timeout"""
+        options = engine_options("sqlite:///./app.db")
+        assert options["connect_args"]["check_same_thread"] is False
+        assert options["connect_args"]["timeout"] == database.SQLITE_BUSY_TIMEOUT_MS / 1000
+        assert options["pool_size"] == database.DB_POOL_SIZE
+        assert options["max_overflow"] == database.DB_MAX_OVERFLOW
+    
+    def test_sqlite_memory(self):
+        """Test in-memory databases keep their single shared connection"""
+        assert "pool_size" not in engine_options("sqlite:///:memory:")
+        assert "pool_size" not in engine_options("sqlite://")
+    
+    def test_server_backend(self):
+        """Test other backends get pool sizing, pre-ping and recycling"""
+        options = engine_options("postgresql://user:secret@db/app")
+        assert "connect_args" not in options
+        assert options["pool_pre_ping"] is True
+        assert options["pool_recycle"] == database.DB_POOL_RECYCLE
+        assert options["pool_size"] == database.DB_POOL_SIZE
+
+
+class TestSqlitePragmas:
+    """Test every SQLite connection is configured"""
+    
+    def test_pragmas_applied(self, tmp_path):
+        """Test WAL, synchronous, busy timeout, mmap and cache size"""
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        assert _pragma(engine, "journal_mode") == "wal"
+        assert _pragma(engine, "synchronous") == 1  # NORMAL
+        assert _pragma(engine, "busy_timeout") == database.SQLITE_BUSY_TIMEOUT_MS
+        assert _pragma(engine, "mmap_size") == database.SQLITE_MMAP_SIZE
+        assert _pragma(engine, "cache_size") == -database.SQLITE_CACHE_SIZE_KB
+        engine.dispose()
+
+
+class TestConcurrentWrites:
+    """Test commit throughput with many parallel writers"""
+    
+    def test_parallel_writers(self, tmp_path):
+        """Test 32 writers all commit without lock errors"""
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        _, errors = measure_commit_throughput(engine)
+        engine.dispose()
+        
+        assert errors == []
+
+
+class TestAsyncDatabase:
+    """Test the async engine used by the hot request paths"""
+    
+    def test_async_url(self):
+        """Test the async driver is derived from DATABASE_URL"""
+        assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+        assert async_database_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+        assert async_database_url("sqlite+aiosqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    
+    @pytest.mark.asyncio
+    async def test_async_engine_configured(self, tmp_path):
+        """Test async connections get the same pragmas and see sync writes"""
+        url = f"sqlite:///{tmp_path / 'app.db'}"
+        sync_engine = create_db_engine(url)
+        Base.metadata.create_all(bind=sync_engine)
+        with sync_engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO prediction_history (user_id, customer_data) VALUES (1, '{}')"
+            ))
+        
+        engine = create_async_db_engine(async_database_url(url))
+        async with engine.connect() as connection:
+            assert (await connection.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await connection.execute(text("PRAGMA busy_timeout"))).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+            assert (await connection.execute(text("SELECT COUNT(*) FROM prediction_history"))).scalar() == 1
+        await engine.dispose()
+        sync_engine.dispose()
+    
+    def test_hot_routes_use_only_the_async_session(self, client, train_and_wait, sample_customer_data):
+        """Test the ported routes, authentication included, never open a sync session"""
+        from app.main import app
+        from app.database import get_db
+        from app.cache import user_cache
+        from tests.conftest import _create_user, _login
+        
+        train_and_wait(n_clusters=3)
+        headers = _login(client, *_create_user("user"))
+        
+        def no_sync_session():
+            raise AssertionError("sync session opened")
+        app.dependency_overrides[get_db] = no_sync_session
+        try:
+            # First round looks the user up, the second serves it from the cache
+            user_cache.clear()
+            for _ in range(2):
+                response = client.post("/predict", json=sample_customer_data, headers=headers)
+                assert response.status_code == status.HTTP_200_OK
+                response = client.post("/predict/batch", json={"customers": [sample_customer_data]}, headers=headers)
+                assert response.status_code == status.HTTP_200_OK
+                assert client.get("/history", headers=headers).status_code == status.HTTP_200_OK
+                response = client.post("/profiles/", json={**sample_customer_data, "name": "Async"}, headers=headers)
+                assert response.status_code == status.HTTP_201_CREATED
+                assert client.get("/profiles/", headers=headers).status_code == status.HTTP_200_OK
+                response = client.post(
+                    "/predict/upload",
+                    files={"file": ("customers.csv", "Age,Annual_Income,Spending_Score,Purchase_Frequency\n35,65.0,75,12\n", "text/csv")},
+                    headers=headers
+                )
+                assert response.status_code == status.HTTP_200_OK
+        finally:
+            app.dependency_overrides.pop(get_db)
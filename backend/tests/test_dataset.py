@@ -0,0 +1,123 @@
+# Dataset storage backend tests
+import os
+import pandas as pd
+import pytest
+import app.preprocess as preprocess
+from app.preprocess import (
+    load_dataset,
+    generate_sample_data,
+    convert_dataset,
+    write_dataset,
+    FEATURE_COLUMNS
+)
+from app.utils import detect_dataset_format, _default_dataset_path
+
+
+@pytest.fixture
+def csv_dataset(tmp_path, monkeypatch):
+    """Write a small CSV dataset and point the loader at it"""
+    path = tmp_path / "customers.csv"
+    monkeypatch.setattr(preprocess, "DATASET_PATH", path)
+    df = generate_sample_data(n_samples=1000)
+    return path, df
+
+
+class TestFormatDetection:
+    """Test dataset format auto-detection"""
+    
+    def test_detect_by_suffix(self, tmp_path):
+        """Test known suffixes map to their format"""
+        assert detect_dataset_format(tmp_path / "a.csv") == "csv"
+        assert detect_dataset_format(tmp_path / "a.parquet") == "parquet"
+        assert detect_dataset_format(tmp_path / "a.arrow") == "arrow"
+        assert detect_dataset_format(tmp_path / "a.feather") == "arrow"
+    
+    def test_stale_columnar_copy_is_ignored(self, csv_dataset, tmp_path, monkeypatch):
+        """Test a CSV newer than its columnar copy is loaded instead"""
+        monkeypatch.delenv("DATASET_PATH", raising=False)
+        path, _ = csv_dataset
+        convert_dataset(path, tmp_path / "customers.parquet")
+        assert _default_dataset_path(tmp_path) == tmp_path / "customers.parquet"
+        
+        mtime = (tmp_path / "customers.parquet").stat().st_mtime
+        os.utime(path, (mtime + 10, mtime + 10))
+        assert _default_dataset_path(tmp_path) == path
+    
+    def test_detect_by_magic_bytes(self, csv_dataset, tmp_path):
+        """Test files with unknown suffixes are sniffed"""
+        path, df = csv_dataset
+        convert_dataset(path, tmp_path / "data.parquet")
+        convert_dataset(path, tmp_path / "data.arrow")
+        (tmp_path / "data.parquet").rename(tmp_path / "parquet.bin")
+        (tmp_path / "data.arrow").rename(tmp_path / "arrow.bin")
+        
+        assert detect_dataset_format(tmp_path / "parquet.bin") == "parquet"
+        assert detect_dataset_format(tmp_path / "arrow.bin") == "arrow"
+        assert detect_dataset_format(path.rename(tmp_path / "csv.bin")) == "csv"
+
+
+class TestColumnarDataset:
+    """Test loading Parquet and Arrow datasets"""
+    
+    @pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+    def test_converted_dataset_matches_csv(self, csv_dataset, tmp_path, monkeypatch, suffix):
+        """Test a converted dataset loads the same rows as the CSV"""
+        path, df = csv_dataset
+        expected = load_dataset()
+        
+        output = tmp_path / f"customers{suffix}"
+        assert convert_dataset(path, output, row_group_size=100) == len(df)
+        monkeypatch.setattr(preprocess, "DATASET_PATH", output)
+        
+        loaded = load_dataset()
+        pd.testing.assert_frame_equal(
+            loaded[FEATURE_COLUMNS], expected[FEATURE_COLUMNS], check_dtype=False
+        )
+    
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+    def test_column_projection_and_filters(self, csv_dataset, tmp_path, monkeypatch, suffix):
+        """Test columns and row filters give the same result in every format"""
+        path, df = csv_dataset
+        if suffix != ".csv":
+            output = tmp_path / f"customers{suffix}"
+            convert_dataset(path, output, row_group_size=100)
+            monkeypatch.setattr(preprocess, "DATASET_PATH", output)
+        
+        filters = [('Age', '>=', 40), ('Sex', '==', 'Female')]
+        loaded = load_dataset(columns=FEATURE_COLUMNS, filters=filters)
+        
+        expected = df[(df['Age'] >= 40) & (df['Sex'] == 'Female')][FEATURE_COLUMNS]
+        assert list(loaded.columns) == FEATURE_COLUMNS
+        assert len(loaded) == len(expected)
+        assert loaded['Annual_Income'].sum() == pytest.approx(expected['Annual_Income'].sum())
+    
+    def test_disjunctive_filters(self, csv_dataset):
+        """Test a list of conjunctions is ORed together"""
+        path, df = csv_dataset
+        loaded = load_dataset(filters=[[('Age', '<', 25)], [('Age', '>', 60)]])
+        
+        assert len(loaded) == ((df['Age'] < 25) | (df['Age'] > 60)).sum()
+    
+    def test_unknown_filter_operator(self, csv_dataset):
+        """Test unsupported filter operators are rejected"""
+        with pytest.raises(ValueError, match="Unsupported filter operator"):
+            load_dataset(filters=[('Age', '~', 1)])
+    
+    def test_missing_columnar_dataset_is_generated(self, tmp_path, monkeypatch):
+        """Test a missing Parquet dataset is generated in that format"""
+        path = tmp_path / "customers.parquet"
+        monkeypatch.setattr(preprocess, "DATASET_PATH", path)
+        
+        df = load_dataset(columns=FEATURE_COLUMNS)
+        assert list(df.columns) == FEATURE_COLUMNS
+        assert detect_dataset_format(path) == "parquet"
+        assert len(load_dataset()) == len(df)
+    
+    def test_write_dataset_round_trip(self, tmp_path, monkeypatch):
+        """Test write_dataset writes a file load_dataset reads back"""
+        df = pd.DataFrame({'Age': [20, 30], 'Annual_Income': [10.5, 20.5]})
+        path = tmp_path / "small.arrow"
+        write_dataset(df, path)
+        monkeypatch.setattr(preprocess, "DATASET_PATH", path)
+        
+        pd.testing.assert_frame_equal(load_dataset(), df)
@@ -0,0 +1,78 @@
+# Execution layer tests
+import os
+import shutil
+import threading
+import time
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from app.main import app
+from app.executors import run_io, run_cpu
+from app.chart_cache import chart_cache, CHARTS_DIR_NAME
+from app.model import ml_model
+from app.utils import model_version_dir
+from tests.conftest import _create_user, _login, wait_for_training_job, wait_for_ready
+
+
+class TestPools:
+    """Test work is dispatched to the right pool"""
+    
+    @pytest.mark.asyncio
+    async def test_run_io_uses_worker_thread(self):
+        """Test run_io runs off the event loop thread"""
+        loop_thread = threading.get_ident()
+        worker_thread = await run_io(threading.get_ident)
+        assert worker_thread != loop_thread
+    
+    @pytest.mark.asyncio
+    async def test_run_cpu_uses_worker_process(self):
+        """Test run_cpu runs in another process and passes arguments through"""
+        assert await run_cpu(os.getpid) != os.getpid()
+        assert await run_cpu(divmod, 17, 5) == (3, 2)
+
+
+class TestEventLoopResponsiveness:
+    """Test heavy handlers don't stall the event loop"""
+    
+    def test_health_latency_flat_during_chart_render(self):
+        """Test / stays fast while a chart render is in flight"""
+        with TestClient(app) as client:
+            assert wait_for_ready(client)["ready"]
+            headers = _login(client, *_create_user("user"))
+            job = client.post("/train", json={"n_clusters": 4}).json()
+            assert wait_for_training_job(client, job["job_id"])["state"] == "succeeded"
+            # Warm the CPU pool so process start-up isn't part of the render
+            assert client.get("/charts/elbow", headers=headers).status_code == status.HTTP_200_OK
+            
+            # Drop the pre-rendered charts so the next request renders them
+            shutil.rmtree(model_version_dir(ml_model.version) / CHARTS_DIR_NAME)
+            chart_cache.clear()
+            
+            render = {}
+            
+            def render_chart():
+                start = time.perf_counter()
+                render["status"] = client.get("/charts/clusters", headers=headers).status_code
+                render["seconds"] = time.perf_counter() - start
+            
+            thread = threading.Thread(target=render_chart)
+            thread.start()
+            latencies = []
+            while thread.is_alive():
+                start = time.perf_counter()
+                assert client.get("/").status_code == status.HTTP_200_OK
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.01)
+            thread.join()
+        
+        assert render["status"] == status.HTTP_200_OK
+        assert len(latencies) >= 3
+        # Health checks never wait for the render
+        assert max(latencies) < max(0.1, render["seconds"] / 4)
+    
+    def test_elbow_runs_in_process_pool(self, client, auth_headers, train_and_wait):
+        """Test /elbow serves the current version's sweep from the CPU pool"""
+        train_and_wait(n_clusters=3)
+        response = client.get("/elbow", headers=auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert 2 <= response.json()["optimal_k"] <= 10
@@ -0,0 +1,229 @@
+# Write-behind prediction history tests
+import asyncio
+import pytest
+import pytest_asyncio
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import app.main as main
+from app.main import app
+from app.database import Base, PredictionHistory, create_db_engine, create_async_db_engine, async_database_url
+from app.history_writer import HistoryWriter, history_writer, resolve_write_mode
+from tests.conftest import _create_user, _login
+
+
+def _rows(count, user_id=1):
+    return [
+        {'user_id': user_id, 'customer_data': f'{{"i": {i}}}', 'cluster': 0, 'cluster_name': "test", 'confidence': 1}
+        for i in range(count)
+    ]
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Async sessions on a fresh SQLite database"""
+    url = f"sqlite:///{tmp_path / 'history.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    engine = create_async_db_engine(async_database_url(url))
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+    sync_engine.dispose()
+
+
+class SlowWriter(HistoryWriter):
+    """History writer whose inserts take a while, recording the rows written"""
+    
+    def __init__(self, delay=0.1, fail=False, **kwargs):
+        super().__init__(session_factory=None, **kwargs)
+        self.delay = delay
+        self.fail = fail
+        self.written = []
+    
+    async def _write(self, rows):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.written.extend(rows)
+
+
+async def _count(session_factory):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(PredictionHistory))
+
+
+class TestHistoryWriter:
+    """Test rows are batched by size and time and never lost"""
+    
+    @pytest.mark.asyncio
+    async def test_size_threshold(self, session_factory):
+        """Test a full batch is written without waiting for the interval"""
+        writer = HistoryWriter(session_factory, batch_size=10, flush_interval=60, max_pending=100)
+        await writer.start()
+        await writer.submit(_rows(4))
+        await asyncio.sleep(0.1)
+        assert writer.stats()["pending"] == 4
+        
+        await writer.submit(_rows(6))
+        for _ in range(50):
+            if writer.rows_written == 10:
+                break
+            await asyncio.sleep(0.05)
+        assert await _count(session_factory) == 10
+        assert writer.stats()["batches_written"] == 1
+        await writer.stop()
+    
+    @pytest.mark.asyncio
+    async def test_time_threshold(self, session_factory):
+        """Test a partial batch is written once the interval passes"""
+        writer = HistoryWriter(session_factory, batch_size=100, flush_interval=0.1, max_pending=1000)
+        await writer.start()
+        await writer.submit(_rows(3))
+        await asyncio.sleep(0.5)
+        assert await _count(session_factory) == 3
+        await writer.stop()
+    
+    @pytest.mark.asyncio
+    async def test_stop_flushes(self, session_factory):
+        """Test rows still queued at shutdown are written"""
+        writer = HistoryWriter(session_factory, batch_size=100, flush_interval=60, max_pending=1000)
+        await writer.start()
+        await writer.submit(_rows(250))
+        await writer.stop()
+        
+        assert await _count(session_factory) == 250
+        stats = writer.stats()
+        assert (stats["running"], stats["pending"], stats["batches_written"]) == (False, 0, 3)
+    
+    @pytest.mark.asyncio
+    async def test_stop_during_write(self):
+        """Test stopping while a batch is being written loses no rows"""
+        writer = SlowWriter(batch_size=2, flush_interval=60, max_pending=100)
+        await writer.start()
+        await writer.submit(_rows(5))
+        # Let the flusher take the first batch and start writing it
+        await asyncio.sleep(0.05)
+        assert writer.stats()["pending"] == 3
+        await writer.stop()
+        
+        assert len(writer.written) == 5
+        assert writer.stats()["pending"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_flush_keeps_rows(self):
+        """Test a flush cancelled mid-write puts its batch back"""
+        writer = SlowWriter(batch_size=10, flush_interval=60, max_pending=100)
+        await writer.start()
+        await writer.submit(_rows(3))
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.01)
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        
+        assert writer.stats()["pending"] == 3
+        await writer.stop()
+        assert len(writer.written) == 3
+    
+    @pytest.mark.asyncio
+    async def test_try_flush_is_best_effort(self):
+        """Test readers' flushes give up on errors and timeouts"""
+        writer = SlowWriter(fail=True, batch_size=10, flush_interval=60, max_pending=100)
+        await writer.start()
+        await writer.submit(_rows(2))
+        assert await writer.try_flush(1) is False
+        assert writer.stats()["pending"] == 2
+        
+        writer.fail = False
+        writer.delay = 0.3
+        assert await writer.try_flush(0.05) is False
+        # The timed-out flush carries on in the background
+        await asyncio.sleep(0.4)
+        assert len(writer.written) == 2
+        assert await writer.try_flush(0.05) is True
+        await writer.stop()
+    
+    def test_write_mode_is_validated(self, monkeypatch):
+        """Test an unknown HISTORY_WRITE_MODE stops the app at startup"""
+        assert resolve_write_mode("batched") == "batched"
+        monkeypatch.setattr(main, "HISTORY_WRITE_MODE", "batch")
+        with pytest.raises(ValueError, match="batch"):
+            with TestClient(app):
+                pass
+    
+    @pytest.mark.asyncio
+    async def test_backpressure(self, session_factory):
+        """Test a full queue makes producers flush it and is counted"""
+        writer = HistoryWriter(session_factory, batch_size=100, flush_interval=60, max_pending=10)
+        await writer.start()
+        for _ in range(5):
+            await writer.submit(_rows(4))
+        
+        stats = writer.stats()
+        assert stats["backpressure_waits"] == 2
+        assert stats["max_pending_seen"] <= 10
+        assert stats["rows_written"] == 16
+        await writer.stop()
+        assert await _count(session_factory) == 20
+    
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_rows(self, session_factory):
+        """Test rows from a failed batch stay queued and the error is reported"""
+        writer = HistoryWriter(session_factory, batch_size=100, flush_interval=60, max_pending=100)
+        await writer.start()
+        await writer.submit([{'user_id': None, 'customer_data': "{}"}])
+        with pytest.raises(Exception):
+            await writer.flush()
+        
+        stats = writer.stats()
+        assert (stats["pending"], stats["failed_flushes"]) == (1, 1)
+        assert stats["last_error"]
+        writer._pending.clear()
+        await writer.stop()
+    
+    @pytest.mark.asyncio
+    async def test_not_running_writes_directly(self, session_factory):
+        """Test a writer that was never started commits rows at once"""
+        writer = HistoryWriter(session_factory, batch_size=100, flush_interval=60, max_pending=100)
+        await writer.submit(_rows(2))
+        assert await _count(session_factory) == 2
+
+
+class TestBatchedHistoryEndpoints:
+    """Test /predict in batched mode"""
+    
+    def test_predictions_are_batched(self, train_and_wait, sample_customer_data, monkeypatch):
+        """Test queued rows are visible in /history and written on shutdown"""
+        train_and_wait(n_clusters=3)
+        monkeypatch.setattr(main, "HISTORY_WRITE_MODE", "batched")
+        monkeypatch.setattr(history_writer, "flush_interval", 60)
+        
+        with TestClient(app) as client:
+            headers = _login(client, *_create_user("user"))
+            written = history_writer.rows_written
+            for _ in range(3):
+                response = client.post("/predict", json=sample_customer_data, headers=headers)
+                assert response.status_code == status.HTTP_200_OK
+            assert history_writer.stats()["pending"] == 3
+            
+            history = client.get("/history", headers=headers).json()
+            assert history["total"] == 3
+            assert history_writer.rows_written == written + 3
+            
+            client.post("/predict", json=sample_customer_data, headers=headers)
+        
+        assert not history_writer.running
+        assert history_writer.stats()["pending"] == 0
+        assert history_writer.rows_written == written + 4
+    
+    def test_writer_stats_endpoint(self, client, admin_headers, auth_headers):
+        """Test admins can inspect the write-behind queue"""
+        response = client.get("/admin/history/writer", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        assert stats["mode"] == "sync"
+        assert "backpressure_waits" in stats
+        
+        response = client.get("/admin/history/writer", headers=auth_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,48 @@
+# Import-time budget tests
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Seconds `import app.main` may take in a fresh interpreter
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.0"))
+
+# Training and charting stacks the serving path must not import
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "matplotlib", "seaborn", "joblib", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def import_app_main():
+    """Import app.main in a fresh interpreter and report what it cost"""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestImportTime:
+    """Test importing the API stays cheap"""
+    
+    def test_heavy_stacks_imported_lazily(self):
+        """Test app.main imports no training or charting libraries"""
+        assert import_app_main()["loaded"] == []
+    
+    def test_import_budget(self):
+        """Test app.main imports within IMPORT_BUDGET_SECONDS"""
+        # Best of three, so one slow run on a busy machine doesn't fail it
+        elapsed = min(import_app_main()["elapsed"] for _ in range(3))
+        assert elapsed < IMPORT_BUDGET_SECONDS, f"import app.main took {elapsed:.2f}s"
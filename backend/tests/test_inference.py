@@ -0,0 +1,68 @@
+# Inference kernel tests
+import numpy as np
+import pytest
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+from app.inference import InferenceKernel
+from app.utils import calculate_confidence
+
+FEATURE_NAMES = ('Age', 'Annual_Income', 'Spending_Score', 'Purchase_Frequency')
+
+
+def _fit(dtype, n_clusters=5):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(18, 70, 2000),
+        rng.uniform(15, 150, 2000),
+        rng.integers(1, 100, 2000),
+        rng.integers(1, 50, 2000)
+    ]).astype(dtype)
+    scaler = StandardScaler()
+    kmeans = KMeans(n_clusters=n_clusters, n_init=2, random_state=0).fit(scaler.fit_transform(X))
+    return kmeans, scaler, X
+
+
+class TestInferenceKernel:
+    """Test the compiled kernel matches the sklearn prediction path"""
+    
+    @pytest.mark.parametrize("dtype", [np.float64, np.float32])
+    def test_matches_sklearn(self, dtype):
+        """Test clusters, distances and confidences agree with sklearn"""
+        kmeans, scaler, X = _fit(dtype)
+        kernel = InferenceKernel(kmeans, scaler, FEATURE_NAMES)
+        
+        X_scaled = scaler.transform(X)
+        expected_distances = kmeans.transform(X_scaled)
+        expected_clusters = kmeans.predict(X_scaled)
+        clusters, confidences = kernel.predict(X)
+        
+        tolerance = 1e-9 if dtype == np.float64 else 1e-4
+        np.testing.assert_allclose(kernel.distances(X), expected_distances, rtol=tolerance, atol=tolerance)
+        np.testing.assert_array_equal(clusters, expected_clusters)
+        expected_confidences = [
+            calculate_confidence(row, cluster)
+            for row, cluster in zip(expected_distances, expected_clusters)
+        ]
+        # Rounding to 0.01 may flip at a boundary in float32
+        np.testing.assert_allclose(confidences, expected_confidences, atol=0.01 + 1e-9)
+    
+    def test_no_sklearn_on_request_path(self, monkeypatch):
+        """Test predicting never calls into the estimators"""
+        kmeans, scaler, X = _fit(np.float64)
+        kernel = InferenceKernel(kmeans, scaler, FEATURE_NAMES)
+        
+        def fail(*args, **kwargs):
+            raise AssertionError("sklearn called on the request path")
+        for name in ("predict", "transform"):
+            monkeypatch.setattr(kmeans, name, fail)
+        monkeypatch.setattr(scaler, "transform", fail)
+        
+        clusters, _ = kernel.predict(X[:10])
+        assert len(clusters) == 10
+    
+    def test_cluster_names(self):
+        """Test cluster names are resolved once at compile time"""
+        kmeans, scaler, _ = _fit(np.float64, n_clusters=3)
+        kernel = InferenceKernel(kmeans, scaler, FEATURE_NAMES)
+        
+        assert kernel.cluster_names == ["Budget Conscious", "High Value", "Average Spender"]
@@ -51,6 +51,41 @@ class TestModelTraining:
         assert ml_model.kmeans.n_clusters == n_clusters
 
 
+class TestClusteringEngines:
+    """Test selectable clustering engines and working dtype"""
+    
+    @pytest.mark.parametrize("engine", ["lloyd", "elkan", "minibatch"])
+    def test_train_with_engine(self, ml_model, engine):
+        """Test each engine trains a usable model"""
+        metrics = ml_model.train(n_clusters=4, engine=engine, batch_size=512)
+        assert metrics["engine"] == engine
+        assert metrics["n_clusters"] == 4
+        assert metrics["inertia"] > 0
+    
+    def test_float32_model_predicts_after_reload(self, ml_model):
+        """Test a float32 model keeps working through predict and statistics after reload"""
+        metrics = ml_model.train(n_clusters=4, engine="minibatch", dtype="float32")
+        assert metrics["dtype"] == "float32"
+        assert ml_model.X_scaled.dtype == np.float32
+        
+        reloaded = CustomerSegmentationModel()
+        assert reloaded.load_models()
+        prediction = reloaded.predict({
+            'age': 35,
+            'annual_income': 65.0,
+            'spending_score': 75,
+            'purchase_frequency': 12
+        })
+        assert 0 <= prediction["cluster"] < 4
+        stats = reloaded.get_cluster_statistics()
+        assert sum(c["size"] for c in stats["clusters"]) == stats["total_customers"]
+    
+    def test_unknown_engine(self, ml_model):
+        """Test unknown engines are rejected"""
+        with pytest.raises(ValueError, match="Unknown clustering engine"):
+            ml_model.train(n_clusters=4, engine="bogus")
+
+
 class TestModelPrediction:
     """Test model prediction functionality"""
     
@@ -123,6 +158,44 @@ class TestModelPrediction:
         assert 0 <= pred2["confidence"] <= 100
 
 
+class TestBatchPrediction:
+    """Test vectorized batch prediction"""
+    
+    def test_batch_matches_single_predictions(self, ml_model):
+        """Test predict_batch agrees with predict row by row"""
+        ml_model.train(n_clusters=4)
+        rng = np.random.default_rng(1)
+        customers = [
+            {
+                'age': int(rng.integers(18, 70)),
+                'annual_income': float(rng.uniform(15, 150)),
+                'spending_score': int(rng.integers(1, 100)),
+                'purchase_frequency': int(rng.integers(1, 50))
+            }
+            for _ in range(200)
+        ]
+        
+        batch = ml_model.predict_batch(customers)
+        assert batch == [ml_model.predict(customer) for customer in customers]
+    
+    def test_batch_without_training(self, ml_model):
+        """Test batch prediction fails without training"""
+        with pytest.raises(ValueError, match="Model not trained or loaded"):
+            ml_model.predict_batch([{'age': 30, 'annual_income': 50.0, 'spending_score': 50, 'purchase_frequency': 5}])
+    
+    def test_confidence_batch_matches_scalar(self):
+        """Test calculate_confidence_batch equals calculate_confidence per row"""
+        from app.utils import calculate_confidence, calculate_confidence_batch
+        
+        rng = np.random.default_rng(2)
+        distances = rng.uniform(0, 5, size=(50, 4))
+        distances[0] = 0
+        clusters = distances.argmin(axis=1)
+        
+        expected = [calculate_confidence(row, cluster) for row, cluster in zip(distances, clusters)]
+        np.testing.assert_allclose(calculate_confidence_batch(distances, clusters), expected)
+
+
 class TestClusterStatistics:
     """Test cluster statistics functionality"""
     
@@ -171,6 +244,32 @@ class TestClusterStatistics:
         
         # Total size should equal total customers
         assert total_size == stats["total_customers"]
+    
+    def test_statistics_are_precomputed(self, ml_model, monkeypatch):
+        """Test serving statistics does no per-request computation"""
+        import app.model as model_module
+        
+        ml_model.train(n_clusters=3)
+        
+        def fail_compute(*args, **kwargs):
+            raise AssertionError("statistics should be precomputed")
+        monkeypatch.setattr(model_module, "compute_cluster_statistics", fail_compute)
+        
+        stats = ml_model.get_cluster_statistics()
+        assert stats["n_clusters"] == 3
+        
+        # Loading a version reads the stored payload too
+        reloaded = CustomerSegmentationModel()
+        assert reloaded.load_models()
+        assert reloaded.get_cluster_statistics() == stats
+    
+    def test_statistics_copy_is_independent(self, ml_model):
+        """Test callers cannot mutate the precomputed payload"""
+        ml_model.train(n_clusters=3)
+        stats = ml_model.get_cluster_statistics()
+        stats["clusters"][0]["size"] = -1
+        
+        assert ml_model.get_cluster_statistics()["clusters"][0]["size"] > 0
 
 
 class TestElbowMethod:
@@ -202,3 +301,170 @@ class TestElbowMethod:
         inertias = elbow_data["inertias"]
         for i in range(len(inertias) - 1):
             assert inertias[i] >= inertias[i + 1]
+
+
+class TestParallelSweep:
+    """Test parallel k-sweep in find_optimal_clusters"""
+    
+    @pytest.mark.slow
+    def test_parallel_sweep_matches_serial(self):
+        """Test parallel k and restart fan-out reproduce the serial sweep"""
+        from app.preprocess import find_optimal_clusters
+        
+        X = np.random.RandomState(0).normal(size=(400, 4))
+        serial = find_optimal_clusters(X, max_clusters=5, n_jobs=1)
+        by_k = find_optimal_clusters(X, max_clusters=5, n_jobs=2)
+        by_restart = find_optimal_clusters(X, max_clusters=5, n_jobs=2, parallel_restarts=True)
+        
+        for result in (by_k, by_restart):
+            assert result[0] == serial[0]
+            assert result[3] == serial[3]
+            np.testing.assert_allclose(result[1], serial[1])
+            np.testing.assert_allclose(result[2], serial[2])
+    
+    @pytest.mark.slow
+    def test_parallel_sweep_honours_max_iter(self, monkeypatch):
+        """Test restarts in worker processes use the configured MAX_ITER"""
+        import app.preprocess as preprocess
+        from app.utils import N_INIT
+        
+        monkeypatch.setattr(preprocess, "MAX_ITER", 2)
+        X = np.random.RandomState(0).normal(size=(400, 4))
+        serial = preprocess.find_optimal_clusters(X, max_clusters=5, n_jobs=1, return_n_iter=True)
+        by_restart = preprocess.find_optimal_clusters(
+            X, max_clusters=5, n_jobs=2, parallel_restarts=True, return_n_iter=True
+        )
+        
+        np.testing.assert_allclose(by_restart[1], serial[1])
+        assert by_restart[4] == serial[4]
+        assert all(n_iter <= 2 * N_INIT for n_iter in serial[4])
+        
+
+class TestWarmStartSweep:
+    """Test warm-started k-sweep"""
+    
+    def test_warm_start_sweep(self):
+        """Test warm start returns a full sweep with per-k iteration counts"""
+        from app.preprocess import find_optimal_clusters
+        from app.utils import N_INIT
+        
+        rng = np.random.RandomState(0)
+        X = np.vstack([rng.normal(loc, 0.5, size=(150, 4)) for loc in (-3, 0, 3)])
+        cold = find_optimal_clusters(X, max_clusters=6, return_n_iter=True)
+        warm = find_optimal_clusters(X, max_clusters=6, warm_start=True, return_n_iter=True)
+        
+        assert warm[3] == cold[3]
+        assert len(warm[4]) == len(warm[3])
+        assert all(n_iter >= 1 for n_iter in warm[4])
+        # Counts cover every restart: at least one iteration per cold restart
+        assert all(n_iter >= N_INIT for n_iter in cold[4])
+        # Well separated blobs: both sweeps find the same k with similar inertia
+        assert warm[0] == cold[0] == 3
+        np.testing.assert_allclose(warm[1], cold[1], rtol=0.05)
+    
+    def test_elbow_data_reports_iterations(self, ml_model):
+        """Test elbow data includes iteration counts and the sweep mode"""
+        elbow_data = ml_model.get_elbow_data(warm_start=True)
+        assert elbow_data["warm_start"] is True
+        assert len(elbow_data["n_iters"]) == len(elbow_data["k_range"])
+
+
+class TestModelRegistry:
+    """Test versioned model registry and hot-swap"""
+    
+    def test_train_publishes_new_version(self, ml_model):
+        """Test each training run publishes and activates a new version"""
+        first = ml_model.train(n_clusters=3)
+        second = ml_model.train(n_clusters=4)
+        
+        assert first["model_version"] != second["model_version"]
+        assert ml_model.version == second["model_version"]
+        versions = ml_model.list_versions()
+        assert versions[0]["version"] == second["model_version"]
+        assert versions[0]["current"] is True
+    
+    def test_bundle_is_immutable_and_stable(self, ml_model):
+        """Test a captured bundle is unaffected by a later retrain"""
+        import dataclasses
+        
+        ml_model.train(n_clusters=3)
+        bundle = ml_model.bundle
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            bundle.kmeans = None
+        
+        ml_model.train(n_clusters=4)
+        assert bundle.kmeans.n_clusters == 3
+        assert ml_model.bundle.kmeans.n_clusters == 4
+        assert ml_model.predict({
+            'age': 35,
+            'annual_income': 65.0,
+            'spending_score': 75,
+            'purchase_frequency': 12
+        }, bundle)["cluster"] < 3
+    
+    def test_rollback(self, ml_model):
+        """Test rolling back restores an earlier version for new loads too"""
+        first = ml_model.train(n_clusters=3)
+        ml_model.train(n_clusters=4)
+        
+        ml_model.rollback(first["model_version"])
+        assert ml_model.version == first["model_version"]
+        assert ml_model.kmeans.n_clusters == 3
+        
+        reloaded = CustomerSegmentationModel()
+        assert reloaded.load_models()
+        assert reloaded.version == first["model_version"]
+    
+    def test_rollback_unknown_version(self, ml_model):
+        """Test rolling back to an unknown version fails"""
+        with pytest.raises(ValueError, match="Unknown model version"):
+            ml_model.rollback("../does-not-exist")
+
+
+class TestMemoryMappedFeatures:
+    """Test the scaled feature matrix is persisted and memory-mapped"""
+    
+    def test_load_memory_maps_arrays(self, ml_model, monkeypatch):
+        """Test loading a version maps its arrays instead of re-reading the dataset"""
+        import app.preprocess as preprocess_module
+        
+        ml_model.train(n_clusters=3)
+        trained = ml_model.bundle
+        
+        def fail_load_dataset(*args, **kwargs):
+            raise AssertionError("dataset should not be re-read on load")
+        monkeypatch.setattr(preprocess_module, "load_dataset", fail_load_dataset)
+        
+        reloaded = CustomerSegmentationModel()
+        assert reloaded.load_models()
+        bundle = reloaded.bundle
+        assert isinstance(bundle.X_scaled, np.memmap)
+        assert not bundle.X_scaled.flags.writeable
+        np.testing.assert_array_equal(bundle.X_scaled, trained.X_scaled)
+        np.testing.assert_array_equal(bundle.labels, trained.labels)
+    
+    def test_statistics_match_after_reload(self, ml_model):
+        """Test cluster statistics are the same from a trained or a loaded bundle"""
+        ml_model.train(n_clusters=4)
+        trained_stats = ml_model.get_cluster_statistics()
+        
+        reloaded = CustomerSegmentationModel()
+        assert reloaded.load_models()
+        loaded_stats = reloaded.get_cluster_statistics()
+        
+        assert loaded_stats["total_customers"] == trained_stats["total_customers"]
+        for loaded, trained in zip(loaded_stats["clusters"], trained_stats["clusters"]):
+            assert loaded["size"] == trained["size"]
+            assert loaded["avg_income"] == pytest.approx(trained["avg_income"])
+    
+    def test_statistics_match_dataframe(self, ml_model):
+        """Test cluster means equal the per-cluster means of the raw dataset"""
+        ml_model.train(n_clusters=3)
+        bundle = ml_model.bundle
+        stats = ml_model.get_cluster_statistics()
+        
+        for cluster in stats["clusters"]:
+            rows = ml_model.df[np.asarray(bundle.labels) == cluster["cluster_id"]]
+            assert cluster["size"] == len(rows)
+            assert cluster["avg_age"] == pytest.approx(rows["Age"].mean())
+            assert cluster["avg_purchase_frequency"] == pytest.approx(rows["Purchase_Frequency"].mean())
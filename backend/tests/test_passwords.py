@@ -0,0 +1,111 @@
+# Password hashing tests
+import threading
+import uuid
+import bcrypt
+import pytest
+from fastapi import status
+import app.auth as auth_module
+from app.auth import get_password_hash, verify_password, password_needs_rehash
+from app.database import SessionLocal, User
+from app.executors import BoundedExecutor, ExecutorBusyError
+
+
+class TestBoundedExecutor:
+    """Test the bounded executor fails fast when full"""
+    
+    def test_rejects_past_queue_limit(self):
+        """Test calls beyond workers + queue raise instead of waiting"""
+        executor = BoundedExecutor(max_workers=1, max_queue=1, name="test")
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = executor.submit(release.wait)
+        with pytest.raises(ExecutorBusyError):
+            executor.submit(release.wait)
+        
+        release.set()
+        running.result()
+        queued.result()
+        assert executor.call(divmod, 7, 2) == (3, 1)
+        executor.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_run_awaits_result(self):
+        """Test async callers get the result without blocking the loop"""
+        executor = BoundedExecutor(max_workers=1, max_queue=0, name="test")
+        assert await executor.run(divmod, 9, 4) == (2, 1)
+        executor.shutdown()
+
+
+class TestPasswordHashing:
+    """Test bcrypt cost and rehashing"""
+    
+    def test_configured_cost(self, monkeypatch):
+        """Test new hashes use BCRYPT_ROUNDS"""
+        monkeypatch.setattr(auth_module, "BCRYPT_ROUNDS", 5)
+        hashed = get_password_hash("secret123")
+        assert hashed.startswith("$2b$05$")
+        assert verify_password("secret123", hashed)
+        assert not password_needs_rehash(hashed)
+        
+        monkeypatch.setattr(auth_module, "BCRYPT_ROUNDS", 6)
+        assert password_needs_rehash(hashed)
+        assert password_needs_rehash("not-a-bcrypt-hash")
+    
+    def _create_user_with_cost(self, rounds):
+        username = f"test_cost_{uuid.uuid4().hex[:8]}"
+        hashed = bcrypt.hashpw(b"secret123", bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+        db = SessionLocal()
+        try:
+            db.add(User(email=f"{username}@example.com", username=username, hashed_password=hashed))
+            db.commit()
+        finally:
+            db.close()
+        return username
+    
+    def _stored_hash(self, username):
+        db = SessionLocal()
+        try:
+            return db.query(User).filter(User.username == username).first().hashed_password
+        finally:
+            db.close()
+    
+    def test_rehash_on_login(self, client, monkeypatch):
+        """Test a successful login moves the stored hash to the configured cost"""
+        monkeypatch.setattr(auth_module, "BCRYPT_ROUNDS", 5)
+        username = self._create_user_with_cost(4)
+        
+        response = client.post("/auth/login", data={"username": username, "password": "secret123"})
+        assert response.status_code == status.HTTP_200_OK
+        stored = self._stored_hash(username)
+        assert stored.startswith("$2b$05$")
+        assert bcrypt.checkpw(b"secret123", stored.encode('utf-8'))
+        
+        # Already at the configured cost: left alone
+        client.post("/auth/login", data={"username": username, "password": "secret123"})
+        assert self._stored_hash(username) == stored
+    
+    def test_failed_login_does_not_rehash(self, client, monkeypatch):
+        """Test a wrong password never touches the stored hash"""
+        monkeypatch.setattr(auth_module, "BCRYPT_ROUNDS", 5)
+        username = self._create_user_with_cost(4)
+        stored = self._stored_hash(username)
+        
+        response = client.post("/auth/login", data={"username": username, "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert self._stored_hash(username) == stored
+    
+    def test_busy_executor_returns_503(self, client, monkeypatch):
+        """Test logins beyond the queue limit are rejected fast with 503"""
+        username = self._create_user_with_cost(4)
+        executor = BoundedExecutor(max_workers=1, max_queue=0, name="password-hash")
+        monkeypatch.setattr(auth_module, "password_executor", executor)
+        release = threading.Event()
+        executor.submit(release.wait)
+        try:
+            response = client.post("/auth/login", data={"username": username, "password": "secret123"})
+        finally:
+            release.set()
+            executor.shutdown()
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["retry-after"] == "1"
@@ -140,13 +140,32 @@ class TestTrainResponse:
             "message": "Model trained successfully",
             "n_clusters": 4,
             "silhouette_score": 0.65,
-            "inertia": 1234.56
+            "silhouette_method": "exact",
+            "inertia": 1234.56,
+            "engine": "lloyd",
+            "dtype": "float64"
         }
         response = TrainResponse(**data)
         assert response.message == "Model trained successfully"
         assert response.n_clusters == 4
         assert response.silhouette_score == 0.65
         assert response.inertia == 1234.56
+    
+    @pytest.mark.parametrize("field", ["silhouette_method", "engine", "dtype"])
+    def test_fit_settings_are_required(self, field):
+        """Test a response can't omit how the model was fitted"""
+        data = {
+            "message": "Model trained successfully",
+            "n_clusters": 4,
+            "silhouette_score": 0.65,
+            "silhouette_method": "exact",
+            "inertia": 1234.56,
+            "engine": "lloyd",
+            "dtype": "float64"
+        }
+        del data[field]
+        with pytest.raises(ValidationError):
+            TrainResponse(**data)
 
 
 class TestClusterStats:
@@ -0,0 +1,144 @@
+# Online segment statistics tests
+import asyncio
+import numpy as np
+import pytest
+from app.segment_stats import SegmentStats, LIVE_FEATURES
+
+
+def _customer(values):
+    return dict(zip(LIVE_FEATURES, values))
+
+
+@pytest.fixture
+def stats(tmp_path):
+    """Live statistics checkpointed to a temporary file"""
+    return SegmentStats(path=tmp_path / "segment_stats.json", checkpoint_every=1000, checkpoint_seconds=3600)
+
+
+class TestWelfordUpdates:
+    """Test running statistics match batch statistics"""
+    
+    def test_matches_numpy(self, stats):
+        """Test running means and variances equal numpy's per cluster"""
+        rng = np.random.default_rng(0)
+        rows = rng.uniform(1, 100, size=(500, len(LIVE_FEATURES)))
+        clusters = rng.integers(0, 3, size=500)
+        for row, cluster in zip(rows, clusters):
+            stats.update("v1", int(cluster), f"Segment {cluster}", _customer(row))
+        
+        snapshot = stats.snapshot()
+        assert snapshot["total_customers"] == 500
+        for cluster in snapshot["clusters"]:
+            members = rows[clusters == cluster["cluster_id"]]
+            assert cluster["count"] == len(members)
+            np.testing.assert_allclose(list(cluster["mean"].values()), members.mean(axis=0))
+            np.testing.assert_allclose(list(cluster["variance"].values()), members.var(axis=0, ddof=1))
+    
+    def test_single_observation_has_zero_variance(self, stats):
+        """Test a cluster with one customer reports zero variance"""
+        stats.update("v1", 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        cluster = stats.snapshot()["clusters"][0]
+        
+        assert cluster["mean"]["age"] == 30
+        assert cluster["variance"]["age"] == 0
+    
+    def test_new_model_version_resets(self, stats):
+        """Test statistics restart when another model version scores customers"""
+        stats.update("v1", 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        stats.update("v2", 1, "High Value", _customer([40, 90.0, 80, 20]))
+        
+        snapshot = stats.snapshot()
+        assert snapshot["model_version"] == "v2"
+        assert [c["cluster_id"] for c in snapshot["clusters"]] == [1]
+        assert stats.snapshot("v1")["total_customers"] == 0
+
+
+class TestCheckpointing:
+    """Test live statistics survive a restart"""
+    
+    def test_checkpoint_and_restore(self, stats):
+        """Test a new instance resumes from the last checkpoint"""
+        for age in (20, 30, 40):
+            stats.update("v1", 2, "Average Spender", _customer([age, 50.0, 40, 10]))
+        stats.checkpoint()
+        
+        restored = SegmentStats(path=stats.path)
+        # Nothing is read until the lifespan restores it
+        assert restored.snapshot()["total_customers"] == 0
+        restored.restore()
+        assert restored.snapshot() == stats.snapshot()
+        
+        # Updates continue from the restored state
+        restored.update("v1", 2, "Average Spender", _customer([50, 50.0, 40, 10]))
+        assert restored.snapshot()["clusters"][0]["mean"]["age"] == pytest.approx(35)
+    
+    @pytest.mark.asyncio
+    async def test_checkpoint_every(self, tmp_path):
+        """Test checkpoint_every pending updates wake the background task"""
+        stats = SegmentStats(path=tmp_path / "stats.json", checkpoint_every=3, checkpoint_seconds=3600)
+        task = asyncio.create_task(stats.run_checkpoints())
+        await asyncio.sleep(0.05)
+        for _ in range(2):
+            stats.update("v1", 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        await asyncio.sleep(0.1)
+        # Updates never write the checkpoint themselves
+        assert not stats.path.exists()
+        
+        stats.update("v1", 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        
+        assert not stats.dirty
+        restored = SegmentStats(path=stats.path)
+        restored.restore()
+        assert restored.snapshot()["total_customers"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_idle_checkpoint(self, tmp_path):
+        """Test pending updates are written by the background task without more traffic"""
+        stats = SegmentStats(path=tmp_path / "stats.json", checkpoint_every=1000, checkpoint_seconds=0.05)
+        stats.update("v1", 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        task = asyncio.create_task(stats.run_checkpoints())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        
+        assert not stats.dirty
+        restored = SegmentStats(path=stats.path)
+        restored.restore()
+        assert restored.snapshot()["total_customers"] == 1
+    
+    def test_restore_and_shutdown_checkpoint(self, ml_model, sample_customer_data, monkeypatch, tmp_path):
+        """Test startup restores the checkpoint and shutdown writes updates below the thresholds"""
+        import app.main as main
+        from fastapi.testclient import TestClient
+        from tests.conftest import _create_user, _login
+        ml_model.train(n_clusters=3)
+        # Serve the version just published, so /predict adds to the restored statistics
+        assert main.ml_model.load_models()
+        path = tmp_path / "stats.json"
+        previous = SegmentStats(path=path)
+        previous.update(main.ml_model.version, 0, "Budget Conscious", _customer([30, 50.0, 40, 10]))
+        previous.checkpoint()
+        mtime = path.stat().st_mtime_ns
+        stats = SegmentStats(path=path, checkpoint_every=1000, checkpoint_seconds=3600)
+        monkeypatch.setattr(main, "segment_stats", stats)
+        
+        with TestClient(main.app) as client:
+            assert stats.snapshot()["total_customers"] == 1
+            headers = _login(client, *_create_user("user"))
+            response = client.post("/predict", json=sample_customer_data, headers=headers)
+            assert response.status_code == 200
+            assert path.stat().st_mtime_ns == mtime
+        
+        restored = SegmentStats(path=path)
+        restored.restore()
+        assert restored.snapshot()["total_customers"] == 2
+    
+    def test_corrupt_checkpoint_is_ignored(self, tmp_path):
+        """Test an unreadable checkpoint starts empty statistics"""
+        path = tmp_path / "stats.json"
+        path.write_text("{not json")
+        
+        stats = SegmentStats(path=path)
+        stats.restore()
+        assert stats.snapshot()["total_customers"] == 0
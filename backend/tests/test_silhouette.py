@@ -0,0 +1,63 @@
+# Silhouette estimator tests
+import pytest
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
+from app.silhouette import compute_silhouette, resolve_silhouette_method
+
+
+@pytest.fixture
+def clustered_data():
+    """Small clustered dataset with fitted labels and centers"""
+    rng = np.random.RandomState(0)
+    X = np.vstack([rng.normal(loc, 1.0, size=(300, 4)) for loc in (-4, 0, 4)])
+    kmeans = KMeans(n_clusters=3, random_state=42, n_init=10).fit(X)
+    return X, kmeans.labels_, kmeans.cluster_centers_
+
+
+class TestSilhouetteEstimators:
+    """Test the pluggable silhouette estimators"""
+    
+    def test_chunked_matches_exact(self, clustered_data):
+        """Test chunked mode reproduces the exact silhouette"""
+        X, labels, _ = clustered_data
+        exact = silhouette_score(X, labels)
+        chunked = compute_silhouette(X, labels, "chunked", chunk_size=128)
+        assert chunked == pytest.approx(exact, abs=1e-9)
+    
+    def test_sampled_is_close_to_exact(self, clustered_data):
+        """Test stratified sampling approximates the exact silhouette"""
+        X, labels, _ = clustered_data
+        exact = silhouette_score(X, labels)
+        sampled = compute_silhouette(X, labels, "sampled", sample_size=200, random_state=1)
+        assert sampled == pytest.approx(exact, abs=0.05)
+        
+        # Same seed, same estimate
+        again = compute_silhouette(X, labels, "sampled", sample_size=200, random_state=1)
+        assert sampled == again
+    
+    def test_sampled_uses_all_points_when_small(self, clustered_data):
+        """Test sampling is skipped when the data fits in the sample"""
+        X, labels, _ = clustered_data
+        assert compute_silhouette(X, labels, "sampled", sample_size=10_000) == pytest.approx(
+            silhouette_score(X, labels)
+        )
+    
+    def test_simplified_with_and_without_centers(self, clustered_data):
+        """Test simplified silhouette is bounded and derives centroids when missing"""
+        X, labels, centers = clustered_data
+        with_centers = compute_silhouette(X, labels, "simplified", centers=centers)
+        without_centers = compute_silhouette(X, labels, "simplified")
+        assert -1 <= with_centers <= 1
+        assert with_centers == pytest.approx(without_centers)
+    
+    def test_unknown_method(self):
+        """Test unknown estimators are rejected"""
+        with pytest.raises(ValueError, match="Unknown silhouette method"):
+            resolve_silhouette_method("bogus")
+    
+    def test_train_reports_method(self, ml_model):
+        """Test training reports which estimator produced the score"""
+        metrics = ml_model.train(n_clusters=4, silhouette_method="simplified")
+        assert metrics["silhouette_method"] == "simplified"
+        assert -1 <= metrics["silhouette_score"] <= 1
@@ -0,0 +1,126 @@
+# Start-up warm-up and readiness tests
+import threading
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+import app.warmup as warmup_module
+from app.main import app
+from app.model import CustomerSegmentationModel, ml_model
+from app.chart_cache import chart_cache
+from app.warmup import Readiness, readiness, warm_up
+from tests.conftest import wait_for_ready
+
+
+class TestReadiness:
+    """Test readiness state transitions"""
+    
+    def test_lifecycle(self):
+        """Test starting, warming and ready states"""
+        state = Readiness()
+        assert not state.ready
+        assert state.snapshot()["state"] == "starting"
+        
+        state.begin()
+        state.set_stage("loading model")
+        assert state.snapshot()["stage"] == "loading model"
+        
+        state.finish("ready", model_version="v1")
+        snapshot = state.snapshot()
+        assert state.ready
+        assert snapshot["model_version"] == "v1"
+        assert snapshot["stage"] is None
+        assert snapshot["duration_seconds"] >= 0
+    
+    def test_not_ready_before_startup(self, client):
+        """Test /ready is 503 until the lifespan has warmed up"""
+        readiness.reset()
+        response = client.get("/ready")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.json()["state"] == "starting"
+
+
+class TestWarmUp:
+    """Test the lifespan loads and warms the model before reporting ready"""
+    
+    def test_startup_loads_model(self, train_and_wait):
+        """Test the model is loaded and its charts primed before /ready is 200"""
+        version = train_and_wait(n_clusters=3)["metrics"]["model_version"]
+        ml_model.bundle = None
+        chart_cache.clear()
+        
+        with TestClient(app) as client:
+            state = wait_for_ready(client)
+            assert client.get("/ready").status_code == status.HTTP_200_OK
+        
+        assert state["ready"]
+        assert state["model_version"] == version
+        assert ml_model.version == version
+        assert chart_cache.get_memory(version, "clusters") is not None
+    
+    @pytest.mark.asyncio
+    async def test_failure_reported(self, ml_model, monkeypatch):
+        """Test a failing warm-up leaves the API not-ready with the error"""
+        ml_model.train(n_clusters=3)
+        
+        def fail(bundle):
+            raise RuntimeError("warm-up exploded")
+        monkeypatch.setattr(warmup_module, "warm_up_predictions", fail)
+        
+        state = Readiness()
+        await warm_up(state, retries=2, retry_seconds=0.01)
+        assert state.snapshot()["state"] == "failed"
+        assert state.snapshot()["error"] == "warm-up exploded"
+    
+    @pytest.mark.asyncio
+    async def test_transient_failure_is_retried(self, ml_model, monkeypatch):
+        """Test a warm-up that fails once still ends ready"""
+        ml_model.train(n_clusters=3)
+        calls = []
+        real_warm_up_predictions = warmup_module.warm_up_predictions
+        
+        def flaky(bundle):
+            calls.append(bundle.version)
+            if len(calls) == 1:
+                raise RuntimeError("transient")
+            return real_warm_up_predictions(bundle)
+        monkeypatch.setattr(warmup_module, "warm_up_predictions", flaky)
+        
+        state = Readiness()
+        await warm_up(state, retries=2, retry_seconds=0.01)
+        assert state.snapshot()["state"] == "ready"
+        assert len(calls) == 2
+    
+    @pytest.mark.asyncio
+    async def test_cpu_pool_failure_is_best_effort(self, ml_model, monkeypatch):
+        """Test a CPU pool that fails to start doesn't keep the API not-ready"""
+        ml_model.train(n_clusters=3)
+        
+        async def broken_pool(fn, *args):
+            raise RuntimeError("spawn failed")
+        monkeypatch.setattr(warmup_module, "run_cpu", broken_pool)
+        
+        state = Readiness()
+        await warm_up(state, retries=0)
+        assert state.snapshot()["state"] == "ready"
+        assert state.snapshot()["model_version"] is not None
+    
+    def test_concurrent_cold_loads_read_once(self, ml_model, monkeypatch):
+        """Test racing first requests share a single model load"""
+        ml_model.train(n_clusters=3)
+        cold = CustomerSegmentationModel()
+        reads = []
+        read_bundle = cold._read_bundle
+        
+        def counting_read(version):
+            reads.append(version)
+            return read_bundle(version)
+        monkeypatch.setattr(cold, "_read_bundle", counting_read)
+        
+        threads = [threading.Thread(target=cold.ensure_loaded) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(reads) == 1
+        assert cold.version == ml_model.version
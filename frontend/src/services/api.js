@@ -52,11 +52,21 @@ export const healthCheck = async () => {
 
 /**
  * Train the ML model
+ * Training runs as a background job: submit it, then poll until it finishes.
+ * @param {number} pollInterval - Milliseconds between status checks
  */
-export const trainModel = async () => {
+export const trainModel = async (pollInterval = 1000) => {
   try {
     const response = await api.post("/train");
-    return response.data;
+    let job = response.data;
+    while (job.state === "queued" || job.state === "running") {
+      await new Promise((resolve) => setTimeout(resolve, pollInterval));
+      job = (await api.get(`/train/${job.job_id}`)).data;
+    }
+    if (job.state === "failed") {
+      throw new Error(job.error || "Training failed");
+    }
+    return job.metrics;
   } catch (error) {
     console.error("Training failed:", error);
     throw error;
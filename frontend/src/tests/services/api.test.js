@@ -23,20 +23,24 @@ describe("API Service", () => {
 
   describe("trainModel", () => {
     it("calls POST /train endpoint", async () => {
-      const mockResponse = {
-        data: {
-          message: "Model trained successfully",
-          n_clusters: 4,
-          silhouette_score: 0.65,
-          inertia: 1234.56,
-        },
+      const metrics = {
+        message: "Model trained successfully",
+        n_clusters: 4,
+        silhouette_score: 0.65,
+        inertia: 1234.56,
       };
-      axios.post.mockResolvedValue(mockResponse);
+      axios.post.mockResolvedValue({
+        data: { job_id: "abc", state: "running", progress: 0.2 },
+      });
+      axios.get.mockResolvedValue({
+        data: { job_id: "abc", state: "succeeded", progress: 1, metrics },
+      });
 
-      const result = await api.trainModel();
+      const result = await api.trainModel(0);
 
       expect(axios.post).toHaveBeenCalledWith("/train");
-      expect(result).toEqual(mockResponse.data);
+      expect(axios.get).toHaveBeenCalledWith("/train/abc");
+      expect(result).toEqual(metrics);
     });
   });
 